@@ -1,139 +1,507 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile, Depends, Form
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.sql.functions import user
 from sqlalchemy.util.langhelpers import repr_tuple_names
 
-from app.schemas import PostCreate, PostResponse, UserUpdate,UserRead,UserCreate
-from app.db import Post,create_db_and_tables,get_async_session
+from app.schemas import BulkDeleteResult, CommentCreate, CommentPage, CommentRead, FeedPage, FollowStatus, LikeStatus, PostBatch, PostCreate, PostIds, PostRead, PostResponse, UploadInit, UploadStatus, UserUpdate,UserRead,UserCreate
+from app.responses import OrjsonResponse
+from app.db import Post,engine,get_async_session,utcnow
+from app.migrate import check_schema_version
+from app.feed import body_etag, fetch_feed_page, fetch_posts, if_none_match, serialize_feed_row
+from app.feed_cache import FeedCache, get_feed_cache
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
 from contextlib import asynccontextmanager
-from sqlalchemy import select, result_tuple
+from sqlalchemy import select, result_tuple, update
 
-from app.images import imagekit
-
-import os
-import shutil
 import uuid
-import tempfile
-from app.cloudinary_config import cloudinary
-import cloudinary.uploader
+from app.storage import media_router
+from app.uploads import UPLOAD_BATCH_FORM_OPENAPI, UPLOAD_FORM_OPENAPI, stream_multipart_upload
+from app.processing import create_posts, discard_staged, stage_upload
+from app.jobs import notify
+from app.timeline import fetch_home_page, follow, unfollow
+from app.search import MAX_QUERY_LENGTH, fetch_search_page
+from app.counters import get_counters
+from app.engagement import add_comment, delete_comment, fetch_comments_page, for_viewer, get_visible_post, like, like_count, unlike
+from app.resumable import abort_upload, finish_upload, get_upload, put_chunk, start_upload, upload_status
+from app.events import Broker, event_stream, get_broker, publish_created, publish_deleted
+from app.worker import Worker
+from app.config import JOB_WORKERS, MAX_BATCH_SIZE, MAX_UPLOAD_FILES
 
-from app.users import auth_backend, current_active_users, fastapi_users,User
+from app.instrumentation import TimingMiddleware, metrics_router, span, start_logging, stop_logging
+from app.ratelimit import limit_auth
+from app.users import auth_backend, check_jwt_secret, current_active_users, fastapi_users,User
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await create_db_and_tables()
+    check_jwt_secret()
+    start_logging()
+    # Migrations run out of band (python -m app.migrate), workers only verify
+    await check_schema_version(engine)
+    worker = Worker(JOB_WORKERS)
+    worker.start()
+    counters = get_counters()
+    counters.start()
     yield
+    await counters.stop()
+    await worker.stop()
+    # Close pooled connections instead of leaving them to the process exit
+    await engine.dispose()
+    stop_logging()
 
 app = FastAPI(lifespan=lifespan)
-app.include_router(fastapi_users.get_auth_router(auth_backend), prefix="/auth/jwt", tags=["auth"])
-app.include_router(fastapi_users.get_register_router(UserRead, UserCreate), prefix="/auth", tags=["auth"])
-app.include_router(fastapi_users.get_reset_password_router(), prefix="/auth", tags=["auth"])
+app.add_middleware(TimingMiddleware)
+app.include_router(fastapi_users.get_auth_router(auth_backend), prefix="/auth/jwt", tags=["auth"], dependencies=[Depends(limit_auth)])
+app.include_router(fastapi_users.get_register_router(UserRead, UserCreate), prefix="/auth", tags=["auth"], dependencies=[Depends(limit_auth)])
+app.include_router(fastapi_users.get_reset_password_router(), prefix="/auth", tags=["auth"], dependencies=[Depends(limit_auth)])
 app.include_router(fastapi_users.get_verify_router(UserRead), prefix="/auth", tags=["auth"])
 app.include_router(fastapi_users.get_users_router(UserRead, UserUpdate), prefix="/auth", tags=["auth"])
+app.include_router(media_router)
+app.include_router(metrics_router)
+
+
+async def render_feed_page(request, user, session, feed_cache, before, limit, author_id=None):
+    """
+    One page of the global feed, or of `author_id`'s posts, with ETag
+    revalidation against the body as this viewer sees it. Either comes
+    from the feed cache or one index walk.
+    """
+    scope = "feed" if author_id is None else f"user:{author_id}"
+    version = await feed_cache.version()
+
+    async def load():
+        with span("db.feed_query"):
+            posts, cursor = await fetch_feed_page(session, before, limit, author_id)
+        with span("feed.serialize_rows"):
+            return [serialize_feed_row(post) for post in posts], cursor
 
+    with span("feed.page"):
+        posts_data, cursor = await feed_cache.page(version, before, limit, load, scope)
+    # Only an empty first page has to tell "no posts yet" from "no such user"
+    if author_id is not None and not posts_data and before is None and await session.get(User, author_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
 
-@app.get("/feed")
+    with span("feed.viewer"):
+        posts_data = await for_viewer(session, user.id, posts_data)
+    with span("feed.render"):
+        response = OrjsonResponse(
+            {
+                "posts": posts_data,
+                "next_cursor": cursor,
+            },
+        )
+    etag = body_etag(response.body)
+    if if_none_match(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return response
+
+
+@app.get("/feed", response_model=FeedPage, response_class=OrjsonResponse)
 async def get_feed(
+        request : Request,
+        before : str | None = None,
+        limit : int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        user : User = Depends(current_active_users),
+        session : AsyncSession = Depends(get_async_session),
+        feed_cache : FeedCache = Depends(get_feed_cache)
+):
+    return await render_feed_page(request, user, session, feed_cache, before, limit)
+
+
+@app.get("/me/posts", response_model=FeedPage, response_class=OrjsonResponse)
+async def get_my_posts(
+        request : Request,
+        before : str | None = None,
+        limit : int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        user : User = Depends(current_active_users),
+        session : AsyncSession = Depends(get_async_session),
+        feed_cache : FeedCache = Depends(get_feed_cache)
+):
+    return await render_feed_page(request, user, session, feed_cache, before, limit, user.id)
+
+
+@app.get("/users/{user_id}/posts", response_model=FeedPage, response_class=OrjsonResponse)
+async def get_user_posts(
+        user_id : uuid.UUID,
+        request : Request,
+        before : str | None = None,
+        limit : int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        user : User = Depends(current_active_users),
+        session : AsyncSession = Depends(get_async_session),
+        feed_cache : FeedCache = Depends(get_feed_cache)
+):
+    return await render_feed_page(request, user, session, feed_cache, before, limit, user_id)
+
+
+@app.get("/home", response_model=FeedPage, response_class=OrjsonResponse)
+async def get_home(
+        before : str | None = None,
+        limit : int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
         user : User = Depends(current_active_users),
         session : AsyncSession = Depends(get_async_session)
 ):
-    print("Checkpoint 1")
-    result = await session.execute(select(Post).order_by(Post.created_at.desc()))
-    posts = [row[0] for row in result.all()]
-
-    result = await session.execute(select(User))
-    users = [row[0] for row in result.all()]
-    user_dict = {u.id: u.email for u in users}
-
-    print("Checkpoint 2")
-    posts_data = []
-
-    for post in posts:
-        print("Checkpoint 3")
-        posts_data.append({
-            "id": str(post.id),
-            "user_id": str(post.user_id),
-            "caption" : post.caption,
-            "url" : post.url,
-            "created_at" : post.created_at,
-            "file_type" : post.file_type,
-            "file_name" : post.file_name,
-            "is_owner" : post.user_id == user.id,
-            "email" : user_dict.get(post.user_id,"Unknown"),
+    """The caller's posts and those of the users they follow, see app.timeline"""
+    with span("db.home_query"):
+        posts, cursor = await fetch_home_page(session, user.id, before, limit)
+    with span("feed.viewer"):
+        posts_data = await for_viewer(session, user.id, [serialize_feed_row(post) for post in posts])
+    with span("feed.render"):
+        return OrjsonResponse({
+            "posts": posts_data,
+            "next_cursor": cursor,
         })
-    print("Checkpoint 4")
-    return posts_data
 
-@app.post("/upload")
+
+@app.get("/search", response_model=FeedPage, response_class=OrjsonResponse)
+async def search_posts(
+        q : str = Query(min_length=1, max_length=MAX_QUERY_LENGTH),
+        before : str | None = None,
+        limit : int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        user : User = Depends(current_active_users),
+        session : AsyncSession = Depends(get_async_session)
+):
+    """Posts whose caption has every word of `q`, best match first, see app.search"""
+    with span("db.search_query"):
+        posts, cursor = await fetch_search_page(session, q, before, limit)
+    with span("feed.viewer"):
+        posts_data = await for_viewer(session, user.id, [serialize_feed_row(post) for post in posts])
+    with span("feed.render"):
+        return OrjsonResponse({
+            "posts": posts_data,
+            "next_cursor": cursor,
+        })
+
+
+async def follow_status(session, user_id, following: bool) -> dict:
+    follower_count = await session.scalar(select(User.follower_count).where(User.id == user_id))
+    return {"user_id": user_id, "following": following, "follower_count": follower_count}
+
+
+@app.post("/users/{user_id}/follow", response_model=FollowStatus)
+async def follow_user(
+        user_id : uuid.UUID,
+        user : User = Depends(current_active_users),
+        session : AsyncSession = Depends(get_async_session)
+):
+    if user_id == user.id:
+        raise HTTPException(status_code=400, detail="You cannot follow yourself")
+    if await session.get(User, user_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    try:
+        if await follow(session, user.id, user_id):
+            await session.commit()
+            notify()
+    except IntegrityError:
+        # Followed by a concurrent request
+        await session.rollback()
+    return await follow_status(session, user_id, True)
+
+
+@app.delete("/users/{user_id}/follow", response_model=FollowStatus)
+async def unfollow_user(
+        user_id : uuid.UUID,
+        user : User = Depends(current_active_users),
+        session : AsyncSession = Depends(get_async_session)
+):
+    if await session.get(User, user_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    if await unfollow(session, user.id, user_id):
+        await session.commit()
+        notify()
+    return await follow_status(session, user_id, False)
+
+async def publish_uploads(session, feed_cache, user, uploads) -> list[Post]:
+    """Insert the posts for staged (file, caption) pairs in one transaction"""
+    with span("db.insert_post"):
+        posts = await create_posts(session, user, uploads)
+        await session.commit()
+    ready = [upload for (upload, _), post in zip(uploads, posts) if post.status == "ready"]
+    discard_staged(*ready)
+    if ready:
+        await feed_cache.invalidate()
+        await publish_created(session, [post.id for post in posts if post.status == "ready"])
+    # Pending posts wait for processing, ready ones for fan-out
+    notify()
+    return posts
+
+
+@app.get("/events", response_class=StreamingResponse)
+async def feed_events(
+        user : User = Depends(current_active_users),
+        session : AsyncSession = Depends(get_async_session),
+        broker : Broker = Depends(get_broker)
+):
+    """Server-sent post_created, post_deleted and resync events, see app.events"""
+    # The stream stays open for as long as the client listens: hand back the
+    # connection the user lookup may have taken
+    await session.close()
+    return StreamingResponse(
+        event_stream(broker, user.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/upload", response_model=PostRead, status_code=202, openapi_extra=UPLOAD_FORM_OPENAPI)
 async def upload_file(
-    file: UploadFile = File(...),
-    caption: str = Form(""),
+    request: Request,
     user : User = Depends(current_active_users),
-    session: AsyncSession = Depends(get_async_session)
+    session: AsyncSession = Depends(get_async_session),
+    feed_cache: FeedCache = Depends(get_feed_cache)
 ):
-    temp_file_path = None
+    # The file is only staged here, a process_upload job (app.processing)
+    # stores it and publishes the post. Content that was stored before is
+    # shared right away. Staging is the one local copy, see STAGING_ROOT.
+    staged = []
     try:
-        suffix = os.path.splitext(file.filename)[1] or ".jpg"  # fallback
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
-            temp_file_path = temp_file.name
-            shutil.copyfileobj(file.file, temp_file)
-
+        with span("upload.stage"):
+            fields, files = await stream_multipart_upload(request, stage_upload, max_files=1, discard=discard_staged)
+        staged = [f.result for f in files]
+        if not files:
+            raise HTTPException(status_code=400, detail="No file uploaded")
 
-        await file.close()
+        posts = await publish_uploads(session, feed_cache, user, [(staged[0], fields.get("caption", ""))])
+        return posts[0]
 
-        upload_result = cloudinary.uploader.upload(
-            temp_file_path,
-            folder="uploads",
-            tags=["backend-upload"],
-            resource_type="auto"
-        )
+    except HTTPException:
+        discard_staged(*staged)
+        raise
+    except Exception as e:
+        discard_staged(*staged)
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 
-        post = Post(
-            user_id = user.id,
-            caption=caption,
-            url=upload_result["secure_url"],  # HTTPS URL
-            file_type=upload_result.get("resource_type", "image"),
-            file_name=upload_result.get("original_filename", file.filename)
-        )
+@app.post("/upload/batch", response_model=list[PostRead], status_code=202, openapi_extra=UPLOAD_BATCH_FORM_OPENAPI)
+async def upload_batch(
+    request: Request,
+    user : User = Depends(current_active_users),
+    session: AsyncSession = Depends(get_async_session),
+    feed_cache: FeedCache = Depends(get_feed_cache)
+):
+    """Several files with a caption each, one post per file in request order"""
+    staged = []
+    try:
+        with span("upload.stage"):
+            fields, files = await stream_multipart_upload(
+                request, stage_upload, max_files=MAX_UPLOAD_FILES, discard=discard_staged
+            )
+        staged = [f.result for f in files]
+        if not files:
+            raise HTTPException(status_code=400, detail="No file uploaded")
+        captions = fields.getlist("caption")
+        if len(captions) > len(staged):
+            raise HTTPException(status_code=400, detail="More captions than files")
+        captions += [""] * (len(staged) - len(captions))
 
-        session.add(post)
-        await session.commit()
-        await session.refresh(post)
-        return post
+        return await publish_uploads(session, feed_cache, user, list(zip(staged, captions)))
 
+    except HTTPException:
+        discard_staged(*staged)
+        raise
     except Exception as e:
+        discard_staged(*staged)
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
-    finally:
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-            except PermissionError:
-                pass
 
-@app.delete("/posts/{post_id}")
-async def delete_post(
-        post_id:str ,
+
+@app.post("/uploads", response_model=UploadStatus, status_code=201)
+async def start_resumable_upload(
+        body : UploadInit,
         user : User = Depends(current_active_users),
-        session: AsyncSession = Depends(get_async_session)):
+        session : AsyncSession = Depends(get_async_session)
+):
+    """Start a resumable upload, its chunks are then PUT one by one, see app.resumable"""
+    upload = await start_upload(session, user, body.filename, body.content_type, body.size, body.caption)
+    await session.commit()
+    return upload_status(upload)
+
+
+@app.get("/uploads/{upload_id}", response_model=UploadStatus)
+async def get_resumable_upload(
+        upload_id : uuid.UUID,
+        user : User = Depends(current_active_users),
+        session : AsyncSession = Depends(get_async_session)
+):
+    """Where an interrupted upload resumes: next_chunk is the first one not acknowledged"""
+    return upload_status(await get_upload(session, upload_id, user))
+
+
+@app.put("/uploads/{upload_id}/chunks/{index}", response_model=UploadStatus,
+         openapi_extra={"requestBody": {"required": True, "content": {"application/octet-stream": {"schema": {"type": "string", "format": "binary"}}}}})
+async def put_upload_chunk(
+        request : Request,
+        upload_id : uuid.UUID,
+        index : int,
+        user : User = Depends(current_active_users),
+        session : AsyncSession = Depends(get_async_session)
+):
+    upload = await get_upload(session, upload_id, user)
+    with span("upload.chunk"):
+        await put_chunk(session, request, upload, index)
+    return upload_status(upload)
+
+
+@app.post("/uploads/{upload_id}/complete", response_model=PostRead, status_code=202)
+async def complete_resumable_upload(
+        upload_id : uuid.UUID,
+        user : User = Depends(current_active_users),
+        session : AsyncSession = Depends(get_async_session),
+        feed_cache : FeedCache = Depends(get_feed_cache)
+):
+    """Publish the assembled file like /upload does"""
+    upload = await get_upload(session, upload_id, user)
+    staged, caption = await finish_upload(session, upload)
+    posts = await publish_uploads(session, feed_cache, user, [(staged, caption)])
+    return posts[0]
+
+
+@app.delete("/uploads/{upload_id}", status_code=204)
+async def abort_resumable_upload(
+        upload_id : uuid.UUID,
+        user : User = Depends(current_active_users),
+        session : AsyncSession = Depends(get_async_session)
+):
+    await abort_upload(session, await get_upload(session, upload_id, user))
+
+
+@app.get("/posts", response_model=PostBatch, response_class=OrjsonResponse)
+async def get_posts(
+        ids : list[uuid.UUID] = Query(min_length=1, max_length=MAX_BATCH_SIZE),
+        user : User = Depends(current_active_users),
+        session : AsyncSession = Depends(get_async_session)
+):
+    with span("db.fetch_posts"):
+        rows = await fetch_posts(session, ids)
+    by_id = {row.id: serialize_feed_row(row) for row in rows}
+    return OrjsonResponse({
+        "posts": await for_viewer(session, user.id, [by_id[i] for i in dict.fromkeys(ids) if i in by_id]),
+        "missing": [i for i in dict.fromkeys(ids) if i not in by_id],
+    })
+
+
+@app.post("/posts/{post_id}/like", response_model=LikeStatus)
+async def like_post(
+        post_id : uuid.UUID,
+        user : User = Depends(current_active_users),
+        session : AsyncSession = Depends(get_async_session)
+):
+    await get_visible_post(session, post_id)
     try:
-        post_uuid = uuid.UUID(post_id)
+        if await like(session, user.id, post_id):
+            await session.commit()
+            get_counters().add(post_id, "like_count", 1)
+    except IntegrityError:
+        # Liked by a concurrent request
+        await session.rollback()
+    return {"post_id": post_id, "liked": True, "like_count": await like_count(session, post_id)}
 
-        result = await session.execute(select(Post).where(Post.id == post_uuid))
-        post = result.scalars().one()
 
-        if not post:
-            raise HTTPException(status_code=404, detail="Post not found")
+@app.delete("/posts/{post_id}/like", response_model=LikeStatus)
+async def unlike_post(
+        post_id : uuid.UUID,
+        user : User = Depends(current_active_users),
+        session : AsyncSession = Depends(get_async_session)
+):
+    await get_visible_post(session, post_id)
+    if await unlike(session, user.id, post_id):
+        await session.commit()
+        get_counters().add(post_id, "like_count", -1)
+    return {"post_id": post_id, "liked": False, "like_count": await like_count(session, post_id)}
 
-        if post.user_id != user.id:
-            raise HTTPException(status_code=403, detail="You are not allowed to delete this post")
 
-        await session.delete(post)
+@app.get("/posts/{post_id}/comments", response_model=CommentPage)
+async def get_comments(
+        post_id : uuid.UUID,
+        before : str | None = None,
+        limit : int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        user : User = Depends(current_active_users),
+        session : AsyncSession = Depends(get_async_session)
+):
+    await get_visible_post(session, post_id)
+    comments, cursor = await fetch_comments_page(session, post_id, before, limit)
+    return {"comments": comments, "next_cursor": cursor}
+
+
+@app.post("/posts/{post_id}/comments", response_model=CommentRead, status_code=201)
+async def create_comment(
+        post_id : uuid.UUID,
+        body : CommentCreate,
+        user : User = Depends(current_active_users),
+        session : AsyncSession = Depends(get_async_session)
+):
+    await get_visible_post(session, post_id)
+    comment = add_comment(session, user, post_id, body.body)
+    await session.commit()
+    get_counters().add(post_id, "comment_count", 1)
+    return comment
+
+
+@app.delete("/comments/{comment_id}", status_code=204)
+async def remove_comment(
+        comment_id : uuid.UUID,
+        user : User = Depends(current_active_users),
+        session : AsyncSession = Depends(get_async_session)
+):
+    post_id = await delete_comment(session, user, comment_id)
+    await session.commit()
+    get_counters().add(post_id, "comment_count", -1)
+
+
+def soft_delete(ids, user_id):
+    """Mark the given posts of `user_id` deleted, returning the ids it did. The purge (app.purge) does the rest."""
+    return (
+        update(Post)
+        .where(Post.id.in_(ids), Post.user_id == user_id, Post.deleted_at.is_(None))
+        .values(deleted_at=utcnow())
+        .returning(Post.id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+@app.post("/posts/bulk-delete", response_model=BulkDeleteResult)
+async def bulk_delete_posts(
+        body : PostIds,
+        user : User = Depends(current_active_users),
+        session : AsyncSession = Depends(get_async_session),
+        feed_cache : FeedCache = Depends(get_feed_cache)
+):
+    """Delete the caller's posts among `ids` in one statement, reporting on each id"""
+    ids = list(dict.fromkeys(body.ids))
+    with span("db.bulk_delete"):
+        deleted_ids = set((await session.execute(soft_delete(ids, user.id))).scalars())
+        rest = [i for i in ids if i not in deleted_ids]
+        others = set()
+        if rest:
+            others = set((await session.execute(
+                select(Post.id).where(Post.id.in_(rest), Post.deleted_at.is_(None))
+            )).scalars())
         await session.commit()
 
-        return {"success": True, "message": "Post Deleted successfully"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Delete failed: {str(e)}")
+    if deleted_ids:
+        await feed_cache.invalidate()
+        await publish_deleted(deleted_ids)
+    return {"results": [
+        {"id": i, "status": "deleted" if i in deleted_ids else "forbidden" if i in others else "not_found"}
+        for i in ids
+    ]}
 
+@app.delete("/posts/{post_id}")
+async def delete_post(
+        post_id : uuid.UUID,
+        user : User = Depends(current_active_users),
+        session: AsyncSession = Depends(get_async_session),
+        feed_cache: FeedCache = Depends(get_feed_cache)):
+    with span("db.delete"):
+        deleted = (await session.execute(soft_delete([post_id], user.id))).first()
+        if deleted is None:
+            exists = await session.scalar(select(Post.id).where(Post.id == post_id, Post.deleted_at.is_(None)))
+            if exists is None:
+                raise HTTPException(status_code=404, detail="Post not found")
+            raise HTTPException(status_code=403, detail="You are not allowed to delete this post")
+        await session.commit()
 
+    await feed_cache.invalidate()
+    await publish_deleted([post_id])
+    return {"success": True, "message": "Post Deleted successfully"}
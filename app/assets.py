@@ -0,0 +1,100 @@
+"""
+Reference-counted media shared between posts of identical content.
+
+Uploads are hashed while they are staged. When the hash is already in
+media_assets the post reuses that asset (and its renditions) instead of
+storing the file again. An asset is removed from media storage once the
+last post using it is deleted.
+"""
+from collections import Counter
+
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import MediaAsset, Post
+
+SHARED_FIELDS = (
+    "url", "file_type", "storage_key", "thumbnail_url", "thumbnail_key",
+    "renditions", "width", "height", "duration",
+)
+
+
+def apply_asset(post: Post, asset: MediaAsset) -> None:
+    for field in SHARED_FIELDS:
+        setattr(post, field, getattr(asset, field))
+
+
+def asset_from_post(post: Post) -> MediaAsset:
+    return MediaAsset(
+        content_hash=post.content_hash,
+        ref_count=1,
+        **{field: getattr(post, field) for field in SHARED_FIELDS},
+    )
+
+
+def storage_keys(media) -> list[str]:
+    """Every stored object of a post or asset: the file and its renditions"""
+    keys = [media.storage_key] if media.storage_key else []
+    keys += [r["key"] for r in media.renditions or () if r["key"] != media.storage_key]
+    return keys
+
+
+async def add_reference(session: AsyncSession, content_hash: str) -> bool:
+    """
+    Count one more post using the asset, in the session's transaction.
+
+    False when the asset is gone (its last post was just deleted), the
+    caller then has to store the file again.
+    """
+    result = await session.execute(
+        update(MediaAsset)
+        .where(MediaAsset.content_hash == content_hash, MediaAsset.ref_count > 0)
+        .values(ref_count=MediaAsset.ref_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+async def release(session: AsyncSession, content_hash: str, count: int = 1) -> list[str]:
+    """
+    Count `count` posts less, in the session's transaction.
+
+    Returns the storage keys to delete when that was the last one. The row
+    is only removed while its count is still zero, so an upload taking a
+    new reference at the same moment keeps the asset alive.
+    """
+    await session.execute(
+        update(MediaAsset)
+        .where(MediaAsset.content_hash == content_hash, MediaAsset.ref_count >= count)
+        .values(ref_count=MediaAsset.ref_count - count)
+        .execution_options(synchronize_session=False)
+    )
+    result = await session.execute(
+        delete(MediaAsset)
+        .where(MediaAsset.content_hash == content_hash, MediaAsset.ref_count == 0)
+        .returning(MediaAsset.storage_key, MediaAsset.renditions)
+        .execution_options(synchronize_session=False)
+    )
+    row = result.first()
+    return storage_keys(row) if row else []
+
+
+def is_shared(post) -> bool:
+    return post.status == "ready" and post.content_hash is not None
+
+
+async def release_posts(session: AsyncSession, posts) -> list[str]:
+    """
+    Release the media of posts being deleted, in the session's transaction.
+
+    Takes posts or rows with status, content_hash, storage_key and
+    renditions, and returns the storage keys nothing uses any more.
+    """
+    keys = []
+    for content_hash, count in Counter(p.content_hash for p in posts if is_shared(p)).items():
+        keys += await release(session, content_hash, count)
+    for post in posts:
+        if not is_shared(post):
+            # Pending, failed or older than the asset index: the post owns its media
+            keys += storage_keys(post)
+    return keys
@@ -1,9 +1,42 @@
 import os
 import cloudinary
+import cloudinary.uploader
+import cloudinary.utils
+
+from app.config import UPLOAD_CHUNK_BYTES
 
 cloudinary.config(
     cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
     api_key=os.getenv("CLOUDINARY_API_KEY"),
     api_secret=os.getenv("CLOUDINARY_API_SECRET"),
     secure=True
-)
\ No newline at end of file
+)
+
+
+def upload_stream(reader, filename, chunk_size=UPLOAD_CHUNK_BYTES, **options):
+    """
+    Chunked upload from a non-seekable reader (blocking, run it off the event loop).
+
+    Unlike cloudinary.uploader.upload_large this never needs the total size
+    up front: intermediate chunks send an open-ended Content-Range and only
+    the last one carries the final length.
+    """
+    options = {"folder": "uploads", "tags": ["backend-upload"], "resource_type": "auto", **options}
+    upload_id = cloudinary.utils.random_public_id()
+    sent = 0
+    result = None
+
+    chunk = reader.read(chunk_size)
+    if not chunk:
+        raise ValueError("Cannot upload an empty file")
+    while chunk:
+        following = reader.read(chunk_size)
+        end = sent + len(chunk)
+        headers = {
+            "Content-Range": f"bytes {sent}-{end - 1}/{end if not following else -1}",
+            "X-Unique-Upload-Id": upload_id,
+        }
+        result = cloudinary.uploader.upload_large_part((filename, chunk), http_headers=headers, **options)
+        options["public_id"] = result.get("public_id")
+        sent, chunk = end, following
+    return result
@@ -0,0 +1,151 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Database. postgres:// and postgresql:// URLs are switched to asyncpg in app.db
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./test.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = env_bool("DB_POOL_PRE_PING", True)
+DB_ECHO = env_bool("DB_ECHO", False)
+# SQLite only
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_MMAP_BYTES = int(os.getenv("SQLITE_MMAP_BYTES", 256 * 1024 * 1024))
+
+# Uploads
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 100 * 1024 * 1024))
+# Cloudinary rejects chunks smaller than 5MB (except the last one)
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", 6 * 1024 * 1024))
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", 8))
+# Resumable uploads (/uploads, app.resumable) are sent in UPLOAD_CHUNK_BYTES
+# chunks. Unfinished ones are dropped once untouched for RESUMABLE_UPLOAD_TTL seconds.
+RESUMABLE_MAX_BYTES = int(os.getenv("RESUMABLE_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+RESUMABLE_UPLOAD_TTL = float(os.getenv("RESUMABLE_UPLOAD_TTL", 24 * 3600))
+# Files per /upload/batch request
+MAX_UPLOAD_FILES = int(os.getenv("MAX_UPLOAD_FILES", 20))
+# Ids per bulk fetch or bulk delete
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", 100))
+
+# Media storage: cloudinary, imagekit or local
+MEDIA_BACKEND = os.getenv("MEDIA_BACKEND", "cloudinary")
+# Local backend only: where files live and the public URL they are served under
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", "./media")
+MEDIA_URL = os.getenv("MEDIA_URL", "http://localhost:8000/media")
+
+# Background jobs. /upload stages files under STAGING_ROOT and returns; the
+# storage upload, metadata and thumbnails run in job workers. JOB_WORKERS of
+# them run inside every API process: set it to 0 and run `python -m app.worker`
+# (with the same STAGING_ROOT) to keep that work out of the API processes.
+# Staging does put each upload on local disk, until its job has stored it:
+# that is what keeps the storage provider's latency out of /upload, and it
+# lets duplicates be found (by hash) before anything is stored. The body
+# is still streamed in chunks, off the event loop and within MAX_UPLOAD_BYTES.
+# STAGING_ROOT needs room for the uploads in flight.
+STAGING_ROOT = os.getenv("STAGING_ROOT", "./staging")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 1))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 5))
+# Retry n waits about JOB_RETRY_BASE_SECONDS * 2**(n-1), capped at JOB_RETRY_MAX_SECONDS
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", 5))
+JOB_RETRY_MAX_SECONDS = float(os.getenv("JOB_RETRY_MAX_SECONDS", 3600))
+# A running job not finished after this long is assumed lost with its worker and rerun
+JOB_LOCK_TIMEOUT = float(os.getenv("JOB_LOCK_TIMEOUT", 600))
+# Deleted posts disappear at once and are purged by the job workers: every
+# POST_PURGE_INTERVAL seconds, POST_PURGE_BATCH rows per transaction, once
+# deleted for POST_PURGE_DELAY seconds (so jobs still working on them notice).
+# Their media is then deleted from storage by delete_media jobs.
+POST_PURGE_INTERVAL = float(os.getenv("POST_PURGE_INTERVAL", 60))
+POST_PURGE_BATCH = int(os.getenv("POST_PURGE_BATCH", 500))
+POST_PURGE_DELAY = float(os.getenv("POST_PURGE_DELAY", 60))
+# Likes and comments only count into posts.like_count/comment_count every
+# COUNTER_FLUSH_INTERVAL seconds, in one batch per process (app.counters)
+COUNTER_FLUSH_INTERVAL = float(os.getenv("COUNTER_FLUSH_INTERVAL", 1))
+MAX_COMMENT_LENGTH = int(os.getenv("MAX_COMMENT_LENGTH", 2000))
+# Widths of the image renditions (and video poster frames) made for every post
+RENDITION_WIDTHS = sorted(int(w) for w in os.getenv("RENDITION_WIDTHS", "400,800,1600").split(","))
+RENDITION_QUALITY = int(os.getenv("RENDITION_QUALITY", 80))
+# Processes decoding and resizing media for the job workers
+RENDITION_PROCESSES = int(os.getenv("RENDITION_PROCESSES", 2))
+
+# Home timelines (app.timeline). Posts of authors with FANOUT_MAX_FOLLOWERS
+# followers or more are pulled at read time instead of being copied into every
+# follower's timeline.
+FANOUT_MAX_FOLLOWERS = int(os.getenv("FANOUT_MAX_FOLLOWERS", 10_000))
+# Recent posts of a newly followed user copied into the follower's timeline
+TIMELINE_BACKFILL = int(os.getenv("TIMELINE_BACKFILL", 50))
+
+# Feed cache: memory (per worker), redis (shared, needs the redis extra) or none.
+# memory only suits a single API process: app.serve refuses it with several
+# workers. Separate job worker processes can only invalidate a shared (redis)
+# cache; with memory, posts they publish show up once cached pages expire.
+FEED_CACHE_BACKEND = os.getenv("FEED_CACHE_BACKEND", "memory")
+FEED_CACHE_URL = os.getenv("FEED_CACHE_URL", "redis://localhost:6379/0")
+FEED_CACHE_PAGES = int(os.getenv("FEED_CACHE_PAGES", 5))
+FEED_CACHE_SIZE = int(os.getenv("FEED_CACHE_SIZE", 1000))
+FEED_CACHE_TTL = float(os.getenv("FEED_CACHE_TTL", 300))
+
+# Feed events (/events): memory (per process) or redis (shared, needs the redis
+# extra). With memory, clients only hear about posts published by the process
+# they are connected to, including its in-process job workers.
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "memory")
+EVENTS_URL = os.getenv("EVENTS_URL", FEED_CACHE_URL)
+# Events buffered per client before it is told to resync instead
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", 100))
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", 15))
+
+# Production server (python -m app.serve). WEB_CONCURRENCY is what most hosts set.
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", 8000))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", os.getenv("WEB_CONCURRENCY", 1)))
+# Time in-flight requests get to finish on SIGTERM
+SERVER_GRACEFUL_TIMEOUT = float(os.getenv("SERVER_GRACEFUL_TIMEOUT", 30))
+SERVER_KEEPALIVE = int(os.getenv("SERVER_KEEPALIVE", 5))
+
+# Instrumentation
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", 1000))
+# Fraction of requests to run under pyinstrument (needs the profiling extra), 0 = off
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+
+# Auth
+# Required: the API refuses to start without it. The same value in every
+# process, or tokens from one worker are refused by the others.
+JWT_SECRET = os.getenv("JWT_SECRET")
+JWT_LIFETIME_SECONDS = int(os.getenv("JWT_LIFETIME_SECONDS", 3600))
+# Auth route rate limits as "burst/seconds": a token bucket holding `burst`
+# requests, refilled at burst per seconds. Per client IP on every auth route and
+# per account (login username, email) on top. Buckets are kept in memory (per
+# process) or redis (shared, needs the redis extra), or none to turn them off.
+AUTH_RATE_LIMIT_IP = os.getenv("AUTH_RATE_LIMIT_IP", "30/60")
+AUTH_RATE_LIMIT_ACCOUNT = os.getenv("AUTH_RATE_LIMIT_ACCOUNT", "10/300")
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_URL = os.getenv("RATE_LIMIT_URL", FEED_CACHE_URL)
+RATE_LIMIT_SIZE = int(os.getenv("RATE_LIMIT_SIZE", 100_000))
+# Password hashing (app.passwords): threads doing it, and the Argon2 (new
+# hashes) and bcrypt (old hashes) parameters. Existing hashes are upgraded to
+# changed parameters on the next login.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_ARGON2_TIME_COST = int(os.getenv("PASSWORD_ARGON2_TIME_COST", 3))
+PASSWORD_ARGON2_MEMORY_COST = int(os.getenv("PASSWORD_ARGON2_MEMORY_COST", 65536))
+PASSWORD_ARGON2_PARALLELISM = int(os.getenv("PASSWORD_ARGON2_PARALLELISM", 4))
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", 12))
+# Per-process cache of authenticated users, invalidated by UserManager hooks.
+# Other workers only see a change once their entry expires.
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", 10_000))
+AUTH_USER_CACHE_TTL = float(os.getenv("AUTH_USER_CACHE_TTL", 60))
+# Trust is_active/email/... signed into the token and skip the lookup entirely.
+# A deactivated user then keeps access until their token expires.
+AUTH_TRUST_TOKEN_CLAIMS = env_bool("AUTH_TRUST_TOKEN_CLAIMS", False)
@@ -0,0 +1,132 @@
+"""
+Write-coalesced post counters (posts.like_count and comment_count).
+
+A like or comment only adds to an in-memory tally; every
+COUNTER_FLUSH_INTERVAL seconds the tally goes to the database as one
+batched UPDATE ... SET like_count = like_count + :delta per touched post.
+A post liked a thousand times in a second costs one row update, and
+concurrent likes never wait on each other's row lock.
+
+The likes and comments tables stay the truth. Tallies not flushed yet
+are lost if the process dies; recount from the tables with
+
+    python -m app.counters reconcile
+"""
+import argparse
+import asyncio
+import logging
+from collections import Counter
+from functools import lru_cache
+
+from sqlalchemy import bindparam, func, select, update
+
+from app.config import COUNTER_FLUSH_INTERVAL
+from app.db import Comment, Like, Post, async_session_maker
+
+logger = logging.getLogger("app.counters")
+
+COLUMNS = ("like_count", "comment_count")
+
+posts = Post.__table__
+
+
+class CounterBuffer:
+    def __init__(self, session_maker=async_session_maker, interval: float = COUNTER_FLUSH_INTERVAL):
+        self.session_maker = session_maker
+        self.interval = interval
+        self._pending: Counter[tuple] = Counter()
+        # Taken by a flush that has not committed yet
+        self._in_flight: list[Counter[tuple]] = []
+        self._stopping = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def add(self, post_id, column: str, delta: int = 1) -> None:
+        self._pending[(post_id, column)] += delta
+
+    def pending(self, post_id, column: str) -> int:
+        """What this process has counted for the post but not flushed yet"""
+        key = (post_id, column)
+        return self._pending.get(key, 0) + sum(taken.get(key, 0) for taken in self._in_flight)
+
+    async def flush(self) -> None:
+        pending, self._pending = self._pending, Counter()
+        # Same order in every process, so concurrent flushes never deadlock
+        by_column: dict[str, list[dict]] = {}
+        for (post_id, column), delta in sorted(pending.items(), key=lambda item: (item[0][1], str(item[0][0]))):
+            if delta:
+                by_column.setdefault(column, []).append({"b_id": post_id, "delta": delta})
+        if not by_column:
+            return
+        committed = False
+        self._in_flight.append(pending)
+        try:
+            async with self.session_maker() as session:
+                for column, rows in by_column.items():
+                    await session.execute(
+                        update(posts)
+                        .where(posts.c.id == bindparam("b_id"))
+                        .values({column: posts.c[column] + bindparam("delta")}),
+                        rows,
+                    )
+                await session.commit()
+                committed = True
+                # In the posts rows from here on
+                self._in_flight.remove(pending)
+        except BaseException:
+            if not committed:
+                self._in_flight.remove(pending)
+                # Counted again on the next flush
+                self._pending.update(pending)
+            raise
+
+    def start(self) -> None:
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._loop(), name="counter-flush")
+
+    async def stop(self) -> None:
+        """Stop the timer and flush what is left. A failed flush is logged, the rest of shutdown goes on."""
+        self._stopping.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("flushing post counters failed, their deltas are lost (see reconcile)")
+
+    async def _loop(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.interval)
+            except TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("flushing post counters failed")
+
+
+@lru_cache
+def get_counters() -> CounterBuffer:
+    return CounterBuffer()
+
+
+async def reconcile(engine) -> None:
+    """Recount every post's counters from the likes and comments tables"""
+    likes = select(func.count()).where(Like.post_id == posts.c.id).scalar_subquery()
+    comments = select(func.count()).where(Comment.post_id == posts.c.id).scalar_subquery()
+    async with engine.begin() as conn:
+        await conn.execute(update(posts).values(like_count=likes, comment_count=comments))
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.counters", description="Post counter maintenance")
+    parser.add_argument("command", choices=["reconcile"])
+    parser.parse_args(argv)
+
+    from app.db import engine
+    asyncio.run(reconcile(engine))
+
+
+if __name__ == "__main__":
+    main()
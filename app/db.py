@@ -1,47 +1,268 @@
-from datetime import datetime
+from datetime import datetime, timezone
 
 from collections.abc import AsyncGenerator
 import uuid
 
 from fastapi.params import Depends
-from sqlalchemy import Column,String, Text, DateTime, ForeignKey
+from sqlalchemy import JSON, BigInteger, Column, Float, Integer, String, Text, DateTime, ForeignKey, Index, event, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine,async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase,relationship
 
 from sqlalchemy.orm import DeclarativeBase
 from fastapi_users_db_sqlalchemy import SQLAlchemyUserDatabase, SQLAlchemyBaseUserTableUUID
-DATABASE_URL = "sqlite+aiosqlite:///./test.db"
+from fastapi_users_db_sqlalchemy.generics import GUID
+
+from app import config
+from app.config import DATABASE_URL
+
+
+
+def utcnow() -> datetime:
+    """Now in UTC, naive like the DateTime columns (datetime.utcnow() is deprecated)"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 
 class Base(DeclarativeBase):
     pass
 class User(SQLAlchemyBaseUserTableUUID, Base):
 #class User(SQLAlchemyUserDatabase, Base):
     posts = relationship("Post",back_populates="user")
+    # Maintained by app.timeline on follow/unfollow, decides fan-out vs pull
+    follower_count = Column(Integer, nullable=False, default=0, server_default="0")
+
 
 
+# Partial index condition: feeds never see deleted posts, their indexes skip them
+NOT_DELETED = text("deleted_at IS NULL")
+
 
 class Post(Base):
     __tablename__ = "posts"
+    __table_args__ = (
+        # Keyset pagination on /feed walks (created_at, id) in descending order
+        Index("ix_posts_created_at_id", "created_at", "id", sqlite_where=NOT_DELETED, postgresql_where=NOT_DELETED),
+        # ... and on profile pages within one user's posts
+        Index(
+            "ix_posts_user_id_created_at_id", "user_id", "created_at", "id",
+            sqlite_where=NOT_DELETED, postgresql_where=NOT_DELETED,
+        ),
+        # The purge (app.purge) walks deleted posts oldest first
+        Index(
+            "ix_posts_deleted_at", "deleted_at",
+            sqlite_where=text("deleted_at IS NOT NULL"), postgresql_where=text("deleted_at IS NOT NULL"),
+        ),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("user.id"),nullable=False)
+    # Same column type as user.id so the feed join compares like with like on SQLite
+    user_id = Column(GUID, ForeignKey("user.id"),nullable=False)
+    # Copy of the author's email so feeds never join the user table, kept in
+    # sync by UserManager.on_after_update
+    author_email = Column(String(320), nullable=False)
     caption = Column(Text)
-    url = Column(String, nullable=False)
+    # Set once the file is in media storage, see app.processing
+    url = Column(String, nullable=True)
     file_type = Column(String, nullable=False)
     file_name = Column(String, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    # Provider-side id of the asset (see app.storage.StoredMedia.key)
+    storage_key = Column(String, nullable=True)
+    # pending until its process_upload job has run, then ready (or failed)
+    status = Column(String, nullable=False, default="ready", server_default="ready")
+    # Smallest of the renditions, the poster frame for videos
+    thumbnail_url = Column(String, nullable=True)
+    thumbnail_key = Column(String, nullable=True)
+    # [{"width", "url", "key"}] narrowest first, see app.renditions
+    renditions = Column(JSON, nullable=True)
+    # sha256 of the uploaded bytes, the MediaAsset this post shares once ready
+    content_hash = Column(String(64), nullable=True)
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    duration = Column(Float, nullable=True)
+    created_at = Column(DateTime, default=utcnow)
+    # Set by the delete endpoints, the row and its media go later, see app.purge
+    deleted_at = Column(DateTime, nullable=True)
+    # Denormalized from likes and comments, written in batches by app.counters
+    like_count = Column(Integer, nullable=False, default=0, server_default="0")
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     user = relationship("User", back_populates="posts")
 
 
-engine = create_async_engine(DATABASE_URL)
-async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
+class Follow(Base):
+    __tablename__ = "follows"
+    __table_args__ = (
+        # Fan-out looks up the followers of an author
+        Index("ix_follows_followee_id", "followee_id"),
+    )
+
+    follower_id = Column(GUID, ForeignKey("user.id"), primary_key=True)
+    followee_id = Column(GUID, ForeignKey("user.id"), primary_key=True)
+    created_at = Column(DateTime, default=utcnow)
+
+
+class TimelineEntry(Base):
+    """
+    A post in one user's home timeline, written by fan-out (see app.timeline).
 
-async def create_db_and_tables():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    The primary key doubles as the index /home walks: one user's entries in
+    (created_at, post_id) order. created_at is the post's.
+    """
+    __tablename__ = "timeline_entries"
+    __table_args__ = (
+        Index("ix_timeline_entries_post_id", "post_id"),
+    )
 
+    user_id = Column(GUID, ForeignKey("user.id"), primary_key=True)
+    created_at = Column(DateTime, primary_key=True)
+    post_id = Column(UUID(as_uuid=True), ForeignKey("posts.id"), primary_key=True)
+    author_id = Column(GUID, nullable=False)
+
+
+class Like(Base):
+    __tablename__ = "likes"
+    __table_args__ = (
+        # Purging a post drops its likes
+        Index("ix_likes_post_id", "post_id"),
+    )
+
+    # Viewer first: feeds look up which posts of a page the viewer liked
+    user_id = Column(GUID, ForeignKey("user.id"), primary_key=True)
+    post_id = Column(UUID(as_uuid=True), ForeignKey("posts.id"), primary_key=True)
+    created_at = Column(DateTime, default=utcnow)
+
+
+class Comment(Base):
+    __tablename__ = "comments"
+    __table_args__ = (
+        # A post's comments are paged newest first
+        Index("ix_comments_post_id_created_at_id", "post_id", "created_at", "id"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    post_id = Column(UUID(as_uuid=True), ForeignKey("posts.id"), nullable=False)
+    user_id = Column(GUID, ForeignKey("user.id"), nullable=False)
+    # Like posts.author_email, kept in sync by UserManager.on_after_update
+    author_email = Column(String(320), nullable=False)
+    body = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=utcnow)
+
+
+class MediaAsset(Base):
+    """
+    Stored media by content hash, shared by every post of the same bytes.
+
+    ref_count is the number of ready posts using it, see app.assets.
+    """
+    __tablename__ = "media_assets"
+
+    content_hash = Column(String(64), primary_key=True)
+    url = Column(String, nullable=False)
+    file_type = Column(String, nullable=False)
+    storage_key = Column(String, nullable=False)
+    thumbnail_url = Column(String, nullable=True)
+    thumbnail_key = Column(String, nullable=True)
+    renditions = Column(JSON, nullable=True)
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    duration = Column(Float, nullable=True)
+    ref_count = Column(Integer, nullable=False, default=1)
+    created_at = Column(DateTime, default=utcnow)
+
+
+class UploadSession(Base):
+    """
+    A resumable upload in progress, see app.resumable.
+
+    Its chunks are assembled in STAGING_ROOT; received is the number of
+    bytes acknowledged so far, always a whole number of chunks until the last.
+    """
+    __tablename__ = "upload_sessions"
+    __table_args__ = (
+        # Abandoned uploads are found by their last activity
+        Index("ix_upload_sessions_updated_at", "updated_at"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(GUID, ForeignKey("user.id"), nullable=False)
+    file_name = Column(String, nullable=False)
+    content_type = Column(String, nullable=False)
+    caption = Column(Text)
+    size = Column(BigInteger, nullable=False)
+    chunk_size = Column(Integer, nullable=False)
+    received = Column(BigInteger, nullable=False, default=0)
+    path = Column(String, nullable=False)
+    created_at = Column(DateTime, default=utcnow)
+    updated_at = Column(DateTime, nullable=False, default=utcnow)
+
+
+class Job(Base):
+    """A unit of background work, see app.jobs"""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Workers claim the oldest due job of a given status
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    kind = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    # queued, running or failed. Finished jobs are deleted.
+    status = Column(String, nullable=False, default="queued")
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    run_at = Column(DateTime, nullable=False, default=utcnow)
+    locked_by = Column(String, nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=utcnow)
+
+
+def normalize_database_url(url: str) -> str:
+    """Point bare postgres URLs (as handed out by most hosts) at the asyncpg driver"""
+    parsed = make_url(url)
+    if parsed.drivername in ("postgres", "postgresql"):
+        parsed = parsed.set(drivername="postgresql+asyncpg")
+    return parsed.render_as_string(hide_password=False)
+
+
+def engine_options(url: str) -> dict:
+    options = {
+        "echo": config.DB_ECHO,
+        "pool_pre_ping": config.DB_POOL_PRE_PING,
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_timeout": config.DB_POOL_TIMEOUT,
+        "pool_recycle": config.DB_POOL_RECYCLE,
+    }
+    if make_url(url).get_backend_name() == "sqlite":
+        # Pre-ping and recycling buy nothing for a local file
+        options.update(pool_pre_ping=False, pool_recycle=-1)
+    return options
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers run alongside the single writer, and busy_timeout makes
+    # competing writers wait instead of failing with "database is locked"
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_BYTES}")
+    cursor.close()
+
+
+def make_engine(url: str = DATABASE_URL, **overrides):
+    url = normalize_database_url(url)
+    engine = create_async_engine(url, **{**engine_options(url), **overrides})
+    if engine.dialect.name == "sqlite":
+        event.listen(engine.sync_engine, "connect", set_sqlite_pragmas)
+    return engine
+
+
+engine = make_engine()
+async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
 async def get_async_session() -> AsyncGenerator:
     async with async_session_maker() as session:
@@ -0,0 +1,124 @@
+"""
+Likes and comments.
+
+Each like and comment is a row (likes, comments); the counts the feeds
+show are denormalized onto posts and kept up by app.counters. Pages
+already carry the counts from the feed query (or cache); for_viewer adds
+the viewer's own view of a page (fresh counts, liked, is_owner) with one
+batched lookup, however many posts and likes there are.
+"""
+import uuid
+
+from fastapi import HTTPException
+from sqlalchemy import and_, delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.counters import get_counters
+from app.db import Comment, Like, Post
+from app.feed import VISIBLE
+from app.pagination import keyset_before, next_cursor
+
+
+async def get_visible_post(session: AsyncSession, post_id) -> uuid.UUID:
+    post = await session.scalar(select(Post.id).where(Post.id == post_id, VISIBLE))
+    if post is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return post
+
+
+async def like(session: AsyncSession, user_id, post_id) -> bool:
+    """
+    Like a post, in the session's transaction. False when already liked.
+
+    A concurrent like of the same pair fails on the primary key at commit.
+    """
+    if await session.get(Like, (user_id, post_id)) is not None:
+        return False
+    session.add(Like(user_id=user_id, post_id=post_id))
+    return True
+
+
+async def unlike(session: AsyncSession, user_id, post_id) -> bool:
+    """Take a like back, in the session's transaction. False when there was none."""
+    result = await session.execute(
+        delete(Like)
+        .where(Like.user_id == user_id, Like.post_id == post_id)
+        .returning(Like.post_id)
+        .execution_options(synchronize_session=False)
+    )
+    return result.first() is not None
+
+
+async def like_count(session: AsyncSession, post_id) -> int:
+    count = await session.scalar(select(Post.like_count).where(Post.id == post_id))
+    return (count or 0) + get_counters().pending(post_id, "like_count")
+
+
+def add_comment(session: AsyncSession, user, post_id, body: str) -> Comment:
+    comment = Comment(id=uuid.uuid4(), post_id=post_id, user_id=user.id, author_email=user.email, body=body)
+    session.add(comment)
+    return comment
+
+
+async def delete_comment(session: AsyncSession, user, comment_id) -> uuid.UUID:
+    """
+    Delete a comment by its author or the post's, in the session's
+    transaction. Returns the post it was on.
+    """
+    row = (await session.execute(
+        select(Comment.user_id, Comment.post_id, Post.user_id.label("post_author_id"))
+        .join(Post, Post.id == Comment.post_id)
+        .where(Comment.id == comment_id, Post.deleted_at.is_(None))
+    )).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Comment not found")
+    if user.id not in (row.user_id, row.post_author_id):
+        raise HTTPException(status_code=403, detail="You are not allowed to delete this comment")
+    await session.execute(
+        delete(Comment).where(Comment.id == comment_id).execution_options(synchronize_session=False)
+    )
+    return row.post_id
+
+
+async def fetch_comments_page(session: AsyncSession, post_id, before: str | None, limit: int):
+    """One page of a post's comments, newest first, and the cursor of the next"""
+    query = (
+        select(Comment)
+        .where(Comment.post_id == post_id)
+        .order_by(Comment.created_at.desc(), Comment.id.desc())
+    )
+    if before:
+        query = query.where(keyset_before(Comment.created_at, Comment.id, before))
+    result = await session.execute(query.limit(limit + 1))
+    return next_cursor(result.scalars().all(), limit)
+
+
+async def for_viewer(session: AsyncSession, viewer_id, posts: list[dict]) -> list[dict]:
+    """
+    Serialized posts as `viewer_id` sees them: is_owner, liked, and the
+    counts as of now rather than as of when the page was cached. One query
+    for the whole page, the likes primary key answers liked.
+    """
+    if not posts:
+        return []
+    # Pages cached in a shared backend come back with string ids
+    ids = [post["id"] if isinstance(post["id"], uuid.UUID) else uuid.UUID(post["id"]) for post in posts]
+    result = await session.execute(
+        select(Post.id, Post.like_count, Post.comment_count, Like.post_id.is_not(None).label("liked"))
+        .outerjoin(Like, and_(Like.post_id == Post.id, Like.user_id == viewer_id))
+        .where(Post.id.in_(ids))
+    )
+    counters = get_counters()
+    current = {
+        row.id: {
+            "like_count": row.like_count + counters.pending(row.id, "like_count"),
+            "comment_count": row.comment_count + counters.pending(row.id, "comment_count"),
+            "liked": row.liked,
+        }
+        for row in result
+    }
+    viewer_ids = (viewer_id, str(viewer_id))
+    return [
+        {**post, "liked": False, **current.get(post_id, {}), "is_owner": post["user_id"] in viewer_ids}
+        for post, post_id in zip(posts, ids)
+    ]
@@ -0,0 +1,176 @@
+"""
+Feed events pushed to clients over server-sent events (GET /events).
+
+    event: post_created     data: the post as the feed returns it
+    event: post_deleted     data: {"id": ...}
+    event: resync           data: {}  the client missed events, refetch
+
+Clients apply these to the feed they already have instead of refetching
+it. Events go through a broker: memory delivers them within one process,
+redis (the redis extra) relays them between every API and worker process.
+"""
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+import orjson
+
+from app.config import EVENTS_BACKEND, EVENTS_HEARTBEAT, EVENTS_QUEUE_SIZE, EVENTS_URL
+from app.feed import fetch_posts, serialize_feed_row
+
+logger = logging.getLogger("app.events")
+
+RESYNC = {"type": "resync"}
+# Ends a stream, see Broker.close
+CLOSED = {"type": "closed"}
+# How long clients wait before reconnecting
+RETRY_MS = 3000
+
+
+class Subscription:
+    def __init__(self, size: int = EVENTS_QUEUE_SIZE):
+        self.queue: asyncio.Queue[dict] = asyncio.Queue(size)
+
+    def put(self, event: dict) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too slow to keep up: drop its backlog and have it refetch instead
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+    def close(self) -> None:
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(CLOSED)
+
+    async def get(self, timeout: float) -> dict | None:
+        """Next event, None when there was none for `timeout` seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except TimeoutError:
+            return None
+
+
+class Broker(ABC):
+    def __init__(self):
+        self._subscriptions: set[Subscription] = set()
+
+    async def subscribe(self) -> Subscription:
+        subscription = Subscription()
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscriptions.discard(subscription)
+
+    def close(self) -> None:
+        """End every open stream in this process, its clients reconnect"""
+        for subscription in list(self._subscriptions):
+            subscription.close()
+
+    def deliver(self, event: dict) -> None:
+        """Hand an event to the subscribers in this process"""
+        for subscription in list(self._subscriptions):
+            subscription.put(event)
+
+    @abstractmethod
+    async def publish(self, event: dict) -> None:
+        ...
+
+
+class MemoryBroker(Broker):
+    """Subscribers only see events published in the same process"""
+
+    async def publish(self, event):
+        self.deliver(event)
+
+
+class RedisBroker(Broker):
+    """
+    Shared across processes through one redis channel.
+
+    Each process holds a single pubsub connection however many clients it
+    serves, and delivers what it reads to its local subscribers.
+    """
+
+    def __init__(self, url: str = EVENTS_URL, channel: str = "feed:events"):
+        import redis.asyncio as redis
+
+        super().__init__()
+        self._redis = redis.from_url(url)
+        self._channel = channel
+        self._listener: asyncio.Task | None = None
+
+    async def publish(self, event):
+        await self._redis.publish(self._channel, orjson.dumps(event))
+
+    async def subscribe(self):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen(), name="events-listener")
+        return await super().subscribe()
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self._channel)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.deliver(orjson.loads(message["data"]))
+            except Exception:
+                logger.warning("lost the redis events channel, reconnecting", exc_info=True)
+            # Whatever was published while it was down is lost
+            self.deliver(RESYNC)
+            await asyncio.sleep(RETRY_MS / 1000)
+
+
+BACKENDS = {
+    "memory": MemoryBroker,
+    "redis": RedisBroker,
+}
+
+
+@lru_cache
+def get_broker() -> Broker:
+    try:
+        return BACKENDS[EVENTS_BACKEND]()
+    except KeyError:
+        raise RuntimeError(f"Unknown EVENTS_BACKEND {EVENTS_BACKEND!r}, expected one of {sorted(BACKENDS)}")
+
+
+async def publish_created(session, ids) -> None:
+    """Announce posts that just became ready"""
+    broker = get_broker()
+    for row in await fetch_posts(session, ids):
+        await broker.publish({"type": "post_created", "post": serialize_feed_row(row)})
+
+
+async def publish_deleted(ids) -> None:
+    broker = get_broker()
+    for post_id in ids:
+        await broker.publish({"type": "post_deleted", "id": post_id})
+
+
+def format_event(event: dict, viewer_id) -> bytes:
+    data = event.get("post") or {key: value for key, value in event.items() if key != "type"}
+    if event["type"] == "post_created":
+        # Nobody has liked a post that was just published
+        data = {**data, "liked": False, "is_owner": str(data["user_id"]) == str(viewer_id)}
+    return b"event: " + event["type"].encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+async def event_stream(broker: Broker, viewer_id):
+    """The SSE body for one client, with a comment line as heartbeat while idle"""
+    subscription = await broker.subscribe()
+    try:
+        yield f"retry: {RETRY_MS}\n\n".encode()
+        while True:
+            event = await subscription.get(EVENTS_HEARTBEAT)
+            if event is CLOSED:
+                return
+            yield b": ping\n\n" if event is None else format_event(event, viewer_id)
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,94 @@
+import hashlib
+
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import Post
+from app.pagination import keyset_before, next_cursor
+
+# Posts every feed shows. deleted_at IS NULL has to be in the query as is for
+# the partial feed indexes to apply.
+VISIBLE = and_(Post.status == "ready", Post.deleted_at.is_(None))
+
+FEED_COLUMNS = (
+    Post.id,
+    Post.user_id,
+    Post.caption,
+    Post.url,
+    Post.created_at,
+    Post.file_type,
+    Post.file_name,
+    Post.thumbnail_url,
+    Post.width,
+    Post.height,
+    Post.duration,
+    Post.renditions,
+    Post.author_email.label("email"),
+    Post.like_count,
+    Post.comment_count,
+)
+
+
+def feed_query(before: str | None, limit: int, author_id=None):
+    """
+    One page of posts projected to the columns the feed returns, optionally
+    of one author only. Either way an index walk of limit + 1 rows.
+    """
+    query = (
+        select(*FEED_COLUMNS)
+        .where(VISIBLE)
+        .order_by(Post.created_at.desc(), Post.id.desc())
+    )
+    if author_id is not None:
+        query = query.where(Post.user_id == author_id)
+    if before:
+        query = query.where(keyset_before(Post.created_at, Post.id, before))
+    return query.limit(limit + 1)
+
+
+async def fetch_feed_page(session: AsyncSession, before: str | None, limit: int, author_id=None):
+    result = await session.execute(feed_query(before, limit, author_id))
+    return next_cursor(result.all(), limit)
+
+
+async def fetch_posts(session: AsyncSession, ids) -> list:
+    """Visible posts among `ids`, in no particular order"""
+    result = await session.execute(
+        select(*FEED_COLUMNS).where(Post.id.in_(ids), VISIBLE)
+    )
+    return result.all()
+
+
+def serialize_feed_row(row) -> dict:
+    """Everything the feed returns for a post except the per-viewer is_owner flag"""
+    # UUIDs stay as they are, OrjsonResponse encodes them natively
+    return {
+        "id": row.id,
+        "user_id": row.user_id,
+        "caption" : row.caption,
+        "url" : row.url,
+        "created_at" : row.created_at.isoformat() if row.created_at else None,
+        "file_type" : row.file_type,
+        "file_name" : row.file_name,
+        "thumbnail_url" : row.thumbnail_url,
+        "width" : row.width,
+        "height" : row.height,
+        "duration" : row.duration,
+        "srcset" : [{"width": r["width"], "url": r["url"]} for r in row.renditions or ()],
+        "email" : row.email,
+        "like_count" : row.like_count,
+        "comment_count" : row.comment_count,
+    }
+
+
+def body_etag(body: bytes) -> str:
+    """
+    ETag of a rendered page. Taken from the body the viewer gets, so a like,
+    a new comment count or is_owner changes it as surely as a new post does.
+    """
+    return f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+
+
+def if_none_match(request, etag: str) -> bool:
+    header = request.headers.get("if-none-match", "")
+    return any(tag.strip() in (etag, "*") for tag in header.split(",") if tag.strip())
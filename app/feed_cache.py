@@ -0,0 +1,160 @@
+import secrets
+from abc import ABC, abstractmethod
+from collections.abc import Awaitable, Callable
+from functools import lru_cache
+from typing import Any
+
+import orjson
+
+from app.cache import TTLCache
+from app.config import (
+    FEED_CACHE_BACKEND,
+    FEED_CACHE_PAGES,
+    FEED_CACHE_SIZE,
+    FEED_CACHE_TTL,
+    FEED_CACHE_URL,
+)
+
+# (posts, next_cursor) with posts already serialized, minus per-viewer fields
+FeedPage = tuple[list[dict], str | None]
+
+
+class FeedCacheBackend(ABC):
+    """
+    Storage for cached feed pages.
+
+    Keys embed the feed version, so invalidating the whole feed is a single
+    version bump and stale pages simply age out.
+    """
+
+    @abstractmethod
+    async def get_version(self) -> str:
+        ...
+
+    @abstractmethod
+    async def bump_version(self) -> str:
+        ...
+
+    @abstractmethod
+    async def get(self, key: str) -> Any | None:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any) -> None:
+        ...
+
+
+class MemoryFeedCacheBackend(FeedCacheBackend):
+    def __init__(self, maxsize: int = FEED_CACHE_SIZE, ttl: float = FEED_CACHE_TTL):
+        # The random epoch keeps versions (and so cache keys) from two workers from ever colliding
+        self._epoch = secrets.token_hex(4)
+        self._counter = 0
+        self._pages = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get_version(self):
+        return f"{self._epoch}.{self._counter}"
+
+    async def bump_version(self):
+        self._counter += 1
+        self._pages.clear()
+        return await self.get_version()
+
+    async def get(self, key):
+        return self._pages.get(key)
+
+    async def set(self, key, value):
+        self._pages.set(key, value)
+
+
+class RedisFeedCacheBackend(FeedCacheBackend):
+    """Shared across workers, so an upload on one worker invalidates all of them"""
+
+    def __init__(self, url: str = FEED_CACHE_URL, ttl: float = FEED_CACHE_TTL, prefix: str = "feed"):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self._ttl = int(ttl)
+        self._prefix = prefix
+
+    async def get_version(self):
+        version = await self._redis.get(f"{self._prefix}:version")
+        return version.decode() if version else "0"
+
+    async def bump_version(self):
+        return str(await self._redis.incr(f"{self._prefix}:version"))
+
+    async def get(self, key):
+        value = await self._redis.get(f"{self._prefix}:{key}")
+        return None if value is None else orjson.loads(value)
+
+    async def set(self, key, value):
+        await self._redis.set(f"{self._prefix}:{key}", orjson.dumps(value), ex=self._ttl)
+
+
+class FeedCache:
+    """
+    Caches the first `pages` pages of the global feed and of every profile
+    (`scope`).
+
+    A page is only cached when its cursor came from an earlier cached page,
+    which bounds the cache to the top of the feed that everyone reads.
+    """
+
+    def __init__(self, backend: FeedCacheBackend | None, pages: int = FEED_CACHE_PAGES):
+        self.backend = backend
+        self.pages = pages
+
+    async def version(self) -> str | None:
+        """Current feed version, None when caching is off"""
+        if self.backend is None:
+            return None
+        return await self.backend.get_version()
+
+    async def invalidate(self) -> None:
+        if self.backend is not None:
+            await self.backend.bump_version()
+
+    async def page(
+        self,
+        version: str | None,
+        before: str | None,
+        limit: int,
+        load: Callable[[], Awaitable[FeedPage]],
+        scope: str = "feed",
+    ) -> FeedPage:
+        if self.backend is None:
+            return await load()
+
+        key = f"{version}:{scope}:page:{limit}:{before or ''}"
+        cached = await self.backend.get(key)
+        if cached is not None:
+            return cached["posts"], cached["next_cursor"]
+
+        depth = 0
+        if before:
+            depth = await self.backend.get(f"{version}:{scope}:depth:{limit}:{before}")
+            if depth is None:
+                return await load()
+
+        posts, next_cursor = await load()
+        if depth < self.pages:
+            await self.backend.set(key, {"posts": posts, "next_cursor": next_cursor})
+            if next_cursor:
+                await self.backend.set(f"{version}:{scope}:depth:{limit}:{next_cursor}", depth + 1)
+        return posts, next_cursor
+
+
+BACKENDS = {
+    "memory": MemoryFeedCacheBackend,
+    "redis": RedisFeedCacheBackend,
+}
+
+
+@lru_cache
+def get_feed_cache() -> FeedCache:
+    if FEED_CACHE_BACKEND == "none":
+        return FeedCache(None)
+    try:
+        return FeedCache(BACKENDS[FEED_CACHE_BACKEND]())
+    except KeyError:
+        raise RuntimeError(f"Unknown FEED_CACHE_BACKEND {FEED_CACHE_BACKEND!r}, expected none or one of {sorted(BACKENDS)}")
@@ -13,3 +13,18 @@ imagekit = ImageKit(
     private_key=os.getenv("IMAGE_PRIVATE_KEY"),
     base_url=os.getenv("IMAGE_URL")
 )
+
+
+def upload_stream(reader, filename, content_type, **options):
+    """
+    Upload from a non-seekable reader (blocking, run it off the event loop).
+
+    httpx streams file objects it cannot size with chunked transfer
+    encoding. Retries are disabled because the stream cannot be rewound.
+    """
+    options = {"folder": "/uploads", "tags": ["backend-upload"], **options}
+    return imagekit.with_options(max_retries=0).files.upload(
+        file=(filename, reader, content_type),
+        file_name=filename,
+        **options
+    )
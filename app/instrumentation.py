@@ -0,0 +1,230 @@
+"""
+Request timing, named spans and a Prometheus-style /metrics endpoint.
+
+    with span("db.feed_query"):
+        rows = await session.execute(...)
+
+Spans and requests are recorded into in-process histograms, so there is
+nothing to configure and nothing is written on the hot path. Each worker
+exposes its own numbers; scrape every worker (or aggregate) as usual.
+"""
+import asyncio
+import bisect
+import logging
+import logging.handlers
+import queue
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.config import LOG_LEVEL, PROFILE_DIR, PROFILE_SAMPLE_RATE, SLOW_REQUEST_MS
+
+logger = logging.getLogger("app")
+
+# Seconds, roughly log-spaced from 1ms to 10s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...], buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+inf last), sum, count]
+        self._series: dict[tuple, list] = defaultdict(lambda: [[0] * (len(self.buckets) + 1), 0.0, 0])
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series[label_values]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        for label_values, counts, total, count in sorted(snapshot):
+            labels = ",".join(f'{name}="{value}"' for name, value in zip(self.labels, label_values))
+            prefix = f"{labels}," if labels else ""
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route template",
+    ("method", "route", "status"),
+)
+SPAN_LATENCY = Histogram(
+    "app_span_duration_seconds",
+    "Time spent in named sections of request handling (db, serialization, storage)",
+    ("span",),
+)
+HISTOGRAMS = [REQUEST_LATENCY, SPAN_LATENCY]
+
+
+@contextmanager
+def span(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        SPAN_LATENCY.observe(time.perf_counter() - start, name)
+
+
+def render_metrics() -> str:
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    return "\n".join(lines) + "\n"
+
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+def route_template(scope) -> str:
+    # Newer FastAPI keeps included routes un-prefixed in scope["route"] and
+    # records the full template in its effective route context
+    context = scope.get("fastapi", {}).get("effective_route_context")
+    route = scope.get("route")
+    return (
+        getattr(context, "path_format", None)
+        or getattr(route, "path_format", None)
+        or getattr(route, "path", None)
+        or "unmatched"
+    )
+
+
+class TimingMiddleware:
+    """
+    Pure ASGI middleware recording per-route latency.
+
+    Requests are labelled by route template (/posts/{post_id}), not by raw
+    path, to keep the number of series bounded. Requests taking
+    SLOW_REQUEST_MS or more are logged, except event streams, which are
+    meant to stay open. A PROFILE_SAMPLE_RATE fraction of requests is also
+    run under pyinstrument and written to PROFILE_DIR.
+    """
+
+    def __init__(self, app, sample_rate: float = PROFILE_SAMPLE_RATE, profile_dir: str = PROFILE_DIR):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.profile_dir = Path(profile_dir)
+        if sample_rate > 0:
+            try:
+                import pyinstrument  # noqa: F401
+            except ImportError:
+                logger.warning("PROFILE_SAMPLE_RATE is set but pyinstrument is not installed, profiling is off")
+                self.sample_rate = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        streaming = False
+
+        async def send_wrapper(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                streaming = any(
+                    name.lower() == b"content-type" and value.startswith(b"text/event-stream")
+                    for name, value in message.get("headers", ())
+                )
+            await send(message)
+
+        profiler = self._start_profiler() if self.sample_rate and random.random() < self.sample_rate else None
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            template = route_template(scope)
+            REQUEST_LATENCY.observe(elapsed, scope["method"], template, str(status))
+            if elapsed * 1000 >= SLOW_REQUEST_MS and not streaming:
+                logger.warning("slow request %s %s took %.0fms (status %s)", scope["method"], template, elapsed * 1000, status)
+            if profiler is not None:
+                await self._save_profile(profiler, scope["method"], template)
+
+    def _start_profiler(self):
+        from pyinstrument import Profiler
+
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        return profiler
+
+    async def _save_profile(self, profiler, method: str, template: str) -> None:
+        profiler.stop()
+        slug = template.strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+        path = self.profile_dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{method}-{slug}-{random.randrange(1 << 16):04x}.html"
+        # Rendering and writing the report would hold up the event loop
+        await asyncio.to_thread(self._write_profile, profiler, path)
+
+    def _write_profile(self, profiler, path: Path) -> None:
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        path.write_text(profiler.output_html())
+
+
+_log_listener: logging.handlers.QueueListener | None = None
+_log_handlers: list[logging.Handler] = []
+
+
+def start_logging() -> None:
+    """
+    Route all logging through a QueueHandler.
+
+    Handlers that do I/O run on the listener's thread, so a log call on the
+    event loop only costs a queue put.
+    """
+    global _log_listener, _log_handlers
+    if _log_listener is not None:
+        return
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    _log_handlers = root.handlers[:]
+    handlers = _log_handlers or [logging.StreamHandler()]
+    for handler in handlers:
+        if handler.formatter is None:
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(LOG_LEVEL)
+    _log_listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _log_listener.start()
+
+
+def stop_logging() -> None:
+    """Flush queued records and put the original handlers back"""
+    global _log_listener
+    if _log_listener is None:
+        return
+    _log_listener.stop()
+    _log_listener = None
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        if isinstance(handler, logging.handlers.QueueHandler):
+            root.removeHandler(handler)
+    for handler in _log_handlers:
+        root.addHandler(handler)
@@ -0,0 +1,121 @@
+"""
+Persistent job queue in the application database.
+
+    enqueue(session, "process_upload", {"post_id": str(post.id), ...})
+    await session.commit()
+    notify()
+
+Jobs are rows in the jobs table, written in the same transaction as the
+data they act on, so nothing is lost on a crash and any process sharing
+the database can run them (see app.worker). Failed jobs are retried with
+exponential backoff until max_attempts, then kept with status "failed".
+"""
+import asyncio
+import random
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from datetime import timedelta
+
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import JOB_LOCK_TIMEOUT, JOB_MAX_ATTEMPTS, JOB_RETRY_BASE_SECONDS, JOB_RETRY_MAX_SECONDS
+from app.db import Job, utcnow
+
+
+@dataclass
+class JobHandler:
+    run: Callable[[dict], Awaitable[None]]
+    # Called once a job has failed for the last time
+    on_failure: Callable[[dict, Exception], Awaitable[None]] | None = None
+
+
+HANDLERS: dict[str, JobHandler] = {}
+
+# Lets workers in this process pick up a job as soon as it is committed
+# instead of on their next poll
+_wakeup = asyncio.Event()
+
+
+def handler(kind: str, *, on_failure=None):
+    """Register the coroutine function that runs jobs of `kind`"""
+    def register(fn):
+        HANDLERS[kind] = JobHandler(fn, on_failure)
+        return fn
+    return register
+
+
+def enqueue(session: AsyncSession, kind: str, payload: dict, *, max_attempts: int = JOB_MAX_ATTEMPTS) -> Job:
+    """Add a job to the session, it becomes visible to workers on commit"""
+    job = Job(kind=kind, payload=payload, max_attempts=max_attempts, run_at=utcnow())
+    session.add(job)
+    return job
+
+
+def notify() -> None:
+    _wakeup.set()
+
+
+async def wait_for_jobs(timeout: float) -> None:
+    try:
+        await asyncio.wait_for(_wakeup.wait(), timeout)
+    except TimeoutError:
+        pass
+    _wakeup.clear()
+
+
+def backoff(attempts: int) -> float:
+    delay = min(JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1), JOB_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.5, 1.5)
+
+
+async def claim(session: AsyncSession, worker_id: str) -> Job | None:
+    """
+    Lock the oldest due job for `worker_id` and count the attempt.
+
+    One UPDATE ... WHERE id = (SELECT ... FOR UPDATE SKIP LOCKED), so two
+    workers never get the same job: Postgres skips rows another claim has
+    locked and SQLite runs one writer at a time. Jobs left running by a
+    dead worker are claimable again after JOB_LOCK_TIMEOUT.
+    """
+    now = utcnow()
+    due = or_(
+        and_(Job.status == "queued", Job.run_at <= now),
+        and_(Job.status == "running", Job.locked_at < now - timedelta(seconds=JOB_LOCK_TIMEOUT)),
+    )
+    candidate = (
+        select(Job.id)
+        .where(due)
+        .order_by(Job.run_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    result = await session.execute(
+        update(Job)
+        .where(Job.id == candidate, due)
+        .values(status="running", locked_by=worker_id, locked_at=now, attempts=Job.attempts + 1)
+        .returning(Job)
+        .execution_options(synchronize_session=False)
+    )
+    job = result.scalars().first()
+    await session.commit()
+    return job
+
+
+async def finish(session: AsyncSession, job: Job) -> None:
+    await session.execute(delete(Job).where(Job.id == job.id))
+    await session.commit()
+
+
+async def retry_or_fail(session: AsyncSession, job: Job, error: str) -> bool:
+    """Requeue `job` with backoff, or mark it failed when out of attempts. True if it failed for good."""
+    final = job.attempts >= job.max_attempts
+    values = {"locked_by": None, "locked_at": None, "last_error": error}
+    if final:
+        values["status"] = "failed"
+    else:
+        values.update(status="queued", run_at=utcnow() + timedelta(seconds=backoff(job.attempts)))
+    await session.execute(update(Job).where(Job.id == job.id).values(**values))
+    await session.commit()
+    return final
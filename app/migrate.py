@@ -0,0 +1,109 @@
+"""
+Schema migrations (Alembic, scripts in migrations/versions).
+
+Workers never change the schema. Run this once per deploy instead:
+
+    python -m app.migrate                 # upgrade to the latest revision
+    python -m app.migrate current         # any other alembic command works too
+
+A database made by create_all before there were migrations has exactly the
+schema of revision 0001. Adopt it once, then upgrade as usual:
+
+    python -m app.migrate stamp 0001
+    python -m app.migrate
+
+Revisions that index existing tables use create_index_online and
+friends, so a deploy on Postgres never blocks writes to a large table.
+
+The app only checks on startup that the database is at the latest revision.
+"""
+import sys
+from pathlib import Path
+
+from alembic import command, op
+from alembic.config import CommandLine, Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+def alembic_config() -> Config:
+    return Config(str(ALEMBIC_INI))
+
+
+def head_revision() -> str:
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+
+def upgrade(revision: str = "head") -> None:
+    command.upgrade(alembic_config(), revision)
+
+
+async def current_revision(engine: AsyncEngine) -> str | None:
+    async with engine.connect() as conn:
+        return await conn.run_sync(
+            lambda sync_conn: MigrationContext.configure(sync_conn).get_current_revision()
+        )
+
+
+async def check_schema_version(engine: AsyncEngine) -> None:
+    """Fail fast when the database is behind (or ahead of) the code"""
+    current, head = await current_revision(engine), head_revision()
+    if current != head:
+        raise SchemaOutOfDate(
+            f"Database schema is at revision {current or 'none'}, the code expects {head}. "
+            "Run `python -m app.migrate` before starting the app."
+        )
+
+
+def create_index_online(name: str, table: str, columns: list[str], **kwargs) -> None:
+    """
+    For migrations: create an index on a table that may be large and busy.
+
+    On Postgres the index is built CONCURRENTLY, without blocking writes.
+    That can't run in a transaction, so it runs in an autocommit block.
+    A failed concurrent build leaves an INVALID index behind: drop it
+    before running the migration again. Elsewhere a plain CREATE INDEX.
+    """
+    if op.get_context().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            op.create_index(name, table, columns, postgresql_concurrently=True, **kwargs)
+    else:
+        op.create_index(name, table, columns, **kwargs)
+
+
+def drop_index_online(name: str, table: str) -> None:
+    if op.get_context().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
+    else:
+        op.drop_index(name, table_name=table)
+
+
+def replace_index_online(name: str, table: str, columns: list[str], **kwargs) -> None:
+    """
+    Change an index's definition under the same name. On Postgres the new
+    index is built before the old one is dropped, so queries always have one.
+    """
+    if op.get_context().dialect.name == "postgresql":
+        create_index_online(f"{name}_new", table, columns, **kwargs)
+        drop_index_online(name, table)
+        op.execute(f"ALTER INDEX {name}_new RENAME TO {name}")
+    else:
+        op.drop_index(name, table_name=table)
+        op.create_index(name, table, columns, **kwargs)
+
+
+def main(argv: list[str] | None = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    CommandLine(prog="python -m app.migrate").main(["-c", str(ALEMBIC_INI), *(argv or ["upgrade", "head"])])
+
+
+if __name__ == "__main__":
+    main()
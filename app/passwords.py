@@ -0,0 +1,78 @@
+"""
+Password hashing off the event loop.
+
+Argon2 (and bcrypt, for older hashes) take a few hundred milliseconds of
+CPU by design. fastapi-users calls its password helper synchronously from
+the user manager's coroutines, so every login or registration would stall
+the whole worker for that long. PooledPasswordHelper runs the work on a
+small thread pool instead (both hashers release the GIL), and UserManager
+(app.users) computes hashes there before handing over to the library:
+
+    await password_helper.prepare(password)     # hashed on the pool
+    password_helper.hash(password)              # returns the prepared hash
+
+PASSWORD_HASH_WORKERS bounds the CPU a login storm can take from the rest
+of the app. Hashes made with other parameters than the configured ones
+are upgraded on the next successful login.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi_users.password import PasswordHelper
+from pwdlib import PasswordHash
+from pwdlib.hashers.argon2 import Argon2Hasher
+from pwdlib.hashers.bcrypt import BcryptHasher
+
+from app.config import (
+    PASSWORD_ARGON2_MEMORY_COST,
+    PASSWORD_ARGON2_PARALLELISM,
+    PASSWORD_ARGON2_TIME_COST,
+    PASSWORD_BCRYPT_ROUNDS,
+    PASSWORD_HASH_WORKERS,
+)
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
+
+async def run_in_password_pool(fn, /, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args))
+
+
+def password_hash() -> PasswordHash:
+    # The first hasher makes new hashes, the others only verify old ones
+    return PasswordHash((
+        Argon2Hasher(
+            time_cost=PASSWORD_ARGON2_TIME_COST,
+            memory_cost=PASSWORD_ARGON2_MEMORY_COST,
+            parallelism=PASSWORD_ARGON2_PARALLELISM,
+        ),
+        BcryptHasher(rounds=PASSWORD_BCRYPT_ROUNDS),
+    ))
+
+
+class PooledPasswordHelper(PasswordHelper):
+    """
+    One per user manager, so per request: prepared hashes never outlive the
+    request that made them.
+    """
+
+    def __init__(self):
+        super().__init__(password_hash())
+        self._prepared: dict[str, str] = {}
+
+    async def hash_async(self, password: str) -> str:
+        return await run_in_password_pool(self.password_hash.hash, password)
+
+    async def prepare(self, password: str) -> None:
+        """Hash `password` on the pool, for the next hash() of it"""
+        self._prepared[password] = await self.hash_async(password)
+
+    async def verify_and_update_async(self, plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+        return await run_in_password_pool(self.password_hash.verify_and_update, plain_password, hashed_password)
+
+    def hash(self, password: str) -> str:
+        prepared = self._prepared.pop(password, None)
+        # Paths that were not prepared still work, on the event loop
+        return prepared if prepared is not None else super().hash(password)
@@ -0,0 +1,231 @@
+"""
+Post-upload processing.
+
+/upload only stages (and hashes) the file under STAGING_ROOT, inserts a
+pending post and enqueues a process_upload job, unless the same bytes were
+stored before (see app.assets). The job (run by app.worker) pushes the
+file to media storage, reads its dimensions and duration, stores its
+renditions (app.renditions) and marks the post ready.
+
+Metadata and renditions need Pillow (the media extra) for images and
+ffmpeg/ffprobe on PATH for videos. Without them, or for files they cannot
+read, posts are published without either.
+"""
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from app.assets import add_reference, apply_asset, asset_from_post
+from app.config import RENDITION_PROCESSES, RENDITION_QUALITY, RENDITION_WIDTHS, STAGING_ROOT
+from app.db import MediaAsset, Post, async_session_maker
+from app.events import publish_created
+from app.feed_cache import get_feed_cache
+from app.instrumentation import span
+from app.jobs import enqueue, handler
+from app.renditions import describe, rendition_key
+from app.storage import copy_to_file, file_type_for, get_storage
+from app.timeline import fan_out
+from app.uploads import run_in_upload_pool
+
+logger = logging.getLogger("app.processing")
+
+@dataclass
+class StagedFile:
+    path: str
+    filename: str
+    content_type: str
+    content_hash: str
+
+
+async def stage_upload(reader, filename, content_type) -> StagedFile:
+    """Upload sink writing the file to STAGING_ROOT for a job to pick up, hashing it on the way"""
+    path = Path(STAGING_ROOT).resolve() / f"{uuid.uuid4().hex}{os.path.splitext(filename)[1].lower()}"
+    digest = hashlib.sha256()
+    await run_in_upload_pool(copy_to_file, reader, path, digest)
+    return StagedFile(path=str(path), filename=filename, content_type=content_type, content_hash=digest.hexdigest())
+
+
+def discard_staged(*staged: StagedFile) -> None:
+    for file in staged:
+        Path(file.path).unlink(missing_ok=True)
+
+
+async def create_posts(session, user, uploads: list[tuple[StagedFile, str]]) -> list[Post]:
+    """
+    Posts for staged uploads, in the session's transaction.
+
+    Content already in media_assets is shared and its post is ready at
+    once (its staged file can go after commit). Everything else gets a
+    pending post and a process_upload job. Ready posts are queued for
+    fan-out to the author's followers.
+    """
+    hashes = {upload.content_hash for upload, _ in uploads}
+    result = await session.execute(select(MediaAsset).where(MediaAsset.content_hash.in_(hashes)))
+    assets = {asset.content_hash: asset for asset in result.scalars()}
+
+    posts = []
+    for upload, caption in uploads:
+        post = Post(
+            id=uuid.uuid4(),
+            user_id=user.id,
+            author_email=user.email,
+            caption=caption,
+            file_type=file_type_for(upload.content_type),
+            file_name=upload.filename,
+            content_hash=upload.content_hash,
+            status="pending",
+        )
+        asset = assets.get(upload.content_hash)
+        if asset is not None and await add_reference(session, asset.content_hash):
+            apply_asset(post, asset)
+            post.status = "ready"
+            fan_out(session, post)
+        else:
+            enqueue(session, "process_upload", {
+                "post_id": str(post.id),
+                "path": upload.path,
+                "content_type": upload.content_type,
+            })
+        posts.append(post)
+    session.add_all(posts)
+    return posts
+
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def rendition_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn, not fork: the parent runs an event loop and several threads
+        _pool = ProcessPoolExecutor(max_workers=RENDITION_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_rendition_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def make_renditions(path: str, file_type: str) -> tuple[dict, list[tuple[int, bytes]]]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        rendition_pool(), describe, path, file_type, RENDITION_WIDTHS, RENDITION_QUALITY
+    )
+
+
+async def store_renditions(storage, renditions: list[tuple[int, bytes]]) -> list[dict]:
+    stored = await asyncio.gather(*(
+        storage.put(rendition_key(data), data, "image/jpeg") for _, data in renditions
+    ))
+    return [
+        {"width": width, "url": media.url, "key": media.key}
+        for (width, _), media in zip(renditions, stored)
+    ]
+
+
+async def mark_failed(payload: dict, error: Exception) -> None:
+    async with async_session_maker() as session:
+        post = await session.get(Post, uuid.UUID(payload["post_id"]))
+        if post is not None:
+            post.status = "failed"
+            await session.commit()
+    Path(payload["path"]).unlink(missing_ok=True)
+
+
+@handler("process_upload", on_failure=mark_failed)
+async def process_upload(payload: dict) -> None:
+    """
+    Publish a staged upload.
+
+    The upload is committed before anything else, so a retry after a
+    failure does not store the file a second time. Renditions are content
+    addressed, storing them again is a no-op.
+    """
+    path = Path(payload["path"])
+    storage = get_storage()
+    async with async_session_maker() as session:
+        post = await session.get(Post, uuid.UUID(payload["post_id"]))
+        if post is None or post.deleted_at is not None:
+            # Deleted while it was still pending, app.purge removes the rest
+            path.unlink(missing_ok=True)
+            return
+        if post.status != "pending":
+            return
+
+        # The same bytes may have been published since /upload looked
+        asset = await session.get(MediaAsset, post.content_hash) if post.content_hash else None
+        if asset is None or not await add_reference(session, asset.content_hash):
+            await store_post_media(session, storage, post, path, payload["content_type"])
+            if post.content_hash:
+                session.add(asset_from_post(post))
+        else:
+            discard_own_upload(session, post)
+            apply_asset(post, asset)
+        post.status = "ready"
+        fan_out(session, post)
+        try:
+            await session.commit()
+        except IntegrityError:
+            # Another job published the same content first: share its asset
+            await session.rollback()
+            await session.refresh(post)
+            discard_own_upload(session, post)
+            asset = await session.get(MediaAsset, post.content_hash)
+            if asset is None or not await add_reference(session, asset.content_hash):
+                raise
+            apply_asset(post, asset)
+            post.status = "ready"
+            fan_out(session, post)
+            await session.commit()
+        await publish_created(session, [post.id])
+
+    path.unlink(missing_ok=True)
+    await get_feed_cache().invalidate()
+
+
+async def store_post_media(session, storage, post: Post, path: Path, content_type: str) -> None:
+    if post.storage_key is None:
+        with span("job.storage_upload"), open(path, "rb") as file:
+            stored = await storage.save(file, post.file_name, content_type)
+        post.url = stored.url
+        post.file_type = stored.file_type
+        post.storage_key = stored.key
+        await session.commit()
+
+    with span("job.renditions"):
+        metadata, renditions = await make_renditions(str(path), post.file_type)
+    with span("job.renditions_upload"):
+        post.renditions = await store_renditions(storage, renditions)
+    if post.renditions:
+        post.thumbnail_url = post.renditions[0]["url"]
+        post.thumbnail_key = post.renditions[0]["key"]
+
+    post.width = metadata.get("width")
+    post.height = metadata.get("height")
+    post.duration = metadata.get("duration")
+
+
+def discard_own_upload(session, post: Post) -> None:
+    """Drop what an earlier attempt stored for `post`, it is about to share an asset instead"""
+    if post.storage_key is None:
+        return
+    enqueue(session, "delete_media", {"keys": [post.storage_key]})
+    post.storage_key = None
+
+
+@handler("delete_media")
+async def delete_media(payload: dict) -> None:
+    """Remove stored objects no post refers to any more"""
+    await get_storage().delete_many(payload["keys"])
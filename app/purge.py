@@ -0,0 +1,95 @@
+"""
+Purge of deleted posts.
+
+The delete endpoints only set posts.deleted_at: the post leaves every feed
+(VISIBLE in app.feed, and the partial feed indexes) and the request is one
+UPDATE. The rest happens here, in the job workers: every
+POST_PURGE_INTERVAL seconds, posts deleted for POST_PURGE_DELAY seconds
+are removed in batches of POST_PURGE_BATCH, along with their timeline
+entries, likes, comments and media references (app.assets). The storage keys nothing uses
+any more go to one delete_media job per batch, which deletes them through
+the backend's bulk API and is retried like any job.
+
+Several workers may purge at once: each batch is deleted with RETURNING
+and only the rows a worker actually deleted are released.
+
+The same timer drops abandoned resumable uploads (app.resumable).
+"""
+import asyncio
+import logging
+from datetime import timedelta
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.assets import release_posts
+from app.config import POST_PURGE_BATCH, POST_PURGE_DELAY, POST_PURGE_INTERVAL
+from app.db import Comment, Like, Post, async_session_maker, utcnow
+from app.jobs import enqueue, notify
+from app.resumable import purge_expired_uploads
+from app.timeline import remove_from_timelines
+
+logger = logging.getLogger("app.purge")
+
+
+async def purge_batch(session: AsyncSession, limit: int = POST_PURGE_BATCH, delay: float = POST_PURGE_DELAY) -> int:
+    """Purge up to `limit` of the posts deleted longest ago, returns how many"""
+    cutoff = utcnow() - timedelta(seconds=delay)
+    ids = (await session.execute(
+        select(Post.id)
+        .where(Post.deleted_at < cutoff)
+        .order_by(Post.deleted_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )).scalars().all()
+    if not ids:
+        return 0
+
+    await remove_from_timelines(session, ids)
+    await session.execute(delete(Like).where(Like.post_id.in_(ids)).execution_options(synchronize_session=False))
+    await session.execute(delete(Comment).where(Comment.post_id.in_(ids)).execution_options(synchronize_session=False))
+    result = await session.execute(
+        delete(Post)
+        .where(Post.id.in_(ids))
+        .returning(Post.id, Post.status, Post.content_hash, Post.storage_key, Post.renditions)
+        .execution_options(synchronize_session=False)
+    )
+    purged = result.all()
+    unused_keys = await release_posts(session, purged)
+    if unused_keys:
+        enqueue(session, "delete_media", {"keys": unused_keys})
+    await session.commit()
+    if unused_keys:
+        notify()
+    return len(purged)
+
+
+async def purge_deleted(session_maker=async_session_maker, limit: int = POST_PURGE_BATCH) -> int:
+    """Purge batches until none is left that is due, returns how many posts"""
+    total = 0
+    while True:
+        async with session_maker() as session:
+            count = await purge_batch(session, limit)
+        total += count
+        if count < limit:
+            return total
+
+
+async def run_purge(stopping: asyncio.Event, session_maker=async_session_maker,
+                    interval: float = POST_PURGE_INTERVAL) -> None:
+    """Purge every `interval` seconds until `stopping` is set, see app.worker"""
+    while not stopping.is_set():
+        try:
+            purged = await purge_deleted(session_maker)
+            if purged:
+                logger.info("purged %d deleted posts", purged)
+            async with session_maker() as session:
+                expired = await purge_expired_uploads(session)
+            if expired:
+                logger.info("dropped %d abandoned uploads", expired)
+        except Exception:
+            logger.exception("purging deleted posts failed")
+        try:
+            await asyncio.wait_for(stopping.wait(), interval)
+        except TimeoutError:
+            pass
@@ -0,0 +1,159 @@
+"""
+Token-bucket rate limits, used in front of the auth routes.
+
+A limit "30/60" allows bursts of 30 requests and refills at 30 per 60
+seconds. Buckets live in a store: memory (per process, so N workers allow
+N times the limit) or redis (shared, needs the redis extra).
+
+    await get_rate_limiter().check(f"ip:{ip}", AUTH_RATE_LIMIT_IP)    # raises 429
+"""
+import math
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from functools import lru_cache
+
+from fastapi import HTTPException, Request
+
+from app.cache import TTLCache
+from app.config import (
+    AUTH_RATE_LIMIT_ACCOUNT,
+    AUTH_RATE_LIMIT_IP,
+    RATE_LIMIT_BACKEND,
+    RATE_LIMIT_SIZE,
+    RATE_LIMIT_URL,
+)
+
+
+@dataclass(frozen=True)
+class Rate:
+    capacity: int
+    period: float
+
+    @classmethod
+    def parse(cls, value: str) -> "Rate":
+        capacity, period = value.split("/")
+        return cls(int(capacity), float(period))
+
+    @property
+    def per_second(self) -> float:
+        return self.capacity / self.period
+
+
+class RateLimitStore(ABC):
+    @abstractmethod
+    async def take(self, key: str, rate: Rate) -> float:
+        """Take a token from `key`'s bucket: 0 if there was one, else seconds until there is"""
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    def __init__(self, maxsize: int = RATE_LIMIT_SIZE, timer=time.monotonic):
+        self.timer = timer
+        # Least recently used buckets go first when full, those are the likeliest to be full again anyway
+        self._buckets = TTLCache(maxsize=maxsize, ttl=math.inf, timer=timer)
+
+    async def take(self, key, rate):
+        now = self.timer()
+        tokens, updated_at = self._buckets.get(key, (rate.capacity, now))
+        tokens = min(rate.capacity, tokens + (now - updated_at) * rate.per_second)
+        if tokens < 1:
+            self._buckets.set(key, (tokens, now))
+            return (1 - tokens) / rate.per_second
+        self._buckets.set(key, (tokens - 1, now))
+        return 0.0
+
+
+class RedisRateLimitStore(RateLimitStore):
+    """Shared across workers, each take is one atomic script call"""
+
+    SCRIPT = """
+    local capacity, per_second, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated_at = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * per_second)
+    local wait = 0
+    if tokens < 1 then
+        wait = (1 - tokens) / per_second
+    else
+        tokens = tokens - 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / per_second))
+    return tostring(wait)
+    """
+
+    def __init__(self, url: str = RATE_LIMIT_URL, prefix: str = "ratelimit"):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self._script = self._redis.register_script(self.SCRIPT)
+        self._prefix = prefix
+
+    async def take(self, key, rate):
+        # Wall clock, the one time every worker agrees on
+        wait = await self._script(keys=[f"{self._prefix}:{key}"], args=[rate.capacity, rate.per_second, time.time()])
+        return float(wait)
+
+
+class RateLimiter:
+    def __init__(self, store: RateLimitStore | None):
+        self.store = store
+
+    async def check(self, key: str, rate: Rate) -> None:
+        if self.store is None:
+            return
+        wait = await self.store.take(key, rate)
+        if wait > 0:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests, try again later",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+
+BACKENDS = {
+    "memory": MemoryRateLimitStore,
+    "redis": RedisRateLimitStore,
+}
+
+
+@lru_cache
+def get_rate_limiter() -> RateLimiter:
+    if RATE_LIMIT_BACKEND == "none":
+        return RateLimiter(None)
+    try:
+        return RateLimiter(BACKENDS[RATE_LIMIT_BACKEND]())
+    except KeyError:
+        raise RuntimeError(f"Unknown RATE_LIMIT_BACKEND {RATE_LIMIT_BACKEND!r}, expected none or one of {sorted(BACKENDS)}")
+
+
+IP_RATE = Rate.parse(AUTH_RATE_LIMIT_IP)
+ACCOUNT_RATE = Rate.parse(AUTH_RATE_LIMIT_ACCOUNT)
+
+
+async def account_of(request: Request) -> str | None:
+    """The account an auth request is about: the login form's username or the JSON body's email"""
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("application/x-www-form-urlencoded"):
+        # Cached on the request, the route reads the same parsed form
+        return (await request.form()).get("username")
+    if content_type.startswith("application/json"):
+        try:
+            body = await request.json()
+        except ValueError:
+            return None
+        return body.get("email") if isinstance(body, dict) else None
+    return None
+
+
+async def limit_auth(request: Request) -> None:
+    """
+    Dependency of the auth routes. Runs before the handler, so requests
+    over the limit are turned away before any password is hashed.
+    """
+    limiter = get_rate_limiter()
+    await limiter.check(f"ip:{request.client.host if request.client else 'unknown'}", IP_RATE)
+    account = await account_of(request)
+    if isinstance(account, str) and account:
+        await limiter.check(f"account:{account.strip().lower()}", ACCOUNT_RATE)
@@ -0,0 +1,111 @@
+"""
+Fixed-width renditions of uploaded media.
+
+Every image gets a JPEG per RENDITION_WIDTHS entry narrower than itself
+(plus one at its own width if it is narrower than the widest), every
+video a poster frame in the same widths. They are made once, by the
+upload job, and stored under the hash of their bytes, so clients pick a
+ready-made URL from the feed's srcset instead of asking a CDN to
+transform the original per view.
+
+Decoding and resizing is CPU-bound and holds the GIL, so app.processing
+runs it in a small process pool. The pool's processes import this module:
+keep it free of app imports (settings are passed in).
+"""
+import hashlib
+import io
+import json
+import logging
+import shutil
+import subprocess
+
+logger = logging.getLogger("app.renditions")
+
+FFMPEG_TIMEOUT = 60
+# EXIF orientations that swap width and height
+ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def rendition_key(data: bytes) -> str:
+    return f"renditions/{hashlib.sha256(data).hexdigest()}.jpg"
+
+
+def target_widths(width: int, widths: list[int]) -> list[int]:
+    """Configured widths below `width`, never upscaling"""
+    targets = [w for w in widths if w < width]
+    if width <= widths[-1]:
+        targets.append(width)
+    return targets
+
+
+def image_renditions(source, widths: list[int], quality: int) -> tuple[dict, list[tuple[int, bytes]]]:
+    """Dimensions of an image file (path or file object) and a JPEG per target width"""
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as image:
+        width, height = image.size
+        if image.getexif().get(0x0112) in ROTATED_ORIENTATIONS:
+            width, height = height, width
+        targets = target_widths(width, widths)
+        # Lets JPEG decode at a fraction of full resolution, square so either
+        # side can end up as the width once EXIF rotation is applied
+        image.draft("RGB", (targets[-1], targets[-1]))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+
+    renditions = []
+    # Widest first, each smaller one is resized from the previous
+    for target in reversed(targets):
+        if image.width != target:
+            image = image.resize((target, max(1, round(image.height * target / image.width))), Image.LANCZOS)
+        out = io.BytesIO()
+        image.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+        renditions.append((target, out.getvalue()))
+    return {"width": width, "height": height}, renditions[::-1]
+
+
+def video_renditions(path: str, widths: list[int], quality: int) -> tuple[dict, list[tuple[int, bytes]]]:
+    """Dimensions and duration of a video and renditions of a poster frame from it"""
+    probe = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0",
+         "-show_entries", "stream=width,height:format=duration", "-of", "json", path],
+        capture_output=True, check=True, timeout=FFMPEG_TIMEOUT,
+    )
+    info = json.loads(probe.stdout)
+    stream = (info.get("streams") or [{}])[0]
+    duration = info.get("format", {}).get("duration")
+    metadata = {
+        "width": stream.get("width"),
+        "height": stream.get("height"),
+        "duration": float(duration) if duration else None,
+    }
+
+    poster = None
+    # One second in skips the black first frame most clips start with
+    for offset in ("1", "0"):
+        result = subprocess.run(
+            ["ffmpeg", "-v", "error", "-ss", offset, "-i", path, "-frames:v", "1",
+             "-vf", f"scale='min({widths[-1]},iw)':-2", "-f", "image2", "-c:v", "mjpeg", "pipe:1"],
+            capture_output=True, check=True, timeout=FFMPEG_TIMEOUT,
+        )
+        if result.stdout:
+            poster = result.stdout
+            break
+    if poster is None:
+        return metadata, []
+    _, renditions = image_renditions(io.BytesIO(poster), widths, quality)
+    return metadata, renditions
+
+
+def describe(path: str, file_type: str, widths: list[int], quality: int) -> tuple[dict, list[tuple[int, bytes]]]:
+    """Blocking: (metadata, renditions) for a staged file, empty when it cannot be read"""
+    try:
+        if file_type == "image":
+            return image_renditions(path, widths, quality)
+        if file_type == "video" and shutil.which("ffprobe") and shutil.which("ffmpeg"):
+            return video_renditions(path, widths, quality)
+    except ImportError:
+        logger.info("Pillow is not installed, media is published without metadata or renditions")
+    except Exception:
+        logger.warning("could not read metadata of %s", path, exc_info=True)
+    return {}, []
+
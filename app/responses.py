@@ -0,0 +1,16 @@
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class OrjsonResponse(JSONResponse):
+    """
+    JSON rendered by orjson.
+
+    UUIDs and datetimes are encoded natively, so handlers can return plain
+    dicts of column values without a jsonable_encoder pass. Returning one
+    of these also skips FastAPI's response_model validation; the model
+    still documents the shape in OpenAPI.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
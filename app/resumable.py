@@ -0,0 +1,216 @@
+"""
+Resumable chunked uploads, for files too large to send in one request.
+
+    POST   /uploads                     {filename, content_type, size, caption} -> status
+    PUT    /uploads/{id}/chunks/{n}     raw bytes of chunk n                     -> status
+    GET    /uploads/{id}                                                         -> status
+    POST   /uploads/{id}/complete                                                -> the post
+    DELETE /uploads/{id}                                                         abort
+
+Chunks are chunk_size bytes (the last one may be shorter) and are sent in
+order: the status says which one is next, so a client that lost its
+connection asks for it and carries on from the last acknowledged chunk.
+Each chunk is streamed straight to its offset in the staged file and
+synced before it is acknowledged, so memory stays constant whatever the
+file size. Complete hands the assembled file to the same process_upload
+job as /upload, which streams it to the storage backend in chunks.
+
+Chunks may go to any API process: they all need the same STAGING_ROOT.
+Uploads left untouched for RESUMABLE_UPLOAD_TTL are dropped by app.purge.
+"""
+import asyncio
+import hashlib
+import os
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from fastapi import HTTPException, Request
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import RESUMABLE_MAX_BYTES, RESUMABLE_UPLOAD_TTL, STAGING_ROOT, UPLOAD_CHUNK_BYTES
+from app.db import UploadSession, utcnow
+from app.processing import StagedFile
+from app.storage import COPY_CHUNK_BYTES
+from app.uploads import ChunkPipe, run_in_upload_pool
+
+
+def chunk_count(upload: UploadSession) -> int:
+    return -(-upload.size // upload.chunk_size)
+
+
+def upload_status(upload: UploadSession) -> dict:
+    return {
+        "id": upload.id,
+        "size": upload.size,
+        "chunk_size": upload.chunk_size,
+        "received": upload.received,
+        "next_chunk": upload.received // upload.chunk_size if upload.received < upload.size else chunk_count(upload),
+        "chunks": chunk_count(upload),
+    }
+
+
+def create_file(path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch(exist_ok=False)
+
+
+async def start_upload(session: AsyncSession, user, filename: str, content_type: str, size: int,
+                       caption: str) -> UploadSession:
+    """A new upload session and its empty staged file, in the session's transaction"""
+    if size > RESUMABLE_MAX_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File exceeds the {RESUMABLE_MAX_BYTES // (1024 * 1024)}MB upload limit",
+        )
+    upload_id = uuid.uuid4()
+    path = Path(STAGING_ROOT).resolve() / f"{upload_id.hex}{os.path.splitext(filename)[1].lower()}"
+    await run_in_upload_pool(create_file, path)
+    upload = UploadSession(
+        id=upload_id,
+        user_id=user.id,
+        file_name=filename,
+        content_type=content_type,
+        caption=caption,
+        size=size,
+        chunk_size=UPLOAD_CHUNK_BYTES,
+        received=0,
+        path=str(path),
+    )
+    session.add(upload)
+    return upload
+
+
+async def get_upload(session: AsyncSession, upload_id, user) -> UploadSession:
+    upload = await session.scalar(
+        select(UploadSession).where(UploadSession.id == upload_id, UploadSession.user_id == user.id)
+    )
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload
+
+
+def write_at(reader, path: Path, offset: int) -> None:
+    """Blocking: drain `reader` into `path` from `offset` on, synced to disk"""
+    with open(path, "r+b") as out:
+        out.seek(offset)
+        while chunk := reader.read(COPY_CHUNK_BYTES):
+            out.write(chunk)
+        out.flush()
+        os.fsync(out.fileno())
+
+
+async def receive_chunk(request: Request, path: Path, offset: int, length: int) -> None:
+    """Stream the request body into `path` at `offset`, it has to be exactly `length` bytes"""
+    declared = request.headers.get("content-length")
+    if declared is not None and declared.isdigit() and int(declared) != length:
+        raise HTTPException(status_code=400, detail=f"Chunk must be {length} bytes")
+
+    pipe = ChunkPipe(asyncio.get_running_loop())
+    task = asyncio.create_task(run_in_upload_pool(write_at, pipe, path, offset))
+    task.add_done_callback(lambda _: pipe.abandon())
+    received = 0
+    try:
+        async for data in request.stream():
+            received += len(data)
+            if received > length:
+                raise HTTPException(status_code=400, detail=f"Chunk must be {length} bytes")
+            await pipe.feed(data)
+        if received != length:
+            raise HTTPException(status_code=400, detail=f"Chunk must be {length} bytes")
+        await pipe.finish()
+        await task
+    except BaseException as exc:
+        # Whatever was written past the acknowledged bytes is overwritten by the resend
+        if not task.done():
+            await pipe.finish(exc)
+        await asyncio.gather(task, return_exceptions=True)
+        raise
+
+
+async def put_chunk(session: AsyncSession, request: Request, upload: UploadSession, index: int) -> None:
+    """
+    Store chunk `index` and acknowledge it. Chunks already acknowledged are
+    accepted again without being written, so a client unsure whether its
+    last chunk arrived can simply resend it.
+    """
+    if not 0 <= index < chunk_count(upload):
+        raise HTTPException(status_code=400, detail=f"Chunk index must be between 0 and {chunk_count(upload) - 1}")
+    offset = index * upload.chunk_size
+    if offset < upload.received:
+        return
+    if offset > upload.received:
+        raise HTTPException(status_code=409, detail=f"Expected chunk {upload.received // upload.chunk_size} first")
+
+    length = min(upload.chunk_size, upload.size - offset)
+    # Done with the database until the chunk is on disk, which may take a while
+    upload_id = upload.id
+    await session.commit()
+    await receive_chunk(request, Path(upload.path), offset, length)
+    # Only moves forward: a concurrent resend of the same chunk acknowledges nothing twice
+    await session.execute(
+        update(UploadSession)
+        .where(UploadSession.id == upload_id, UploadSession.received == offset)
+        .values(received=offset + length, updated_at=utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+    await session.refresh(upload)
+
+
+def file_digest(path: Path) -> str:
+    """Blocking: sha256 of the file, read in bounded pieces"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(COPY_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def finish_upload(session: AsyncSession, upload: UploadSession) -> tuple[StagedFile, str]:
+    """
+    The assembled file as a staged upload with its caption. Removes the
+    upload session in the session's transaction, so it completes only once.
+    """
+    if upload.received < upload.size:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Upload incomplete, expected chunk {upload.received // upload.chunk_size} next",
+        )
+    content_hash = await run_in_upload_pool(file_digest, Path(upload.path))
+    result = await session.execute(
+        delete(UploadSession)
+        .where(UploadSession.id == upload.id)
+        .returning(UploadSession.id)
+        .execution_options(synchronize_session=False)
+    )
+    if result.first() is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    staged = StagedFile(path=upload.path, filename=upload.file_name, content_type=upload.content_type,
+                        content_hash=content_hash)
+    return staged, upload.caption or ""
+
+
+async def abort_upload(session: AsyncSession, upload: UploadSession) -> None:
+    await session.execute(
+        delete(UploadSession).where(UploadSession.id == upload.id).execution_options(synchronize_session=False)
+    )
+    await session.commit()
+    Path(upload.path).unlink(missing_ok=True)
+
+
+async def purge_expired_uploads(session: AsyncSession, ttl: float = RESUMABLE_UPLOAD_TTL) -> int:
+    """Drop uploads untouched for `ttl` seconds and their staged files, returns how many"""
+    cutoff = utcnow() - timedelta(seconds=ttl)
+    result = await session.execute(
+        delete(UploadSession)
+        .where(UploadSession.updated_at < cutoff)
+        .returning(UploadSession.path)
+        .execution_options(synchronize_session=False)
+    )
+    paths = result.scalars().all()
+    await session.commit()
+    for path in paths:
+        Path(path).unlink(missing_ok=True)
+    return len(paths)
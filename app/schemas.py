@@ -1,7 +1,12 @@
-from pydantic import BaseModel
+from datetime import datetime
+from typing import Literal
+
+from pydantic import BaseModel, ConfigDict, Field
 from fastapi_users import schemas
 import uuid
 
+from app.config import MAX_BATCH_SIZE, MAX_COMMENT_LENGTH
+
 
 class PostCreate(BaseModel):
     title: str
@@ -11,6 +16,121 @@ class PostResponse(BaseModel):
     title: str
     content: str
 
+class PostRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: uuid.UUID
+    user_id: uuid.UUID
+    caption: str | None
+    url: str | None
+    file_type: str
+    file_name: str
+    status: str
+    thumbnail_url: str | None
+    created_at: datetime
+
+
+class Rendition(BaseModel):
+    width: int
+    url: str
+
+
+class FeedPost(BaseModel):
+    id: uuid.UUID
+    user_id: uuid.UUID
+    caption: str | None
+    url: str
+    created_at: str | None
+    file_type: str
+    file_name: str
+    thumbnail_url: str | None
+    width: int | None
+    height: int | None
+    duration: float | None
+    # Ready-made widths of the image, or of the poster frame for videos
+    srcset: list[Rendition]
+    email: str
+    like_count: int
+    comment_count: int
+    # Per viewer, like is_owner
+    liked: bool
+    is_owner: bool
+
+
+class FeedPage(BaseModel):
+    posts: list[FeedPost]
+    next_cursor: str | None
+
+
+class PostBatch(BaseModel):
+    posts: list[FeedPost]
+    # Requested ids that do not exist or are not ready yet
+    missing: list[uuid.UUID]
+
+
+class PostIds(BaseModel):
+    ids: list[uuid.UUID] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+
+class DeleteResult(BaseModel):
+    id: uuid.UUID
+    status: Literal["deleted", "not_found", "forbidden"]
+
+
+class BulkDeleteResult(BaseModel):
+    results: list[DeleteResult]
+
+
+class UploadInit(BaseModel):
+    filename: str = Field(min_length=1, max_length=255)
+    content_type: str = "application/octet-stream"
+    size: int = Field(gt=0)
+    caption: str = ""
+
+
+class UploadStatus(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: uuid.UUID
+    size: int
+    chunk_size: int
+    # Bytes acknowledged so far: resume by sending chunk next_chunk
+    received: int
+    next_chunk: int
+    chunks: int
+
+
+class LikeStatus(BaseModel):
+    post_id: uuid.UUID
+    liked: bool
+    like_count: int
+
+
+class CommentCreate(BaseModel):
+    body: str = Field(min_length=1, max_length=MAX_COMMENT_LENGTH)
+
+
+class CommentRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: uuid.UUID
+    post_id: uuid.UUID
+    user_id: uuid.UUID
+    author_email: str
+    body: str
+    created_at: datetime
+
+
+class CommentPage(BaseModel):
+    comments: list[CommentRead]
+    next_cursor: str | None
+
+
+class FollowStatus(BaseModel):
+    user_id: uuid.UUID
+    following: bool
+    follower_count: int
+
 class UserRead(schemas.BaseUser[uuid.UUID]):
     pass
 
@@ -0,0 +1,127 @@
+"""
+Full-text search over post captions.
+
+The index is kept by the database itself, so every insert, caption edit
+and delete is reflected whichever code path makes it:
+
+* SQLite: posts_fts, an FTS5 table over posts (external content, keyed by
+  posts.rowid) maintained by triggers on posts, ranked by bm25.
+* Postgres: ix_posts_caption_search, a GIN index on the caption's
+  tsvector, ranked by ts_rank.
+
+Both are created by migration 0007. A query matches the posts whose
+caption has every word of `q` (stemmed), best match first, and pages with
+a (score, id) keyset.
+
+posts.rowid is not stable on SQLite: VACUUM renumbers it. Rebuild the
+index afterwards with `python -m app.search rebuild`. A migration that has
+to copy the posts table (any batch operation on SQLite other than adding
+a column or an index) must also recreate the triggers from 0007 and
+rebuild the index, as the downgrades of 0008 and 0010 do.
+"""
+import argparse
+import asyncio
+import base64
+import re
+import uuid
+
+from fastapi import HTTPException
+from sqlalchemy import and_, column, func, literal_column, or_, select, table, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import Post
+from app.feed import FEED_COLUMNS, VISIBLE
+
+MAX_QUERY_LENGTH = 200
+MAX_TERMS = 16
+# Text search configuration of ix_posts_caption_search, queries must use the same
+POSTGRES_CONFIG = "english"
+POSTGRES_INDEX = "ix_posts_caption_search"
+SQLITE_TABLE = "posts_fts"
+
+posts_fts = table(SQLITE_TABLE, column("rowid"), column("rank"))
+
+
+def is_search_object(name: str | None) -> bool:
+    """Index objects created by hand in migration 0007, unknown to the models"""
+    return bool(name) and (name == POSTGRES_INDEX or name.startswith(SQLITE_TABLE))
+
+
+def search_terms(q: str) -> list[str]:
+    # Words only, so nothing in `q` is parsed as query syntax by either engine
+    return re.findall(r"\w+", q.lower())[:MAX_TERMS]
+
+
+def encode_cursor(score: float, post_id: uuid.UUID) -> str:
+    raw = f"{score!r}|{post_id.hex}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[float, uuid.UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        score, post_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return float(score), uuid.UUID(post_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def search_query(dialect: str, terms: list[str], before: str | None, limit: int):
+    """
+    Ready posts matching every term, projected like the feed plus a score
+    (lower is better), in (score, id) order
+    """
+    if dialect == "postgresql":
+        # Inlined, not bound: the planner only uses the index for the exact expression it was built on
+        config = literal_column(f"'{POSTGRES_CONFIG}'::regconfig")
+        vector = func.to_tsvector(config, func.coalesce(Post.caption, literal_column("''")))
+        tsquery = func.plainto_tsquery(config, " ".join(terms))
+        score = -func.ts_rank(vector, tsquery)
+        query = select(*FEED_COLUMNS, score.label("score")).where(vector.op("@@")(tsquery))
+    else:
+        score = posts_fts.c.rank
+        query = (
+            select(*FEED_COLUMNS, score.label("score"))
+            .join(posts_fts, posts_fts.c.rowid == literal_column("posts.rowid"))
+            .where(literal_column(SQLITE_TABLE).op("MATCH")(" ".join(f'"{term}"' for term in terms)))
+        )
+
+    query = query.where(VISIBLE)
+    if before:
+        after_score, after_id = decode_cursor(before)
+        query = query.where(or_(score > after_score, and_(score == after_score, Post.id > after_id)))
+    return query.order_by(score, Post.id).limit(limit + 1)
+
+
+async def fetch_search_page(session: AsyncSession, q: str, before: str | None, limit: int):
+    terms = search_terms(q)
+    if not terms:
+        return [], None
+    result = await session.execute(search_query(session.get_bind().dialect.name, terms, before, limit))
+    rows = result.all()
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(page[-1].score, page[-1].id)
+
+
+async def rebuild(engine) -> None:
+    """Reindex every caption"""
+    async with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            await conn.execute(text(f"REINDEX INDEX {POSTGRES_INDEX}"))
+        else:
+            await conn.execute(text(f"INSERT INTO {SQLITE_TABLE}({SQLITE_TABLE}) VALUES ('rebuild')"))
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.search", description="Caption search index maintenance")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args(argv)
+
+    from app.db import engine
+    asyncio.run(rebuild(engine))
+
+
+if __name__ == "__main__":
+    main()
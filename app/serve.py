@@ -0,0 +1,170 @@
+"""
+Production server.
+
+    python -m app.serve                            # SERVER_WORKERS processes on SERVER_HOST:SERVER_PORT
+    python -m app.serve --workers 4 --migrate      # upgrade the schema first, once
+
+The supervisor binds the socket, runs migrations if asked to (before any
+worker starts, so they never race on the schema), then starts `workers`
+uvicorn server processes sharing the socket and replaces any that die.
+uvloop and httptools are used when installed (uvicorn[standard] brings both).
+
+SIGTERM/SIGINT drain every worker: it stops accepting connections, ends
+open /events streams (clients reconnect elsewhere), gives in-flight
+requests SERVER_GRACEFUL_TIMEOUT seconds to finish, then runs the lifespan
+shutdown (job workers, database pool).
+
+Several workers need FEED_CACHE_BACKEND=redis (or none): a memory cache
+is per process, so an upload or delete on one worker would leave the
+others serving stale pages. The server refuses to start otherwise.
+
+main.py stays the development entry point: one process, reloading on changes.
+"""
+import argparse
+import importlib.util
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+
+import uvicorn
+
+from app.config import (
+    FEED_CACHE_BACKEND,
+    SERVER_GRACEFUL_TIMEOUT,
+    SERVER_HOST,
+    SERVER_KEEPALIVE,
+    SERVER_PORT,
+    SERVER_WORKERS,
+)
+
+# Configured by uvicorn.Config, unlike the app's loggers which the lifespan sets up
+logger = logging.getLogger("uvicorn.error")
+
+# A worker dying sooner than this after its start is not restarted: it is
+# a configuration problem (schema out of date, bad settings), not bad luck
+MIN_UPTIME = 5
+
+
+class DrainingServer(uvicorn.Server):
+    async def shutdown(self, sockets=None):
+        # /events streams never finish on their own and would hold the drain
+        # open until the timeout
+        from app.events import get_broker
+
+        get_broker().close()
+        await super().shutdown(sockets)
+
+
+def installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def server_config(args) -> uvicorn.Config:
+    return uvicorn.Config(
+        "app.app:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=args.loop if args.loop != "auto" else "uvloop" if installed("uvloop") else "asyncio",
+        http=args.http if args.http != "auto" else "httptools" if installed("httptools") else "h11",
+        timeout_graceful_shutdown=args.graceful_timeout,
+        timeout_keep_alive=args.keepalive,
+        log_level=args.log_level,
+        # Clients see uvicorn in the Server header otherwise
+        server_header=False,
+    )
+
+
+def serve_worker(config: uvicorn.Config, sockets) -> None:
+    # Logging has to be set up again in every spawned process
+    config.configure_logging()
+    try:
+        DrainingServer(config).run(sockets=sockets)
+    except KeyboardInterrupt:
+        pass
+
+
+class Supervisor:
+    """Keeps `config.workers` server processes running on one shared socket"""
+
+    def __init__(self, config: uvicorn.Config):
+        self.config = config
+        # spawn, not fork: nothing of the supervisor's state leaks into workers
+        self.context = multiprocessing.get_context("spawn")
+        self.stopping = threading.Event()
+        self.failed = False
+
+    def start_worker(self, sockets) -> multiprocessing.Process:
+        process = self.context.Process(target=serve_worker, args=(self.config, sockets), name="app-server")
+        process.start()
+        process.started_at = time.monotonic()
+        logger.info("started worker process [%d]", process.pid)
+        return process
+
+    def run(self) -> None:
+        multiprocessing.allow_connection_pickling()
+        sockets = [self.config.bind_socket()]
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda *_: self.stopping.set())
+
+        workers = [self.start_worker(sockets) for _ in range(self.config.workers)]
+        while not self.stopping.wait(1):
+            for i, process in enumerate(workers):
+                if process.is_alive():
+                    continue
+                if time.monotonic() - process.started_at < MIN_UPTIME:
+                    logger.error("worker process [%d] exited with %s right after starting", process.pid, process.exitcode)
+                    self.failed = True
+                    self.stopping.set()
+                    break
+                logger.warning("worker process [%d] exited with %s, replacing it", process.pid, process.exitcode)
+                workers[i] = self.start_worker(sockets)
+
+        # Each worker drains on SIGTERM, see DrainingServer
+        for process in workers:
+            if process.is_alive():
+                process.terminate()
+        for process in workers:
+            process.join()
+        for sock in sockets:
+            sock.close()
+        if self.failed:
+            raise SystemExit(1)
+
+
+def run(config: uvicorn.Config) -> None:
+    if config.workers > 1:
+        Supervisor(config).run()
+    else:
+        DrainingServer(config).run()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.serve", description="Run the API with several worker processes")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    parser.add_argument("--loop", choices=["auto", "uvloop", "asyncio"], default="auto")
+    parser.add_argument("--http", choices=["auto", "httptools", "h11"], default="auto")
+    parser.add_argument("--graceful-timeout", type=float, default=SERVER_GRACEFUL_TIMEOUT)
+    parser.add_argument("--keepalive", type=int, default=SERVER_KEEPALIVE)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--migrate", action="store_true", help="upgrade the database schema before starting workers")
+    args = parser.parse_args(argv)
+    if args.workers > 1 and FEED_CACHE_BACKEND == "memory":
+        parser.error("several workers can't share FEED_CACHE_BACKEND=memory, set it to redis (or none)")
+
+    if args.migrate:
+        from app.migrate import upgrade
+
+        upgrade()
+
+    config = server_config(args)
+    logger.info("starting %d worker(s) on %s:%d with %s and %s", config.workers, config.host, config.port, config.loop, config.http)
+    run(config)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+import io
+import mimetypes
+import os
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import urlparse
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+
+from app.config import MEDIA_BACKEND, MEDIA_ROOT, MEDIA_URL
+from app.uploads import ChunkPipe, run_in_upload_pool
+
+COPY_CHUNK_BYTES = 1024 * 1024
+# Both Cloudinary and ImageKit take at most 100 ids per bulk delete
+BULK_DELETE_LIMIT = 100
+
+
+@dataclass
+class StoredMedia:
+    url: str
+    file_type: str
+    file_name: str
+    # Provider-side identifier, enough to delete the asset later
+    key: str
+
+
+def copy_to_file(reader, path: Path, digest=None) -> None:
+    """Blocking: drain `reader` into `path`, leaving nothing behind on failure"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        with open(path, "wb") as out:
+            while chunk := reader.read(COPY_CHUNK_BYTES):
+                out.write(chunk)
+                if digest is not None:
+                    digest.update(chunk)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+
+
+def file_type_for(content_type: str) -> str:
+    """Map a MIME type onto the image/video/raw buckets the feed understands"""
+    kind = content_type.split("/", 1)[0]
+    return kind if kind in ("image", "video") else "raw"
+
+
+class MediaStorage(ABC):
+    @abstractmethod
+    async def save(self, reader: ChunkPipe, filename: str, content_type: str) -> StoredMedia:
+        """Consume `reader` until EOF and store it under a new key"""
+
+    @abstractmethod
+    async def put(self, key: str, data: bytes, content_type: str) -> StoredMedia:
+        """
+        Store `data` under exactly `key`, for content-addressed files.
+
+        Keys name their content, so storing an existing key again is a no-op
+        (or an identical overwrite) and the result is safe to cache forever.
+        """
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        ...
+
+    async def delete_many(self, keys: list[str]) -> None:
+        """Delete several keys, with as few provider calls as the backend allows"""
+        for key in keys:
+            await self.delete(key)
+
+
+class CloudinaryStorage(MediaStorage):
+    async def save(self, reader, filename, content_type):
+        from app.cloudinary_config import upload_stream
+
+        result = await run_in_upload_pool(upload_stream, reader, filename)
+        resource_type = result.get("resource_type", "image")
+        return StoredMedia(
+            url=result["secure_url"],
+            file_type=resource_type,
+            file_name=result.get("original_filename", filename),
+            key=f"{resource_type}/{result['public_id']}",
+        )
+
+    async def put(self, key, data, content_type):
+        import cloudinary.uploader
+
+        public_id, ext = os.path.splitext(key)
+        # overwrite=False hands back the existing asset instead of uploading again
+        result = await run_in_upload_pool(
+            cloudinary.uploader.upload, io.BytesIO(data),
+            public_id=public_id, format=ext.lstrip(".") or None, overwrite=False,
+            resource_type=file_type_for(content_type),
+        )
+        return StoredMedia(
+            url=result["secure_url"],
+            file_type=result.get("resource_type", "image"),
+            file_name=os.path.basename(key),
+            key=f"{result.get('resource_type', 'image')}/{result['public_id']}",
+        )
+
+    async def delete(self, key):
+        import cloudinary.uploader
+
+        resource_type, public_id = key.split("/", 1)
+        await run_in_upload_pool(cloudinary.uploader.destroy, public_id, resource_type=resource_type)
+
+    async def delete_many(self, keys):
+        import cloudinary.api
+
+        by_type: dict[str, list[str]] = {}
+        for key in keys:
+            resource_type, public_id = key.split("/", 1)
+            by_type.setdefault(resource_type, []).append(public_id)
+        for resource_type, public_ids in by_type.items():
+            for start in range(0, len(public_ids), BULK_DELETE_LIMIT):
+                await run_in_upload_pool(
+                    cloudinary.api.delete_resources,
+                    public_ids[start:start + BULK_DELETE_LIMIT],
+                    resource_type=resource_type,
+                )
+
+
+class ImageKitStorage(MediaStorage):
+    async def save(self, reader, filename, content_type):
+        from app.images import upload_stream
+
+        result = await run_in_upload_pool(upload_stream, reader, filename, content_type)
+        return StoredMedia(
+            url=result.url,
+            file_type=result.file_type,
+            file_name=result.name,
+            key=result.file_id,
+        )
+
+    async def put(self, key, data, content_type):
+        from app.images import imagekit
+
+        folder, file_name = os.path.split(key)
+        result = await run_in_upload_pool(
+            imagekit.files.upload,
+            file=(file_name, data, content_type),
+            file_name=file_name,
+            folder=f"/{folder}",
+            use_unique_file_name=False,
+            # Same name means same content, overwriting changes nothing
+            overwrite_file=True,
+        )
+        return StoredMedia(url=result.url, file_type=result.file_type, file_name=result.name, key=result.file_id)
+
+    async def delete(self, key):
+        from app.images import imagekit
+
+        await run_in_upload_pool(imagekit.files.delete, key)
+
+    async def delete_many(self, keys):
+        from app.images import imagekit
+
+        for start in range(0, len(keys), BULK_DELETE_LIMIT):
+            await run_in_upload_pool(imagekit.files.bulk.delete, file_ids=keys[start:start + BULK_DELETE_LIMIT])
+
+
+class LocalStorage(MediaStorage):
+    """
+    Files on local disk, served by the app itself under MEDIA_URL.
+
+    Meant for offline load tests and on-prem installs without a CDN.
+    """
+
+    def __init__(self, root: str = MEDIA_ROOT, base_url: str = MEDIA_URL):
+        self.root = Path(root).resolve()
+        self.base_url = base_url.rstrip("/")
+
+    def path_for(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if not path.is_relative_to(self.root):
+            raise HTTPException(status_code=404, detail="Not found")
+        return path
+
+    async def save(self, reader, filename, content_type):
+        key = f"uploads/{uuid.uuid4().hex}{os.path.splitext(filename)[1].lower()}"
+        await run_in_upload_pool(copy_to_file, reader, self.path_for(key))
+        return StoredMedia(
+            url=f"{self.base_url}/{key}",
+            file_type=file_type_for(content_type),
+            file_name=filename,
+            key=key,
+        )
+
+    def _put(self, path: Path, data: bytes) -> None:
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Written aside and renamed, so a half-written file never has the final name
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    async def put(self, key, data, content_type):
+        await run_in_upload_pool(self._put, self.path_for(key), data)
+        return StoredMedia(
+            url=f"{self.base_url}/{key}",
+            file_type=file_type_for(content_type),
+            file_name=os.path.basename(key),
+            key=key,
+        )
+
+    async def delete(self, key):
+        await run_in_upload_pool(self.path_for(key).unlink, missing_ok=True)
+
+    def _delete_many(self, paths: list[Path]) -> None:
+        for path in paths:
+            path.unlink(missing_ok=True)
+
+    async def delete_many(self, keys):
+        await run_in_upload_pool(self._delete_many, [self.path_for(key) for key in keys])
+
+
+BACKENDS = {
+    "cloudinary": CloudinaryStorage,
+    "imagekit": ImageKitStorage,
+    "local": LocalStorage,
+}
+
+
+@lru_cache
+def get_storage() -> MediaStorage:
+    try:
+        return BACKENDS[MEDIA_BACKEND]()
+    except KeyError:
+        raise RuntimeError(f"Unknown MEDIA_BACKEND {MEDIA_BACKEND!r}, expected one of {sorted(BACKENDS)}")
+
+
+media_router = APIRouter()
+
+
+@media_router.get(urlparse(MEDIA_URL).path.rstrip("/") + "/{key:path}", include_in_schema=False)
+async def serve_media(key: str, storage: MediaStorage = Depends(get_storage)):
+    if not isinstance(storage, LocalStorage):
+        raise HTTPException(status_code=404, detail="Not found")
+    path = storage.path_for(key)
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="Not found")
+    # FileResponse answers Range requests and uses the server's zero-copy
+    # pathsend extension when it offers one. Keys are random or content
+    # hashes and never reused, so browsers and CDNs may keep them forever.
+    return FileResponse(
+        path,
+        media_type=mimetypes.guess_type(path.name)[0],
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
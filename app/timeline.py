@@ -0,0 +1,226 @@
+"""
+Home timelines: the posts of everyone a user follows, newest first.
+
+Fan-out on write. Once a post is ready, a fanout_post job copies a
+reference to it into the timeline of every follower of its author (and of
+the author), so reading /home is one range scan of the viewer's
+timeline_entries. The job runs in the background: /upload does not get
+slower with the author's follower count.
+
+Authors with FANOUT_MAX_FOLLOWERS followers or more are not fanned out,
+their posts are pulled from posts (ix_posts_user_id_created_at_id) when a
+follower reads /home and merged into the page. When an unfollow takes an
+author back below the threshold, a backfill_followers job copies their
+latest posts (the ones only ever pulled) into every follower's timeline.
+"""
+import uuid
+
+from sqlalchemy import delete, exists, literal, select, true, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import FANOUT_MAX_FOLLOWERS, TIMELINE_BACKFILL
+from app.db import Follow, Post, TimelineEntry, User, async_session_maker
+from app.feed import FEED_COLUMNS, VISIBLE
+from app.jobs import enqueue, handler
+from app.pagination import keyset_before, next_cursor
+
+
+def fan_out(session: AsyncSession, post: Post) -> None:
+    """Queue the copy of a just published post into its readers' timelines"""
+    enqueue(session, "fanout_post", {"post_id": str(post.id)})
+
+
+async def follow(session: AsyncSession, follower_id, followee_id) -> bool:
+    """
+    Start following, in the session's transaction. False when already following.
+
+    A concurrent follow of the same pair fails on the primary key at commit.
+    """
+    if await session.get(Follow, (follower_id, followee_id)) is not None:
+        return False
+    session.add(Follow(follower_id=follower_id, followee_id=followee_id))
+    await session.execute(
+        update(User)
+        .where(User.id == followee_id)
+        .values(follower_count=User.follower_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    enqueue(session, "backfill_timeline", {"follower_id": str(follower_id), "followee_id": str(followee_id)})
+    return True
+
+
+async def unfollow(session: AsyncSession, follower_id, followee_id) -> bool:
+    """Stop following and drop the followee's posts from the timeline, in the session's transaction"""
+    result = await session.execute(
+        delete(Follow)
+        .where(Follow.follower_id == follower_id, Follow.followee_id == followee_id)
+        .returning(Follow.follower_id)
+        .execution_options(synchronize_session=False)
+    )
+    if result.first() is None:
+        return False
+    follower_count = await session.scalar(
+        update(User)
+        .where(User.id == followee_id, User.follower_count > 0)
+        .values(follower_count=User.follower_count - 1)
+        .returning(User.follower_count)
+        .execution_options(synchronize_session=False)
+    )
+    if follower_count == FANOUT_MAX_FOLLOWERS - 1:
+        # Back to fan-out: what was posted above the threshold is in no follower's timeline
+        enqueue(session, "backfill_followers", {"followee_id": str(followee_id)})
+    await session.execute(
+        delete(TimelineEntry)
+        .where(TimelineEntry.user_id == follower_id, TimelineEntry.author_id == followee_id)
+        .execution_options(synchronize_session=False)
+    )
+    return True
+
+
+async def remove_from_timelines(session: AsyncSession, post_ids) -> None:
+    """Drop posts being purged from every timeline, in the session's transaction"""
+    await session.execute(
+        delete(TimelineEntry)
+        .where(TimelineEntry.post_id.in_(post_ids))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def fans_out(follower_count: int) -> bool:
+    return follower_count < FANOUT_MAX_FOLLOWERS
+
+
+async def fetch_home_page(session: AsyncSession, user_id, before: str | None, limit: int):
+    """
+    One page of `user_id`'s home timeline and the cursor of the next.
+
+    The fanned-out entries are one range scan; followed authors above the
+    fan-out threshold add an index walk of their posts each.
+    """
+    pushed = (
+        select(*FEED_COLUMNS)
+        .join(TimelineEntry, TimelineEntry.post_id == Post.id)
+        .where(TimelineEntry.user_id == user_id, VISIBLE)
+        .order_by(TimelineEntry.created_at.desc(), TimelineEntry.post_id.desc())
+    )
+    if before:
+        pushed = pushed.where(keyset_before(TimelineEntry.created_at, TimelineEntry.post_id, before))
+    rows = (await session.execute(pushed.limit(limit + 1))).all()
+
+    pulled_authors = (await session.execute(
+        select(Follow.followee_id)
+        .join(User, User.id == Follow.followee_id)
+        .where(Follow.follower_id == user_id, User.follower_count >= FANOUT_MAX_FOLLOWERS)
+    )).scalars().all()
+    if pulled_authors:
+        pulled = (
+            select(*FEED_COLUMNS)
+            .where(Post.user_id.in_(pulled_authors), VISIBLE)
+            .order_by(Post.created_at.desc(), Post.id.desc())
+        )
+        if before:
+            pulled = pulled.where(keyset_before(Post.created_at, Post.id, before))
+        rows += (await session.execute(pulled.limit(limit + 1))).all()
+        # Posts fanned out before their author crossed the threshold come back twice
+        rows = sorted({row.id: row for row in rows}.values(), key=lambda row: (row.created_at, row.id), reverse=True)
+
+    return next_cursor(rows[:limit + 1], limit)
+
+
+@handler("fanout_post")
+async def fanout_post(payload: dict) -> None:
+    """Copy a ready post into the timelines of its author and, below the threshold, its followers"""
+    async with async_session_maker() as session:
+        post = (await session.execute(
+            select(Post.id, Post.user_id, Post.created_at).where(Post.id == uuid.UUID(payload["post_id"]), VISIBLE)
+        )).first()
+        if post is None:
+            # Deleted in the meantime
+            return
+        follower_count = await session.scalar(select(User.follower_count).where(User.id == post.user_id))
+
+        # A retry starts over
+        await remove_from_timelines(session, [post.id])
+        session.add(TimelineEntry(user_id=post.user_id, created_at=post.created_at, post_id=post.id, author_id=post.user_id))
+        if fans_out(follower_count or 0):
+            await session.execute(
+                TimelineEntry.__table__.insert().from_select(
+                    ["user_id", "created_at", "post_id", "author_id"],
+                    select(
+                        Follow.follower_id,
+                        literal(post.created_at, TimelineEntry.created_at.type),
+                        literal(post.id, TimelineEntry.post_id.type),
+                        literal(post.user_id, TimelineEntry.author_id.type),
+                    ).where(Follow.followee_id == post.user_id, Follow.follower_id != post.user_id),
+                )
+            )
+        await session.commit()
+
+
+@handler("backfill_timeline")
+async def backfill_timeline(payload: dict) -> None:
+    """Copy the latest TIMELINE_BACKFILL posts of a newly followed user into the follower's timeline"""
+    follower_id = uuid.UUID(payload["follower_id"])
+    followee_id = uuid.UUID(payload["followee_id"])
+    async with async_session_maker() as session:
+        if await session.get(Follow, (follower_id, followee_id)) is None:
+            # Unfollowed in the meantime
+            return
+        follower_count = await session.scalar(select(User.follower_count).where(User.id == followee_id))
+        if not fans_out(follower_count or 0):
+            # Pulled at read time
+            return
+
+        # A retry, or fan-out of a post published since the follow, may have added some already
+        await session.execute(
+            delete(TimelineEntry)
+            .where(TimelineEntry.user_id == follower_id, TimelineEntry.author_id == followee_id)
+            .execution_options(synchronize_session=False)
+        )
+        await session.execute(
+            TimelineEntry.__table__.insert().from_select(
+                ["user_id", "created_at", "post_id", "author_id"],
+                select(literal(follower_id, TimelineEntry.user_id.type), Post.created_at, Post.id, Post.user_id)
+                .where(Post.user_id == followee_id, VISIBLE)
+                .order_by(Post.created_at.desc(), Post.id.desc())
+                .limit(TIMELINE_BACKFILL),
+            )
+        )
+        await session.commit()
+
+
+@handler("backfill_followers")
+async def backfill_followers(payload: dict) -> None:
+    """
+    Copy the latest TIMELINE_BACKFILL posts of an author who dropped below
+    the fan-out threshold into the timelines of all their followers
+    """
+    followee_id = uuid.UUID(payload["followee_id"])
+    async with async_session_maker() as session:
+        follower_count = await session.scalar(select(User.follower_count).where(User.id == followee_id))
+        if not fans_out(follower_count or 0):
+            # Above it again, still pulled
+            return
+
+        recent = (
+            select(Post.created_at, Post.id, Post.user_id)
+            .where(Post.user_id == followee_id, VISIBLE)
+            .order_by(Post.created_at.desc(), Post.id.desc())
+            .limit(TIMELINE_BACKFILL)
+            .subquery()
+        )
+        # Posts fanned out while below the threshold are there already
+        present = exists().where(
+            TimelineEntry.user_id == Follow.follower_id,
+            TimelineEntry.created_at == recent.c.created_at,
+            TimelineEntry.post_id == recent.c.id,
+        )
+        await session.execute(
+            TimelineEntry.__table__.insert().from_select(
+                ["user_id", "created_at", "post_id", "author_id"],
+                select(Follow.follower_id, recent.c.created_at, recent.c.id, recent.c.user_id)
+                .join(recent, true())
+                .where(Follow.followee_id == followee_id, Follow.follower_id != followee_id, ~present),
+            )
+        )
+        await session.commit()
@@ -0,0 +1,283 @@
+import asyncio
+import functools
+import io
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from fastapi import HTTPException, Request
+from starlette.datastructures import ImmutableMultiDict
+from python_multipart.multipart import MultipartParser, parse_options_header
+from python_multipart.exceptions import MultipartParseError
+
+from app.config import MAX_UPLOAD_BYTES, UPLOAD_WORKERS
+
+MAX_FIELD_BYTES = 1024 * 1024
+PIPE_DEPTH = 8
+
+_executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="media-upload")
+
+# Documents the form that upload endpoints parse by hand from the request stream
+UPLOAD_FORM_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {
+                        "file": {"type": "string", "format": "binary"},
+                        "caption": {"type": "string"},
+                    },
+                }
+            }
+        },
+    }
+}
+
+
+UPLOAD_BATCH_FORM_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {
+                        "file": {"type": "array", "items": {"type": "string", "format": "binary"}},
+                        # The n-th caption goes with the n-th file
+                        "caption": {"type": "array", "items": {"type": "string"}},
+                    },
+                }
+            }
+        },
+    }
+}
+
+
+async def run_in_upload_pool(fn, /, *args, **kwargs):
+    """Run a blocking storage SDK call on the bounded upload pool instead of the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class TooManyFiles(Exception):
+    pass
+
+
+class ChunkPipe(io.RawIOBase):
+    """
+    File-like object fed from the event loop and read from a worker thread.
+
+    The queue is bounded, so a slow storage backend pushes back on the
+    request body instead of buffering the whole file in memory.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, depth: int = PIPE_DEPTH):
+        super().__init__()
+        self._loop = loop
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=depth)
+        self._buffer = bytearray()
+        self._eof = False
+        self._abandoned = False
+
+    def readable(self) -> bool:
+        return True
+
+    async def feed(self, data: bytes) -> None:
+        if not self._abandoned:
+            await self._queue.put(bytes(data))
+
+    async def finish(self, error: BaseException | None = None) -> None:
+        if not self._abandoned:
+            await self._queue.put(error or b"")
+
+    def abandon(self) -> None:
+        """Called once the reader has stopped, so pending feeds never block"""
+        self._abandoned = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+
+    def _next_chunk(self) -> bytes:
+        item = asyncio.run_coroutine_threadsafe(self._queue.get(), self._loop).result()
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    def read(self, size: int = -1) -> bytes:
+        """Block until `size` bytes are available or the stream ends"""
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            chunk = self._next_chunk()
+            if not chunk:
+                self._eof = True
+            self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[: len(data)] = data
+        return len(data)
+
+
+# (reader, filename, content_type) -> whatever the storage backend returns
+UploadSink = Callable[[ChunkPipe, str, str], Awaitable[object]]
+
+
+@dataclass
+class StreamedFile:
+    field_name: str
+    filename: str
+    content_type: str
+    size: int = 0
+    result: object = None
+
+
+@dataclass
+class _Part:
+    headers: dict = field(default_factory=dict)
+    name: str = ""
+    data: bytearray = field(default_factory=bytearray)
+    file: StreamedFile | None = None
+    pipe: ChunkPipe | None = None
+    task: asyncio.Task | None = None
+
+
+async def stream_multipart_upload(
+    request: Request,
+    sink: UploadSink,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    max_files: int | None = None,
+    discard: Callable[[object], None] | None = None,
+) -> tuple[ImmutableMultiDict, list[StreamedFile]]:
+    """
+    Parse a multipart body straight off the socket.
+
+    Each file part is handed to `sink` as it arrives, so the upload to the
+    storage backend runs while the client is still sending and no part is
+    ever spooled to local disk. Returns the plain form fields (repeated
+    names keep every value, see getlist) and the files with the sink's
+    result attached. If the request fails, `discard` gets the result of
+    every file the sink had already finished.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data body")
+
+    loop = asyncio.get_running_loop()
+    fields: list[tuple[str, str]] = []
+    files: list[_Part] = []
+    events: list[tuple] = []
+    header = {"name": b"", "value": b""}
+    current = _Part()
+
+    def on_part_begin():
+        nonlocal current
+        current = _Part()
+
+    def on_header_field(data, start, end):
+        header["name"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        header["value"] += data[start:end]
+
+    def on_header_end():
+        current.headers[header["name"].lower()] = header["value"]
+        header["name"] = header["value"] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(current.headers.get(b"content-disposition", b""))
+        current.name = options.get(b"name", b"").decode()
+        if b"filename" in options:
+            current.file = StreamedFile(
+                field_name=current.name,
+                filename=options[b"filename"].decode(),
+                content_type=current.headers.get(b"content-type", b"application/octet-stream").decode(),
+            )
+            events.append(("start", current))
+
+    def on_part_data(data, start, end):
+        if current.file is None:
+            if len(current.data) + end - start > MAX_FIELD_BYTES:
+                raise MultipartParseError("Form field too large")
+            current.data += data[start:end]
+        else:
+            events.append(("data", current, data[start:end]))
+
+    def on_part_end():
+        if current.file is None:
+            fields.append((current.name, current.data.decode()))
+        else:
+            events.append(("end", current))
+
+    parser = MultipartParser(
+        params[b"boundary"],
+        {
+            "on_part_begin": on_part_begin,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        },
+    )
+
+    async def handle(event):
+        kind, part = event[0], event[1]
+        if kind == "start":
+            if max_files is not None and len(files) >= max_files:
+                raise TooManyFiles()
+            part.pipe = ChunkPipe(loop)
+            part.task = asyncio.create_task(
+                sink(part.pipe, part.file.filename, part.file.content_type)
+            )
+            part.task.add_done_callback(lambda _: part.pipe.abandon())
+            files.append(part)
+        elif kind == "data":
+            part.file.size += len(event[2])
+            if part.file.size > max_bytes:
+                raise UploadTooLarge(part.file.filename)
+            await part.pipe.feed(event[2])
+        else:
+            await part.pipe.finish()
+
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for event in events:
+                await handle(event)
+            events.clear()
+        parser.finalize()
+        for part in files:
+            part.file.result = await part.task
+    except BaseException as exc:
+        for part in files:
+            if not part.task.done():
+                await part.pipe.finish(exc)
+        results = await asyncio.gather(*(part.task for part in files), return_exceptions=True)
+        if discard is not None:
+            for result in results:
+                if not isinstance(result, BaseException):
+                    discard(result)
+        if isinstance(exc, UploadTooLarge):
+            raise HTTPException(
+                status_code=413,
+                detail=f"File exceeds the {max_bytes // (1024 * 1024)}MB upload limit",
+            )
+        if isinstance(exc, TooManyFiles):
+            raise HTTPException(status_code=400, detail=f"Too many files, the limit is {max_files} per request")
+        if isinstance(exc, MultipartParseError):
+            raise HTTPException(status_code=400, detail="Invalid multipart data")
+        raise
+
+    return ImmutableMultiDict(fields), [part.file for part in files]
@@ -1,28 +1,214 @@
 import uuid
-from typing import Optional
+from typing import Any, Optional
+import jwt
 from fastapi import Depends, Request
-from fastapi_users import BaseUserManager, FastAPIUsers, UUIDIDMixin, models
+from fastapi_users import BaseUserManager, FastAPIUsers, UUIDIDMixin, exceptions, models
 from fastapi_users.authentication import (
     AuthenticationBackend,
     BearerTransport,
     JWTStrategy
 )
+from fastapi_users.jwt import decode_jwt, generate_jwt
 from fastapi_users_db_sqlalchemy import SQLAlchemyUserDatabase, SQLAlchemyBaseUserTableUUID
-from app.db import User, get_user_db
+from sqlalchemy import update
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.cache import TTLCache
+from app.config import (
+    AUTH_TRUST_TOKEN_CLAIMS,
+    AUTH_USER_CACHE_SIZE,
+    AUTH_USER_CACHE_TTL,
+    JWT_LIFETIME_SECONDS,
+    JWT_SECRET,
+)
+from app.db import Comment, Post, User, get_user_db
+from app.passwords import PooledPasswordHelper
+from app.feed_cache import get_feed_cache
+
+SECRET = JWT_SECRET
+
+USER_FIELDS = ("id", "email", "hashed_password", "is_active", "is_superuser", "is_verified")
+CLAIM_FIELDS = ("email", "is_active", "is_superuser", "is_verified")
+
+# user id -> column snapshot of the user, see CachedJWTStrategy
+user_cache = TTLCache(maxsize=AUTH_USER_CACHE_SIZE, ttl=AUTH_USER_CACHE_TTL)
+
+
+class MissingSecret(RuntimeError):
+    pass
+
+
+def check_jwt_secret() -> None:
+    """Fail fast instead of signing tokens nothing else can verify"""
+    if not SECRET:
+        raise MissingSecret(
+            "JWT_SECRET is not set. Set it, to the same value for every worker, "
+            "before starting the app."
+        )
+
+
+def user_from_values(values: dict[str, Any]) -> User:
+    """
+    Build a fresh detached User for one request.
+
+    Each request gets its own instance, so nothing is shared between
+    sessions, and it still has a persistent identity: an update through
+    the user manager becomes an UPDATE, not an INSERT.
+    """
+    user = User(**values)
+    make_transient_to_detached(user)
+    return user
 
-SECRET = "JainilDalwadiFastAPITuTorial"
 
 class UserManager(UUIDIDMixin,BaseUserManager[User,uuid.UUID]):
     reset_password_token_secret = SECRET
     verification_token_secret = SECRET
 
+    # Password hashing runs on app.passwords' pool: hashes are prepared there
+    # before the library's own (synchronous) hash() call picks them up
+
+    async def create(self, user_create, safe: bool = False, request: Optional[Request] = None) -> User:
+        await self.password_helper.prepare(user_create.password)
+        return await super().create(user_create, safe, request)
+
+    async def _update(self, user: User, update_dict: dict[str, Any]) -> User:
+        if update_dict.get("password"):
+            await self.password_helper.prepare(update_dict["password"])
+        return await super()._update(user, update_dict)
+
+    async def forgot_password(self, user: User, request: Optional[Request] = None) -> None:
+        await self.password_helper.prepare(user.hashed_password)
+        await super().forgot_password(user, request)
+
+    async def reset_password(self, token: str, password: str, request: Optional[Request] = None) -> User:
+        # As the library's, with the fingerprint check on the pool
+        try:
+            data = decode_jwt(token, self.reset_password_token_secret, [self.reset_password_token_audience])
+        except jwt.PyJWTError:
+            raise exceptions.InvalidResetPasswordToken()
+
+        try:
+            user_id = data["sub"]
+            password_fingerprint = data["password_fgpt"]
+        except KeyError:
+            raise exceptions.InvalidResetPasswordToken()
+
+        try:
+            parsed_id = self.parse_id(user_id)
+        except exceptions.InvalidID:
+            raise exceptions.InvalidResetPasswordToken()
+
+        user = await self.get(parsed_id)
+
+        # The fingerprint is a hash of the current hash, so a token stops working once the password changes
+        valid_password_fingerprint, _ = await self.password_helper.verify_and_update_async(
+            user.hashed_password, password_fingerprint
+        )
+        if not valid_password_fingerprint:
+            raise exceptions.InvalidResetPasswordToken()
+
+        if not user.is_active:
+            raise exceptions.UserInactive()
+
+        updated_user = await self._update(user, {"password": password})
+
+        await self.on_after_reset_password(user, request)
+
+        return updated_user
+
+    async def authenticate(self, credentials) -> Optional[User]:
+        try:
+            user = await self.get_by_email(credentials.username)
+        except exceptions.UserNotExists:
+            # Hash anyway, so the response time does not tell which emails exist
+            await self.password_helper.hash_async(credentials.password)
+            return None
+
+        verified, updated_password_hash = await self.password_helper.verify_and_update_async(
+            credentials.password, user.hashed_password
+        )
+        if not verified:
+            return None
+        if updated_password_hash is not None:
+            # Made with other parameters than the configured ones
+            await self.user_db.update(user, {"hashed_password": updated_password_hash})
+        return user
+
+    async def on_after_update(self, user: User, update_dict: dict[str, Any], request: Optional[Request] = None):
+        user_cache.pop(user.id)
+        if "email" in update_dict:
+            # Posts (and cached feed pages) carry a copy of the author's email.
+            # Deleted ones are left out: they are purged soon, and only the
+            # other posts are in ix_posts_user_id_created_at_id.
+            session = self.user_db.session
+            await session.execute(
+                update(Post).where(Post.user_id == user.id, Post.deleted_at.is_(None)).values(author_email=user.email)
+            )
+            await session.execute(update(Comment).where(Comment.user_id == user.id).values(author_email=user.email))
+            await session.commit()
+            await get_feed_cache().invalidate()
+
+    async def on_after_verify(self, user: User, request: Optional[Request] = None):
+        user_cache.pop(user.id)
+
+    async def on_after_reset_password(self, user: User, request: Optional[Request] = None):
+        user_cache.pop(user.id)
+
+    async def on_after_delete(self, user: User, request: Optional[Request] = None):
+        user_cache.pop(user.id)
+
 async def get_user_manager(user_db: SQLAlchemyUserDatabase = Depends(get_user_db)):
-    yield UserManager(user_db)
+    yield UserManager(user_db, PooledPasswordHelper())
 
 bearer_transport = BearerTransport(tokenUrl="auth/jwt/login")
 
+
+class CachedJWTStrategy(JWTStrategy[User, uuid.UUID]):
+    """
+    JWTStrategy that avoids a database round trip per authenticated request.
+
+    Users are resolved from `user_cache` and only loaded through the user
+    manager on a miss. With `trust_claims`, tokens carry the user's flags
+    and email and are trusted as-is, so the lookup is skipped entirely.
+    """
+
+    def __init__(self, *args, trust_claims: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.trust_claims = trust_claims
+
+    async def read_token(self, token: str | None, user_manager: BaseUserManager[User, uuid.UUID]) -> User | None:
+        if token is None:
+            return None
+
+        try:
+            data = decode_jwt(token, self.decode_key, self.token_audience, algorithms=[self.algorithm])
+            user_id = user_manager.parse_id(data["sub"])
+        except (jwt.PyJWTError, KeyError, exceptions.InvalidID):
+            return None
+
+        if self.trust_claims and all(field in data for field in CLAIM_FIELDS):
+            return user_from_values({"id": user_id, **{field: data[field] for field in CLAIM_FIELDS}})
+
+        cached = user_cache.get(user_id)
+        if cached is not None:
+            return user_from_values(cached)
+
+        try:
+            user = await user_manager.get(user_id)
+        except exceptions.UserNotExists:
+            return None
+        user_cache.set(user_id, {field: getattr(user, field) for field in USER_FIELDS})
+        return user
+
+    async def write_token(self, user: models.UP) -> str:
+        data = {"sub": str(user.id), "aud": self.token_audience}
+        if self.trust_claims:
+            data.update({field: getattr(user, field) for field in CLAIM_FIELDS})
+        return generate_jwt(data, self.encode_key, self.lifetime_seconds, algorithm=self.algorithm)
+
+
 def get_jwt_strategy():
-    return JWTStrategy(secret=SECRET, lifetime_seconds=3600)
+    return CachedJWTStrategy(secret=SECRET, lifetime_seconds=JWT_LIFETIME_SECONDS, trust_claims=AUTH_TRUST_TOKEN_CLAIMS)
 
 auth_backend = AuthenticationBackend(
     name="jwt",
@@ -32,4 +218,3 @@ auth_backend = AuthenticationBackend(
 
 fastapi_users = FastAPIUsers[User,uuid.UUID](get_user_manager,[auth_backend])
 current_active_users = fastapi_users.current_user(active=True)
-
@@ -0,0 +1,136 @@
+"""
+Job workers (see app.jobs).
+
+The API starts JOB_WORKERS of them in its lifespan. To keep processing
+out of the API processes entirely, set JOB_WORKERS=0 there and run
+
+    python -m app.worker --concurrency 4
+
+as many times as needed, against the same database and STAGING_ROOT.
+SIGTERM/SIGINT stop claiming new jobs and let running ones finish.
+
+Every Worker also purges deleted posts on a timer, see app.purge.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+import traceback
+import uuid
+
+from app import jobs
+from app import processing, timeline  # registers the job handlers
+from app.purge import run_purge
+from app.config import JOB_POLL_INTERVAL, JOB_WORKERS
+from app.db import async_session_maker
+
+logger = logging.getLogger("app.worker")
+
+STOP_TIMEOUT = 30
+
+
+class Worker:
+    def __init__(self, concurrency: int = JOB_WORKERS, poll_interval: float = JOB_POLL_INTERVAL,
+                 session_maker=async_session_maker):
+        self.id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.session_maker = session_maker
+        self._stopping = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._loop(), name=f"job-worker-{i}") for i in range(self.concurrency)]
+        if self.concurrency:
+            self._tasks.append(asyncio.create_task(run_purge(self._stopping, self.session_maker), name="post-purge"))
+
+    async def stop(self, timeout: float = STOP_TIMEOUT) -> None:
+        """Let running jobs finish, cancel whatever is still going after `timeout`"""
+        self._stopping.set()
+        jobs.notify()
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            # Its job stays locked and is rerun after JOB_LOCK_TIMEOUT
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._tasks = []
+        processing.shutdown_rendition_pool()
+
+    async def _loop(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                ran = await self.run_once()
+            except Exception:
+                logger.exception("job worker %s failed to claim a job", self.id)
+                ran = False
+            if not ran and not self._stopping.is_set():
+                await jobs.wait_for_jobs(self.poll_interval)
+
+    async def run_once(self) -> bool:
+        """Claim and run one due job, False if there was none"""
+        async with self.session_maker() as session:
+            job = await jobs.claim(session, self.id)
+        if job is None:
+            return False
+
+        job_handler = jobs.HANDLERS.get(job.kind)
+        try:
+            if job_handler is None:
+                raise LookupError(f"no handler for job kind {job.kind!r}")
+            await job_handler.run(job.payload)
+        except Exception as e:
+            logger.warning("job %s (%s) attempt %d failed: %r", job.id, job.kind, job.attempts, e)
+            async with self.session_maker() as session:
+                final = await jobs.retry_or_fail(session, job, "".join(traceback.format_exception(e)))
+            if final:
+                logger.error("job %s (%s) failed after %d attempts", job.id, job.kind, job.attempts)
+                if job_handler is not None and job_handler.on_failure is not None:
+                    try:
+                        await job_handler.on_failure(job.payload, e)
+                    except Exception:
+                        logger.exception("on_failure hook of job %s (%s) failed", job.id, job.kind)
+        else:
+            async with self.session_maker() as session:
+                await jobs.finish(session, job)
+        return True
+
+
+async def serve(concurrency: int) -> None:
+    from app.db import engine
+    from app.instrumentation import start_logging, stop_logging
+    from app.migrate import check_schema_version
+
+    start_logging()
+    await check_schema_version(engine)
+    worker = Worker(concurrency)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows, Ctrl+C still raises KeyboardInterrupt
+            pass
+
+    worker.start()
+    logger.info("job worker %s running %d concurrent jobs", worker.id, concurrency)
+    try:
+        await stop.wait()
+    finally:
+        await worker.stop()
+        await engine.dispose()
+        stop_logging()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Run background job workers")
+    parser.add_argument("--concurrency", type=int, default=max(JOB_WORKERS, 1))
+    args = parser.parse_args(argv)
+    asyncio.run(serve(args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
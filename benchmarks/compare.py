@@ -0,0 +1,56 @@
+"""
+Compare two benchmarks.load result files.
+
+    python -m benchmarks.compare before.json after.json
+    python -m benchmarks.compare before.json after.json --fail-over 10
+
+Prints throughput and p95 for every scenario/concurrency pair present in
+both files. With --fail-over, exits non-zero if any p95 got worse by more
+than that many percent.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        report = json.load(f)
+    return report["meta"], {(r["scenario"], r["concurrency"]): r for r in report["results"]}
+
+
+def change(before, after) -> float:
+    return (after - before) / before * 100 if before else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--fail-over", type=float, help="p95 regression threshold in percent")
+    args = parser.parse_args()
+
+    before_meta, before = load(args.before)
+    after_meta, after = load(args.after)
+    print(f"{before_meta.get('commit') or args.before} -> {after_meta.get('commit') or args.after}")
+    print(f"{'scenario':<8} {'c':>4} {'req/s':>17} {'':>8} {'p95 ms':>19} {'':>8}")
+
+    regressions = []
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key], after[key]
+        rps = change(old["throughput_rps"], new["throughput_rps"])
+        p95 = change(old["p95_ms"], new["p95_ms"])
+        print(
+            f"{key[0]:<8} {key[1]:>4} {old['throughput_rps']:>8.1f} {new['throughput_rps']:>8.1f} {rps:>+7.1f}%"
+            f" {old['p95_ms']:>9.2f} {new['p95_ms']:>9.2f} {p95:>+7.1f}%"
+        )
+        if args.fail_over is not None and p95 > args.fail_over:
+            regressions.append(key)
+
+    if regressions:
+        print(f"p95 regressed by more than {args.fail_over}%: " + ", ".join(f"{s} c={c}" for s, c in regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import asyncio
+import uuid
+
+from app.storage import MediaStorage, StoredMedia, file_type_for
+from app.uploads import run_in_upload_pool
+
+DRAIN_CHUNK_BYTES = 1024 * 1024
+
+
+class FakeStorage(MediaStorage):
+    """
+    Offline stand-in for a media provider.
+
+    Reads the whole upload through the real streaming pipeline and throws
+    the bytes away. `latency` simulates the provider's response time, the
+    way a remote upload would hold a pool thread.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.saved = 0
+        self.deleted: list[str] = []
+
+    def _drain(self, reader) -> int:
+        size = 0
+        while chunk := reader.read(DRAIN_CHUNK_BYTES):
+            size += len(chunk)
+        return size
+
+    async def save(self, reader, filename, content_type):
+        await run_in_upload_pool(self._drain, reader)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.saved += 1
+        key = f"uploads/{uuid.uuid4().hex}"
+        return StoredMedia(
+            url=f"https://media.bench.example.com/{key}",
+            file_type=file_type_for(content_type),
+            file_name=filename,
+            key=key,
+        )
+
+    async def put(self, key, data, content_type):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return StoredMedia(
+            url=f"https://media.bench.example.com/{key}",
+            file_type=file_type_for(content_type),
+            file_name=key.rsplit("/", 1)[-1],
+            key=key,
+        )
+
+    async def delete(self, key):
+        self.deleted.append(key)
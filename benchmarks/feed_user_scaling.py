@@ -0,0 +1,125 @@
+"""
+Feed latency as the user table grows.
+
+Seeds a throwaway SQLite database with a fixed number of posts and an
+increasing number of users, then times one feed page with the joined,
+column-projected query from app.feed against the old approach of
+loading every user to build an email lookup.
+
+    python -m benchmarks.feed_user_scaling --users 1000 10000 100000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.db import Base, Post, User, utcnow
+from app.feed import fetch_feed_page
+
+BATCH = 5000
+
+
+async def seed(engine, n_users: int, n_posts: int) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+        authors = []
+        for start in range(0, n_users, BATCH):
+            rows = [
+                {
+                    "id": uuid.uuid4(),
+                    "email": f"user{i}@example.com",
+                    "hashed_password": "x",
+                    "is_active": True,
+                    "is_superuser": False,
+                    "is_verified": False,
+                }
+                for i in range(start, min(start + BATCH, n_users))
+            ]
+            await conn.execute(insert(User), rows)
+            authors.extend((row["id"], row["email"]) for row in rows[:10])
+
+        now = utcnow()
+        posts = [
+            {
+                "id": uuid.uuid4(),
+                "user_id": authors[i % len(authors)][0],
+                "author_email": authors[i % len(authors)][1],
+                "caption": f"post {i}",
+                "url": f"https://example.com/{i}.jpg",
+                "file_type": "image",
+                "file_name": f"{i}.jpg",
+                "created_at": now - timedelta(seconds=i),
+            }
+            for i in range(n_posts)
+        ]
+        await conn.execute(insert(Post), posts)
+
+
+async def legacy_feed_page(session, limit: int):
+    result = await session.execute(
+        select(Post).order_by(Post.created_at.desc(), Post.id.desc()).limit(limit)
+    )
+    posts = result.scalars().all()
+    result = await session.execute(select(User))
+    user_dict = {u.id: u.email for u in result.scalars().all()}
+    return [(post, user_dict.get(post.user_id)) for post in posts]
+
+
+async def time_it(session_maker, fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        async with session_maker() as session:
+            start = time.perf_counter()
+            await fn(session)
+            samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+async def run_one(n_users: int, n_posts: int, limit: int, repeat: int, legacy: bool):
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+        engine = create_async_engine(url)
+        try:
+            await seed(engine, n_users, n_posts)
+            session_maker = async_sessionmaker(engine, expire_on_commit=False)
+            joined = await time_it(
+                session_maker, lambda s: fetch_feed_page(s, None, limit), repeat
+            )
+            old = None
+            if legacy:
+                old = await time_it(
+                    session_maker, lambda s: legacy_feed_page(s, limit), repeat
+                )
+            return joined, old
+        finally:
+            await engine.dispose()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--posts", type=int, default=1_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--no-legacy", action="store_true", help="skip the full user scan baseline")
+    args = parser.parse_args()
+
+    print(f"{'users':>10} {'joined ms':>10} {'legacy ms':>10}")
+    for n_users in args.users:
+        joined, old = await run_one(
+            n_users, args.posts, args.limit, args.repeat, not args.no_legacy
+        )
+        legacy = f"{old:10.2f}" if old is not None else f"{'-':>10}"
+        print(f"{n_users:>10} {joined:10.2f} {legacy}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
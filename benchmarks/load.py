@@ -0,0 +1,255 @@
+"""
+Load test for login, /feed and /upload against the in-process app.
+
+Migrates and seeds a throwaway SQLite database, swaps media storage for
+benchmarks.fake_storage.FakeStorage, then drives the ASGI app through
+httpx at each concurrency level. Upload processing jobs are not run unless
+--job-workers is given, so the upload scenario measures the API path. No server, network or provider account
+is involved, so runs are repeatable and comparable across commits.
+
+    python -m benchmarks.load --output before.json
+    python -m benchmarks.load --scenarios feed --concurrency 1 16 64 --requests 500
+    python -m benchmarks.compare before.json after.json
+
+Each result has throughput, p50/p95/p99 latency, errors (non-2xx) and the
+process' peak RSS. With --tracemalloc it also reports the peak Python
+allocation per scenario, at the cost of slowing everything down.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCENARIOS = ("login", "feed", "upload")
+TOKEN_USERS = 50
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_scenario(name, concurrency, total, request_fn, trace_memory):
+    """Run `total` requests over `concurrency` workers and summarize them"""
+    counter = itertools.count()
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while next(counter) < total:
+            start = time.perf_counter()
+            status = await request_fn()
+            latencies.append(time.perf_counter() - start)
+            if status >= 300:
+                errors += 1
+
+    if trace_memory:
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    result = {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if trace_memory:
+        result["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+    return result
+
+
+async def login(client, email, password) -> int:
+    response = await client.post("/auth/jwt/login", data={"username": email, "password": password})
+    return response.status_code
+
+
+async def get_tokens(client, emails, password) -> list[str]:
+    tokens = []
+    for email in emails:
+        response = await client.post("/auth/jwt/login", data={"username": email, "password": password})
+        response.raise_for_status()
+        tokens.append(response.json()["access_token"])
+    return tokens
+
+
+def scenario_requests(client, args, emails, tokens, password):
+    """Request functions per scenario, each returning the status code"""
+    user_cycle = itertools.cycle(emails)
+    token_cycle = itertools.cycle(tokens)
+    payload = os.urandom(args.upload_kb * 1024)
+    feed_cursors = {}
+
+    async def login_request():
+        return await login(client, next(user_cycle), password)
+
+    async def feed_request():
+        # Each token walks up to --feed-depth pages, then starts over
+        token = next(token_cycle)
+        depth, cursor = feed_cursors.get(token, (0, None))
+        params = {"limit": args.feed_limit}
+        if cursor:
+            params["before"] = cursor
+        response = await client.get("/feed", params=params, headers={"Authorization": f"Bearer {token}"})
+        if response.status_code == 200:
+            cursor = response.json()["next_cursor"]
+            feed_cursors[token] = (0, None) if not cursor or depth + 1 >= args.feed_depth else (depth + 1, cursor)
+        return response.status_code
+
+    async def upload_request():
+        response = await client.post(
+            "/upload",
+            files={"file": ("bench.jpg", payload, "image/jpeg")},
+            data={"caption": "benchmark upload"},
+            headers={"Authorization": f"Bearer {next(token_cycle)}"},
+        )
+        return response.status_code
+
+    return {"login": login_request, "feed": feed_request, "upload": upload_request}
+
+
+async def run(args) -> dict:
+    import httpx
+
+    from app.app import app
+    from app.db import engine
+    from app import storage as media_storage
+    from benchmarks.fake_storage import FakeStorage
+    from benchmarks.seed import BENCH_PASSWORD, bench_email, seed
+
+    start = time.perf_counter()
+    await seed(engine, args.users, args.posts)
+    print(f"seeded {args.users} users and {args.posts} posts in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    storage = FakeStorage(latency=args.storage_latency_ms / 1000)
+    media_storage.BACKENDS["benchmark"] = lambda: storage
+
+    emails = [bench_email(i) for i in range(args.users)]
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            tokens = await get_tokens(client, emails[:TOKEN_USERS], BENCH_PASSWORD)
+            requests = scenario_requests(client, args, emails, tokens, BENCH_PASSWORD)
+            if args.tracemalloc:
+                tracemalloc.start()
+            for name in args.scenarios:
+                await requests[name]()  # warm up
+                for concurrency in args.concurrency:
+                    result = await run_scenario(name, concurrency, args.requests, requests[name], args.tracemalloc)
+                    results.append(result)
+                    print(
+                        f"{name:<8} c={concurrency:<4} {result['throughput_rps']:>8.1f} req/s"
+                        f"  p50 {result['p50_ms']:>8.2f}ms  p95 {result['p95_ms']:>8.2f}ms"
+                        f"  p99 {result['p99_ms']:>8.2f}ms  errors {result['errors']}",
+                        file=sys.stderr,
+                    )
+            if args.tracemalloc:
+                tracemalloc.stop()
+
+    await engine.dispose()
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": "sqlite" if args.database_url is None else args.database_url.split(":", 1)[0],
+            "feed_cache": os.environ.get("FEED_CACHE_BACKEND", "memory"),
+            "rate_limit": os.environ.get("RATE_LIMIT_BACKEND"),
+            "users": args.users,
+            "posts": args.posts,
+            "requests": args.requests,
+            "upload_kb": args.upload_kb,
+            "storage_latency_ms": args.storage_latency_ms,
+            "job_workers": args.job_workers,
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario and concurrency level")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--posts", type=int, default=10_000)
+    parser.add_argument("--feed-limit", type=int, default=20)
+    parser.add_argument("--feed-depth", type=int, default=3, help="pages each client follows before starting over")
+    parser.add_argument("--upload-kb", type=int, default=256)
+    parser.add_argument("--storage-latency-ms", type=float, default=0.0)
+    parser.add_argument("--job-workers", type=int, default=0, help="in-process upload processing workers")
+    parser.add_argument("--database-url", help="an empty database to use instead of a temporary SQLite file")
+    parser.add_argument("--tracemalloc", action="store_true")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # app modules read their configuration at import time
+        os.environ["DATABASE_URL"] = args.database_url or f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ.setdefault("JWT_SECRET", "benchmark-secret-benchmark-secret")
+        os.environ.setdefault("PROFILE_SAMPLE_RATE", "0")
+        # Every client comes from one address, the auth limits would turn logins into 429s
+        os.environ.setdefault("RATE_LIMIT_BACKEND", "none")
+        os.environ["MEDIA_BACKEND"] = "benchmark"
+        os.environ["STAGING_ROOT"] = os.path.join(tmp, "staging")
+        os.environ["JOB_WORKERS"] = str(args.job_workers)
+        # Slow request warnings would flood the output under load
+        os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+        from app.migrate import upgrade
+
+        upgrade()
+        report = asyncio.run(run(args))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Seed a database with N users and M posts through the app's models.
+
+    python -m benchmarks.seed --users 1000 --posts 100000
+    DATABASE_URL=postgresql://... python -m benchmarks.seed --users 10000 --posts 1000000
+
+Every user gets the same password (BENCH_PASSWORD) so login scenarios can
+pick any of them. Run `python -m app.migrate` against the database first.
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from datetime import timedelta
+
+from fastapi_users.password import PasswordHelper
+from sqlalchemy import insert
+
+from app.db import Post, User, utcnow
+
+BENCH_PASSWORD = "benchmark-password"
+BATCH = 5000
+
+
+def bench_email(i: int) -> str:
+    return f"user{i}@bench.example.com"
+
+
+async def seed(engine, users: int, posts: int, *, seed: int = 0) -> list[uuid.UUID]:
+    """Insert users and posts in batches, return the user ids"""
+    rng = random.Random(seed)
+    hashed_password = PasswordHelper().hash(BENCH_PASSWORD)
+    user_ids = [uuid.UUID(int=rng.getrandbits(128), version=4) for _ in range(users)]
+
+    async with engine.begin() as conn:
+        for start in range(0, users, BATCH):
+            await conn.execute(insert(User), [
+                {
+                    "id": user_ids[i],
+                    "email": bench_email(i),
+                    "hashed_password": hashed_password,
+                    "is_active": True,
+                    "is_superuser": False,
+                    "is_verified": True,
+                }
+                for i in range(start, min(start + BATCH, users))
+            ])
+
+        now = utcnow()
+        for start in range(0, posts, BATCH):
+            rows = []
+            for i in range(start, min(start + BATCH, posts)):
+                author = rng.randrange(users)
+                rows.append({
+                    "id": uuid.UUID(int=rng.getrandbits(128), version=4),
+                    "user_id": user_ids[author],
+                    "author_email": bench_email(author),
+                    "caption": f"benchmark post {i}",
+                    "url": f"https://media.bench.example.com/uploads/{i}.jpg",
+                    "file_type": "image" if i % 5 else "video",
+                    "file_name": f"{i}.jpg",
+                    "storage_key": f"uploads/{i}.jpg",
+                    "created_at": now - timedelta(seconds=i),
+                })
+            await conn.execute(insert(Post), rows)
+    return user_ids
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--posts", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from app.db import engine
+
+    start = time.perf_counter()
+    await seed(engine, args.users, args.posts, seed=args.seed)
+    await engine.dispose()
+    print(f"seeded {args.users} users and {args.posts} posts in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,126 @@
+"""
+Serialization cost of one feed response, per 1k posts.
+
+Compares the old path (dicts with datetimes through jsonable_encoder and
+json.dumps, which is what FastAPI does for a plain dict return), the
+Pydantic response-model path, and the orjson path /feed uses now.
+
+    python -m benchmarks.serialization --posts 1000
+    python -m benchmarks.serialization --json > serialization.json
+"""
+import argparse
+import json
+import sys
+import timeit
+import uuid
+from datetime import timedelta
+from types import SimpleNamespace
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.db import utcnow
+from app.feed import serialize_feed_row
+from app.responses import OrjsonResponse
+from app.schemas import FeedPage
+
+
+def make_rows(n: int):
+    now = utcnow()
+    return [
+        SimpleNamespace(
+            id=uuid.uuid4(),
+            user_id=uuid.uuid4(),
+            caption=f"caption for post {i} with a few words in it",
+            url=f"https://res.cloudinary.com/demo/image/upload/v1/uploads/{i}.jpg",
+            created_at=now - timedelta(seconds=i),
+            file_type="image",
+            file_name=f"{i}.jpg",
+            thumbnail_url=f"https://res.cloudinary.com/demo/image/upload/v1/uploads/{i}_320.jpg",
+            width=1920,
+            height=1080,
+            duration=None,
+            renditions=[
+                {"width": width, "url": f"https://res.cloudinary.com/demo/image/upload/v1/uploads/{i}_{width}.jpg"}
+                for width in (320, 640, 1280)
+            ],
+            email=f"user{i % 50}@example.com",
+            like_count=i % 7,
+            comment_count=i % 3,
+        )
+        for i in range(n)
+    ]
+
+
+def legacy(rows, viewer_id):
+    posts = [
+        {
+            "id": str(row.id),
+            "user_id": str(row.user_id),
+            "caption": row.caption,
+            "url": row.url,
+            "created_at": row.created_at,
+            "file_type": row.file_type,
+            "file_name": row.file_name,
+            "is_owner": row.user_id == viewer_id,
+            "email": row.email,
+        }
+        for row in rows
+    ]
+    return json.dumps(jsonable_encoder({"posts": posts, "next_cursor": None})).encode()
+
+
+def response_model(rows, viewer_id, adapter=TypeAdapter(FeedPage)):
+    posts = [{**serialize_feed_row(row), "liked": False, "is_owner": row.user_id == viewer_id} for row in rows]
+    return adapter.dump_json(adapter.validate_python({"posts": posts, "next_cursor": None}))
+
+
+def orjson_path(rows, viewer_id):
+    posts = [{**serialize_feed_row(row), "liked": False, "is_owner": row.user_id == viewer_id} for row in rows]
+    return OrjsonResponse({"posts": posts, "next_cursor": None}).body
+
+
+def orjson_cached(posts, viewer_id):
+    # Feed cache hit: rows are already serialized, only liked and is_owner are added
+    return OrjsonResponse(
+        {
+            "posts": [{**post, "liked": False, "is_owner": post["user_id"] == viewer_id} for post in posts],
+            "next_cursor": None,
+        }
+    ).body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--posts", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--number", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args()
+
+    rows = make_rows(args.posts)
+    viewer_id = rows[0].user_id
+    cached = [serialize_feed_row(row) for row in rows]
+    cases = {
+        "legacy_jsonable_encoder": lambda: legacy(rows, viewer_id),
+        "pydantic_response_model": lambda: response_model(rows, viewer_id),
+        "orjson": lambda: orjson_path(rows, viewer_id),
+        "orjson_cache_hit": lambda: orjson_cached(cached, viewer_id),
+    }
+
+    results = {}
+    for name, fn in cases.items():
+        best = min(timeit.repeat(fn, number=args.number, repeat=args.repeat)) / args.number
+        results[name] = {"ms_per_1k_posts": best * 1000 * 1000 / args.posts, "bytes": len(fn())}
+
+    if args.json:
+        json.dump({"benchmark": "serialization", "posts": args.posts, "results": results}, sys.stdout, indent=2)
+        print()
+        return
+    print(f"{'path':<26} {'ms / 1k posts':>14} {'bytes':>10}")
+    for name, result in results.items():
+        print(f"{name:<26} {result['ms_per_1k_posts']:>14.3f} {result['bytes']:>10}")
+
+
+if __name__ == "__main__":
+    main()
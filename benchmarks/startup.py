@@ -0,0 +1,157 @@
+"""
+Cold start of the production server (python -m app.serve).
+
+Starts the server against a migrated throwaway SQLite database, polls
+until the first request is answered, times a few more requests, then
+sends SIGTERM and times the drain. Repeated --runs times per worker count.
+
+    python -m benchmarks.startup --output startup.json
+    python -m benchmarks.startup --workers 1 4 --runs 5 --path /feed
+
+Per run it reports ready_ms (process start to first response),
+first_request_ms (that response's own latency), warm_p50_ms (the next
+--warm-requests) and shutdown_ms (SIGTERM to exit). Any HTTP status counts
+as a response, so unauthenticated paths like /feed measure the app without
+needing users.
+"""
+import argparse
+import json
+import os
+import platform
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks.load import git_commit, percentile
+
+POLL_INTERVAL = 0.01
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def timed_get(client: httpx.Client, url: str) -> float:
+    start = time.perf_counter()
+    client.get(url)
+    return (time.perf_counter() - start) * 1000
+
+
+def run_once(workers: int, args, env: dict) -> dict:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}{args.path}"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.serve", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        with httpx.Client(timeout=args.timeout) as client:
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError(f"server exited with {server.returncode} before answering")
+                if time.perf_counter() - start > args.timeout:
+                    raise RuntimeError(f"no response within {args.timeout}s")
+                request_start = time.perf_counter()
+                try:
+                    client.get(url)
+                except httpx.TransportError:
+                    time.sleep(POLL_INTERVAL)
+                    continue
+                ready = time.perf_counter()
+                first_request_ms = (ready - request_start) * 1000
+                break
+            warm = [timed_get(client, url) for _ in range(args.warm_requests)]
+    finally:
+        stop = time.perf_counter()
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=args.timeout)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+    return {
+        "workers": workers,
+        "ready_ms": round((ready - start) * 1000, 1),
+        "first_request_ms": round(first_request_ms, 2),
+        "warm_p50_ms": round(percentile(warm, 50), 2),
+        "shutdown_ms": round((time.perf_counter() - stop) * 1000, 1),
+    }
+
+
+def summarize(runs: list[dict]) -> dict:
+    return {
+        "workers": runs[0]["workers"],
+        "runs": len(runs),
+        **{
+            f"{field}_median": round(statistics.median(r[field] for r in runs), 2)
+            for field in ("ready_ms", "first_request_ms", "warm_p50_ms", "shutdown_ms")
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--path", default="/feed")
+    parser.add_argument("--warm-requests", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(tmp, 'startup.db')}",
+            "STAGING_ROOT": os.path.join(tmp, "staging"),
+            "LOG_LEVEL": "ERROR",
+        }
+        env.setdefault("JWT_SECRET", "benchmark-secret-benchmark-secret")
+        # The schema is migrated once up front, like a deploy would
+        subprocess.run([sys.executable, "-m", "app.migrate"], env=env, check=True, capture_output=True)
+
+        results = []
+        for workers in args.workers:
+            runs = [run_once(workers, args, env) for _ in range(args.runs)]
+            summary = summarize(runs)
+            results.append({**summary, "samples": runs})
+            print(
+                f"workers={workers:<3} ready {summary['ready_ms_median']:>8.1f}ms"
+                f"  first request {summary['first_request_ms_median']:>7.2f}ms"
+                f"  warm p50 {summary['warm_p50_ms_median']:>6.2f}ms"
+                f"  shutdown {summary['shutdown_ms_median']:>7.1f}ms",
+                file=sys.stderr,
+            )
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "path": args.path,
+            "runs": args.runs,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
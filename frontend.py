@@ -1,6 +1,13 @@
+import html
+import json
+import os
+import threading
+import time
+from collections import deque
+
 import streamlit as st
 import requests
-import urllib.parse
+from requests.adapters import HTTPAdapter
 
 st.set_page_config(page_title="Simple Social", layout="wide")
 
@@ -9,6 +16,68 @@ if 'token' not in st.session_state:
     st.session_state.token = None
 if 'user' not in st.session_state:
     st.session_state.user = None
+if 'feed_posts' not in st.session_state:
+    st.session_state.feed_posts = None
+if 'feed_cursor' not in st.session_state:
+    st.session_state.feed_cursor = None
+if 'feed_etag' not in st.session_state:
+    st.session_state.feed_etag = None
+if 'feed_events' not in st.session_state:
+    st.session_state.feed_events = None
+
+FEED_PAGE_SIZE = 20
+API_URL = os.getenv("API_URL", "http://localhost:8000").rstrip("/")
+# Connections kept open to the API, shared by every browser session
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", 20))
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", 30))
+# How long a feed page fetched for a viewer is reused on their reruns
+FEED_PAGE_TTL = int(os.getenv("FEED_PAGE_TTL", 10))
+# A browser session that hasn't rerun for this long is taken as closed,
+# and its /events listener stops (Streamlit doesn't say when a tab goes)
+FEED_EVENTS_IDLE = int(os.getenv("FEED_EVENTS_IDLE", 300))
+# Attempts at one chunk of a resumable upload before giving up
+CHUNK_RETRIES = 5
+
+
+class ApiClient:
+    """
+    The API over one pooled requests.Session: every rerun of every browser
+    session reuses the same keep-alive connections instead of opening one
+    per call
+    """
+
+    def __init__(self, base_url, pool_size=API_POOL_SIZE, timeout=API_TIMEOUT):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, path, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, self.base_url + path, **kwargs)
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request("PUT", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    def stream(self, path, headers, timeout):
+        # Not through the pool: a stream holds its connection as long as the page is open
+        return requests.get(self.base_url + path, headers=headers, stream=True, timeout=timeout)
+
+
+@st.cache_resource
+def api():
+    return ApiClient(API_URL)
 
 
 def get_headers():
@@ -18,6 +87,156 @@ def get_headers():
     return {}
 
 
+class FeedEvents:
+    """
+    Listens to /events in a background thread and keeps what arrives for
+    the next rerun to apply to the loaded feed. Lives as long as its
+    session keeps rerunning: after idle seconds without one it stops.
+    """
+
+    def __init__(self, headers, idle=FEED_EVENTS_IDLE):
+        self.headers = headers
+        self.idle = idle
+        self.last_rerun = time.monotonic()
+        # Looked up here, on the script thread
+        self.api = api()
+        self.pending = deque()
+        self.alive = True
+        self.stopped = False
+        self.thread = threading.Thread(target=self.listen, daemon=True)
+        self.thread.start()
+
+    def listen(self):
+        try:
+            # The server sends a heartbeat every 15s, so a read timeout means the connection is gone
+            with self.api.stream("/events", headers=self.headers, timeout=(5, 60)) as response:
+                if response.status_code != 200:
+                    return
+                event = None
+                # Heartbeats included, so an idle session is noticed within 15s
+                for line in response.iter_lines(decode_unicode=True):
+                    if self.stopped or time.monotonic() - self.last_rerun > self.idle:
+                        return
+                    if line.startswith("event:"):
+                        event = line[len("event:"):].strip()
+                    elif line.startswith("data:") and event:
+                        self.pending.append((event, json.loads(line[len("data:"):])))
+                    elif not line:
+                        event = None
+        except requests.RequestException:
+            pass
+        finally:
+            self.alive = False
+
+    def touch(self):
+        """Called on every rerun of the session"""
+        self.last_rerun = time.monotonic()
+
+    def stop(self):
+        self.stopped = True
+
+    def drain(self):
+        while self.pending:
+            yield self.pending.popleft()
+
+
+def listen_for_feed_events():
+    """Make sure a listener is running, True if one already was"""
+    events = st.session_state.feed_events
+    if events is not None and events.alive:
+        events.touch()
+        return True
+    st.session_state.feed_events = FeedEvents(get_headers())
+    return False
+
+
+def apply_feed_events():
+    """
+    Bring the loaded feed up to date from pushed events. Falls back to
+    revalidating the first page when events may have been missed.
+    """
+    if not listen_for_feed_events():
+        return refresh_feed()
+
+    for event, data in st.session_state.feed_events.drain():
+        if event == "resync":
+            return refresh_feed()
+        if event == "post_created":
+            if all(post['id'] != data['id'] for post in st.session_state.feed_posts):
+                st.session_state.feed_posts.insert(0, data)
+        elif event == "post_deleted":
+            st.session_state.feed_posts = [post for post in st.session_state.feed_posts if post['id'] != data['id']]
+    return True
+
+
+def reset_feed():
+    """Drop loaded feed pages so the next render starts from the newest post"""
+    st.session_state.feed_posts = None
+    st.session_state.feed_cursor = None
+    st.session_state.feed_etag = None
+
+
+def refresh_feed():
+    """Revalidate the first page; the server answers 304 if nothing changed"""
+    headers = get_headers()
+    if st.session_state.feed_etag:
+        headers["If-None-Match"] = st.session_state.feed_etag
+    response = api().get("/feed", params={"limit": FEED_PAGE_SIZE}, headers=headers)
+    if response.status_code == 304:
+        return True
+    if response.status_code != 200:
+        return False
+
+    # Something changed: start over from the fresh first page
+    reset_feed()
+    store_feed_page(feed_page_data(response))
+    # The ETag is per viewer, like the pages of fetch_feed_page
+    st.session_state.feed_etag = response.headers.get("ETag")
+    return True
+
+
+def feed_page_data(response):
+    data = response.json()
+    if isinstance(data, list):
+        return {"posts": data, "next_cursor": None}
+    return {"posts": data.get("posts", []), "next_cursor": data.get("next_cursor")}
+
+
+@st.cache_data(ttl=FEED_PAGE_TTL, max_entries=100, show_spinner=False)
+def fetch_feed_page(viewer_id, before, limit, _headers):
+    """
+    One feed page as viewer_id sees it (liked and is_owner are theirs),
+    reused by that viewer's reruns and browser sessions for FEED_PAGE_TTL
+    seconds. The headers are not part of the cache key, the viewer is.
+    Cleared on upload and delete.
+    """
+    params = {"limit": limit}
+    if before:
+        params["before"] = before
+    response = api().get("/feed", params=params, headers=_headers)
+    # Raising keeps failures out of the cache
+    response.raise_for_status()
+    return feed_page_data(response)
+
+
+def store_feed_page(data):
+    user_id = str(st.session_state.user['id'])
+    posts = [{**post, "is_owner": str(post['user_id']) == user_id} for post in data["posts"]]
+    st.session_state.feed_posts = (st.session_state.feed_posts or []) + posts
+    st.session_state.feed_cursor = data["next_cursor"]
+
+
+def load_feed_page(before=None):
+    """Fetch one feed page and append it to the loaded posts"""
+    try:
+        data = fetch_feed_page(str(st.session_state.user['id']), before, FEED_PAGE_SIZE, get_headers())
+    except requests.RequestException:
+        return False
+
+    store_feed_page(data)
+    return True
+
+
 def login_page():
     st.title("🚀 Welcome to Simple Social")
 
@@ -30,13 +249,13 @@ def login_page():
         with col1:
             if st.button("Login", type="primary", use_container_width=True):
                 login_data = {"username": email, "password": password}
-                response = requests.post("http://localhost:8000/auth/jwt/login", data=login_data)
+                response = api().post("/auth/jwt/login", data=login_data)
 
                 if response.status_code == 200:
                     token_data = response.json()
                     st.session_state.token = token_data["access_token"]
 
-                    user_response = requests.get("http://localhost:8000/auth/me", headers=get_headers())
+                    user_response = api().get("/auth/me", headers=get_headers())
                     if user_response.status_code == 200:
                         st.session_state.user = user_response.json()
                         st.rerun()
@@ -48,7 +267,7 @@ def login_page():
         with col2:
             if st.button("Sign Up", type="secondary", use_container_width=True):
                 signup_data = {"email": email, "password": password}
-                response = requests.post("http://localhost:8000/auth/register", json=signup_data)
+                response = api().post("/auth/register", json=signup_data)
 
                 if response.status_code == 201:
                     st.success("Account created! Click Login now.")
@@ -59,6 +278,63 @@ def login_page():
         st.info("Enter your email and password above")
 
 
+def upload_resumable(uploaded_file, caption, progress):
+    """
+    Send a file through the resumable /uploads API, reading one chunk at a
+    time. After a failed chunk it asks the server what it has and resumes
+    from there. Returns the last response, None if the API was unreachable.
+    """
+    headers = get_headers()
+    try:
+        response = api().post("/uploads", json={
+            "filename": uploaded_file.name,
+            "content_type": uploaded_file.type or "application/octet-stream",
+            "size": uploaded_file.size,
+            "caption": caption,
+        }, headers=headers)
+    except requests.RequestException:
+        return None
+    if response.status_code != 201:
+        return response
+    status = response.json()
+    path = f"/uploads/{status['id']}"
+
+    failures = 0
+    while status['next_chunk'] < status['chunks']:
+        uploaded_file.seek(status['received'])
+        chunk = uploaded_file.read(status['chunk_size'])
+        try:
+            response = api().put(
+                f"{path}/chunks/{status['next_chunk']}", data=chunk,
+                headers={**headers, "Content-Type": "application/octet-stream"},
+            )
+        except requests.RequestException:
+            response = None
+        if response is not None and response.status_code == 200:
+            status = response.json()
+            failures = 0
+            progress.progress(status['received'] / status['size'])
+            continue
+        if response is not None and 400 <= response.status_code < 500 and response.status_code != 409:
+            return response
+
+        failures += 1
+        if failures >= CHUNK_RETRIES:
+            return response
+        time.sleep(failures)
+        try:
+            resumed = api().get(path, headers=headers)
+            if resumed.status_code == 200:
+                status = resumed.json()
+        except requests.RequestException:
+            pass
+
+    try:
+        return api().post(f"{path}/complete", headers=headers)
+    except requests.RequestException:
+        return None
+
+
 def upload_page():
     st.title("📸 Share Something")
 
@@ -66,14 +342,20 @@ def upload_page():
     caption = st.text_area("Caption:", placeholder="What's on your mind?")
 
     if uploaded_file and st.button("Share", type="primary"):
-        with st.spinner("Uploading to Cloudinary..."):
-            files = {"file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)}
-            data = {"caption": caption}
-            response = requests.post("http://localhost:8000/upload", files=files, data=data, headers=get_headers())
-
-            if response.status_code == 200:
-                st.success("Posted successfully!")
-                st.rerun()
+        with st.spinner("Uploading..."):
+            if (uploaded_file.type or "").startswith("video/"):
+                # In chunks that survive a dropped connection, never the whole video at once
+                response = upload_resumable(uploaded_file, caption, st.progress(0.0))
+            else:
+                files = {"file": (uploaded_file.name, uploaded_file, uploaded_file.type)}
+                data = {"caption": caption}
+                response = api().post("/upload", files=files, data=data, headers=get_headers())
+
+            if response is None:
+                st.error("Upload failed: the server could not be reached")
+            elif response.status_code == 202:
+                fetch_feed_page.clear()
+                st.success("Posted! It will show up in the feed once it has been processed.")
             else:
                 try:
                     error_msg = response.json().get("detail", "Upload failed")
@@ -82,48 +364,51 @@ def upload_page():
                 st.error(f"Upload failed: {error_msg}")
 
 
-def get_cloudinary_image_url(base_url, caption=None, width=800):
+def pick_rendition(post, width=800):
     """
-    Generate a Cloudinary transformed URL with optional caption overlay
+    URL of the narrowest ready-made rendition at least `width` wide
     """
-    transformations = []
-
-    # Resize to fixed width, maintain aspect ratio
-    transformations.append(f"w_{width}")
-
-    # Auto quality and format
-    transformations.append("q_auto")
-    transformations.append("f_auto")
+    srcset = post.get('srcset') or []
+    for rendition in srcset:
+        if rendition['width'] >= width:
+            return rendition['url']
+    return srcset[-1]['url'] if srcset else None
 
-    # Add caption overlay at bottom if provided
-    if caption:
-        encoded_caption = urllib.parse.quote(caption)
-        overlay = f"l_text:Arial_48_bold:{encoded_caption},co_white,bo_6px_solid_black,g_south,y_20"
-        transformations.append(overlay)
 
-    # Combine transformations
-    transform_str = ",".join(transformations)
-    return base_url.replace("/upload/", f"/upload/{transform_str}/")
-
-
-def get_cloudinary_video_url(base_url, width=800):
+def media_html(post):
     """
-    Generate video URL with poster thumbnail and optimizations
+    Markup for a post's media that the browser only fetches once it is
+    scrolled near, picking the rendition that fits from the srcset
     """
-    transformations = f"w_{width},q_auto,f_auto"
-    return base_url.replace("/upload/", f"/upload/{transformations}/")
+    url = html.escape(post['url'] or "")
+    if post['file_type'] != 'image':
+        poster = f' poster="{html.escape(post["thumbnail_url"])}"' if post.get('thumbnail_url') else ""
+        return f'<video src="{url}"{poster} controls preload="none" style="width:100%"></video>'
+
+    src = html.escape(pick_rendition(post, width=800) or post['url'] or "")
+    srcset = ", ".join(f"{html.escape(r['url'])} {r['width']}w" for r in post.get('srcset') or [])
+    # Known dimensions reserve the space, so lazy images do not shift the page as they load
+    size = f' width="{post["width"]}" height="{post["height"]}"' if post.get('width') and post.get('height') else ""
+    return (
+        f'<img src="{src}" srcset="{srcset}" sizes="(max-width: 800px) 100vw, 800px"{size}'
+        f' loading="lazy" decoding="async" style="width:100%;height:auto">'
+    )
 
 
 def feed_page():
     st.title("🏠 Feed")
 
-    response = requests.get("http://localhost:8000/feed", headers=get_headers())
-    if response.status_code != 200:
+    if st.session_state.feed_posts is not None:
+        loaded = apply_feed_events()
+    else:
+        # Listen first, so nothing published while the page loads is missed
+        listen_for_feed_events()
+        loaded = load_feed_page()
+    if not loaded:
         st.error("Failed to load feed. Make sure you're logged in.")
         return
 
-    data = response.json()
-    posts = data if isinstance(data, list) else data.get("posts", [])
+    posts = st.session_state.feed_posts
 
     if not posts:
         st.info("No posts yet! Be the first to share something.")
@@ -140,32 +425,31 @@ def feed_page():
         with col2:
             if post.get('is_owner', False):
                 if st.button("🗑️", key=f"delete_{post['id']}", help="Delete your post"):
-                    del_response = requests.delete(
-                        f"http://localhost:8000/posts/{post['id']}",
-                        headers=get_headers()
-                    )
+                    del_response = api().delete(f"/posts/{post['id']}", headers=get_headers())
                     if del_response.status_code == 200:
                         st.success("Post deleted!")
+                        fetch_feed_page.clear()
+                        # The post_deleted event would do the same on the next rerun
+                        st.session_state.feed_posts = [p for p in posts if p['id'] != post['id']]
                         st.rerun()
                     else:
                         st.error("Failed to delete post")
 
         caption = post.get('caption', '').strip()
 
-        if post['file_type'] == 'image':
-            img_url = get_cloudinary_image_url(post['url'], caption=caption if caption else None, width=800)
-            st.image(img_url, use_column_width=True)
-            if caption and len(caption) > 50:  # Show long captions below if not overlaid well
-                st.caption(caption)
-        else:
-            # Video
-            video_url = get_cloudinary_video_url(post['url'], width=800)
-            st.video(video_url)
-            if caption:
-                st.caption(caption)
+        st.markdown(media_html(post), unsafe_allow_html=True)
+        if caption:
+            st.caption(caption)
 
         st.markdown("<br>", unsafe_allow_html=True)  # spacing
 
+    if st.session_state.feed_cursor:
+        if st.button("Load more", use_container_width=True):
+            if load_feed_page(st.session_state.feed_cursor):
+                st.rerun()
+            else:
+                st.error("Failed to load more posts")
+
 
 # Main app routing
 if st.session_state.user is None:
@@ -176,6 +460,10 @@ else:
     if st.sidebar.button("Logout"):
         st.session_state.token = None
         st.session_state.user = None
+        reset_feed()
+        if st.session_state.feed_events is not None:
+            st.session_state.feed_events.stop()
+            st.session_state.feed_events = None
         st.rerun()
 
     st.sidebar.markdown("---")
@@ -1,4 +1,5 @@
 import uvicorn
 
+# Development server (one process, reloads on changes). Production: python -m app.serve
 if __name__ == "__main__":
     uvicorn.run("app.app:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
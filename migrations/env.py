@@ -0,0 +1,70 @@
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import Uuid, pool
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import DATABASE_URL
+from app.db import Base, normalize_database_url
+from app.search import is_search_object
+
+config = context.config
+
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def database_url() -> str:
+    return normalize_database_url(config.get_main_option("sqlalchemy.url") or DATABASE_URL)
+
+
+def compare_type(context, inspected_column, metadata_column, inspected_type, metadata_type):
+    # SQLite reflects UUID columns as NUMERIC, which is not a real change
+    if context.dialect.name == "sqlite" and isinstance(metadata_type, Uuid):
+        return False
+    return None
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    # The caption search index is made by hand (0007), the models do not know it
+    return not (reflected and is_search_object(name))
+
+
+def configure(**kwargs) -> None:
+    # Batch mode lets ALTER-style operations work on SQLite by copying the table
+    context.configure(
+        target_metadata=target_metadata,
+        render_as_batch=True,
+        compare_type=compare_type,
+        include_object=include_object,
+        **kwargs,
+    )
+
+
+def run_migrations_offline() -> None:
+    configure(url=database_url(), literal_binds=True, dialect_opts={"paramstyle": "named"})
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection: Connection) -> None:
+    configure(connection=connection)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    connectable = create_async_engine(database_url(), poolclass=pool.NullPool)
+    async with connectable.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await connectable.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    asyncio.run(run_async_migrations())
@@ -0,0 +1,64 @@
+"""post storage key and feed index
+
+Revision ID: 0001a
+Revises: 0001
+Create Date: 2026-10-18 01:47:02.118406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from fastapi_users_db_sqlalchemy.generics import GUID
+
+from app.migrate import create_index_online, drop_index_online
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001a'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# On SQLite the first create_all stored posts.user_id as 32 hex digits,
+# while user.id (fastapi-users' GUID) is the dashed 36 character form
+DASHED = (
+    "substr(user_id, 1, 8) || '-' || substr(user_id, 9, 4) || '-' || substr(user_id, 13, 4) || '-' || "
+    "substr(user_id, 17, 4) || '-' || substr(user_id, 21, 12)"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('posts')}
+    if 'storage_key' in columns:
+        # Made by an earlier version of 0001 that had all of this already
+        return
+
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        if 'user_id' not in columns:
+            # Databases from before there were accounts: only an empty posts
+            # table can take the column, posts without an author can't be kept
+            batch_op.add_column(sa.Column('user_id', GUID(), nullable=False))
+            batch_op.create_foreign_key('fk_posts_user_id_user', 'user', ['user_id'], ['id'])
+        batch_op.add_column(sa.Column('storage_key', sa.String(), nullable=True))
+
+    if op.get_bind().dialect.name == 'sqlite' and 'user_id' in columns:
+        # Postgres stores both as uuid already
+        op.execute(f"UPDATE posts SET user_id = lower({DASHED}) WHERE length(user_id) = 32")
+        with op.batch_alter_table('posts', schema=None) as batch_op:
+            batch_op.alter_column('user_id', existing_type=sa.UUID(), type_=GUID(), existing_nullable=False)
+
+    create_index_online('ix_posts_created_at_id', 'posts', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    drop_index_online('ix_posts_created_at_id', 'posts')
+    if op.get_bind().dialect.name == 'sqlite':
+        with op.batch_alter_table('posts', schema=None) as batch_op:
+            batch_op.alter_column('user_id', existing_type=GUID(), type_=sa.UUID(), existing_nullable=False)
+        op.execute("UPDATE posts SET user_id = replace(user_id, '-', '') WHERE length(user_id) = 36")
+
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.drop_column('storage_key')
@@ -0,0 +1,70 @@
+"""background jobs
+
+Revision ID: 0002
+Revises: 0001a
+Create Date: 2026-10-18 01:58:37.405365
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('jobs',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('run_at', sa.DateTime(), nullable=False),
+    sa.Column('locked_by', sa.String(), nullable=True),
+    sa.Column('locked_at', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.create_index('ix_jobs_status_run_at', ['status', 'run_at'], unique=False)
+
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('status', sa.String(), server_default='ready', nullable=False))
+        batch_op.add_column(sa.Column('thumbnail_url', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('thumbnail_key', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('width', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('height', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('duration', sa.Float(), nullable=True))
+        batch_op.alter_column('url',
+               existing_type=sa.VARCHAR(),
+               nullable=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Posts still waiting for their job have no url yet
+    op.execute("DELETE FROM posts WHERE url IS NULL")
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.alter_column('url',
+               existing_type=sa.VARCHAR(),
+               nullable=False)
+        batch_op.drop_column('duration')
+        batch_op.drop_column('height')
+        batch_op.drop_column('width')
+        batch_op.drop_column('thumbnail_key')
+        batch_op.drop_column('thumbnail_url')
+        batch_op.drop_column('status')
+
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.drop_index('ix_jobs_status_run_at')
+
+    op.drop_table('jobs')
@@ -0,0 +1,40 @@
+"""post author email
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 02:08:02.493892
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.migrate import create_index_online, drop_index_online
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('author_email', sa.String(length=320), nullable=True))
+    # Posts whose author row is gone keep showing as before, by "Unknown"
+    op.execute(
+        'UPDATE posts SET author_email = coalesce((SELECT email FROM "user" WHERE "user".id = posts.user_id), \'Unknown\')'
+    )
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.alter_column('author_email', existing_type=sa.String(length=320), nullable=False)
+    create_index_online('ix_posts_user_id_created_at_id', 'posts', ['user_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    drop_index_online('ix_posts_user_id_created_at_id', 'posts')
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.drop_column('author_email')
@@ -0,0 +1,64 @@
+"""caption search
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 02:31:12.402918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_context().dialect.name == "postgresql":
+        # CONCURRENTLY can't run inside the migration's transaction
+        with op.get_context().autocommit_block():
+            op.execute(
+                "CREATE INDEX CONCURRENTLY ix_posts_caption_search ON posts "
+                "USING gin (to_tsvector('english', coalesce(caption, '')))"
+            )
+        return
+
+    # FTS5 over posts.caption, kept in sync by triggers (see app.search)
+    op.execute(
+        "CREATE VIRTUAL TABLE posts_fts USING fts5("
+        "caption, content='posts', content_rowid='rowid', tokenize='porter unicode61')"
+    )
+    op.execute(
+        "CREATE TRIGGER posts_fts_insert AFTER INSERT ON posts BEGIN "
+        "INSERT INTO posts_fts(rowid, caption) VALUES (new.rowid, new.caption); END"
+    )
+    op.execute(
+        "CREATE TRIGGER posts_fts_delete AFTER DELETE ON posts BEGIN "
+        "INSERT INTO posts_fts(posts_fts, rowid, caption) VALUES ('delete', old.rowid, old.caption); END"
+    )
+    op.execute(
+        "CREATE TRIGGER posts_fts_update AFTER UPDATE OF caption ON posts BEGIN "
+        "INSERT INTO posts_fts(posts_fts, rowid, caption) VALUES ('delete', old.rowid, old.caption); "
+        "INSERT INTO posts_fts(rowid, caption) VALUES (new.rowid, new.caption); END"
+    )
+    op.execute("INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_context().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            op.execute("DROP INDEX CONCURRENTLY ix_posts_caption_search")
+        return
+
+    # Gone already if a later migration rebuilt posts without restoring them
+    op.execute("DROP TRIGGER IF EXISTS posts_fts_update")
+    op.execute("DROP TRIGGER IF EXISTS posts_fts_delete")
+    op.execute("DROP TRIGGER IF EXISTS posts_fts_insert")
+    op.execute("DROP TABLE posts_fts")
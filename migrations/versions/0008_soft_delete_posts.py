@@ -0,0 +1,66 @@
+"""soft delete posts
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 02:22:53.445880
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.migrate import create_index_online, drop_index_online, replace_index_online
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, Sequence[str], None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+NOT_DELETED = sa.text('deleted_at IS NULL')
+DELETED = sa.text('deleted_at IS NOT NULL')
+
+# The caption search triggers of 0007, which rebuilding posts on SQLite drops
+SEARCH_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN "
+    "INSERT INTO posts_fts(rowid, caption) VALUES (new.rowid, new.caption); END",
+    "CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN "
+    "INSERT INTO posts_fts(posts_fts, rowid, caption) VALUES ('delete', old.rowid, old.caption); END",
+    "CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF caption ON posts BEGIN "
+    "INSERT INTO posts_fts(posts_fts, rowid, caption) VALUES ('delete', old.rowid, old.caption); "
+    "INSERT INTO posts_fts(rowid, caption) VALUES (new.rowid, new.caption); END",
+)
+
+
+def restore_caption_search() -> None:
+    if op.get_context().dialect.name != "sqlite":
+        return
+    for trigger in SEARCH_TRIGGERS:
+        op.execute(trigger)
+    # The copy renumbered posts.rowid, which the index is keyed by
+    op.execute("INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    # The feed indexes become partial, leaving deleted posts out
+    replace_index_online('ix_posts_created_at_id', 'posts', ['created_at', 'id'], unique=False, sqlite_where=NOT_DELETED, postgresql_where=NOT_DELETED)
+    replace_index_online('ix_posts_user_id_created_at_id', 'posts', ['user_id', 'created_at', 'id'], unique=False, sqlite_where=NOT_DELETED, postgresql_where=NOT_DELETED)
+    create_index_online('ix_posts_deleted_at', 'posts', ['deleted_at'], unique=False, sqlite_where=DELETED, postgresql_where=DELETED)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Posts deleted but not purged yet would come back
+    op.execute('DELETE FROM timeline_entries WHERE post_id IN (SELECT id FROM posts WHERE deleted_at IS NOT NULL)')
+    op.execute('DELETE FROM posts WHERE deleted_at IS NOT NULL')
+    drop_index_online('ix_posts_deleted_at', 'posts')
+    replace_index_online('ix_posts_user_id_created_at_id', 'posts', ['user_id', 'created_at', 'id'], unique=False)
+    replace_index_online('ix_posts_created_at_id', 'posts', ['created_at', 'id'], unique=False)
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.drop_column('deleted_at')
+    restore_caption_search()
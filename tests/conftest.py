@@ -0,0 +1,94 @@
+"""
+Shared fixtures. The app reads its configuration at import time, so the
+environment is set up here, before anything from app is imported: a
+throwaway SQLite database migrated once per run, local media storage, no
+background job workers and cheap password hashing.
+"""
+import os
+import tempfile
+import uuid
+
+import pytest
+
+ROOT = tempfile.mkdtemp(prefix="app-tests-")
+
+os.environ.update(
+    DATABASE_URL=f"sqlite+aiosqlite:///{os.path.join(ROOT, 'test.db')}",
+    JWT_SECRET="test-secret-test-secret-test-secret",
+    MEDIA_BACKEND="local",
+    MEDIA_ROOT=os.path.join(ROOT, "media"),
+    STAGING_ROOT=os.path.join(ROOT, "staging"),
+    JOB_WORKERS="0",
+    RATE_LIMIT_BACKEND="none",
+    # Tests flush the counters themselves
+    COUNTER_FLUSH_INTERVAL="3600",
+    UPLOAD_CHUNK_BYTES="1024",
+    PASSWORD_ARGON2_TIME_COST="1",
+    PASSWORD_ARGON2_MEMORY_COST="1024",
+    PASSWORD_ARGON2_PARALLELISM="1",
+    PASSWORD_BCRYPT_ROUNDS="4",
+    LOG_LEVEL="WARNING",
+)
+
+import httpx  # noqa: E402
+
+from app.migrate import upgrade  # noqa: E402
+
+upgrade()
+
+from app.app import app  # noqa: E402
+from app.db import Post, async_session_maker  # noqa: E402
+
+PASSWORD = "test-password"
+
+
+@pytest.fixture
+async def client():
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            yield client
+
+
+@pytest.fixture
+async def session():
+    async with async_session_maker() as session:
+        yield session
+
+
+@pytest.fixture
+def sign_up(client):
+    async def sign_up() -> tuple[uuid.UUID, dict]:
+        """A new user, returns their id and auth headers"""
+        email = f"{uuid.uuid4().hex}@example.com"
+        response = await client.post("/auth/register", json={"email": email, "password": PASSWORD})
+        assert response.status_code == 201, response.text
+        user_id = uuid.UUID(response.json()["id"])
+        response = await client.post("/auth/jwt/login", data={"username": email, "password": PASSWORD})
+        assert response.status_code == 200, response.text
+        return user_id, {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return sign_up
+
+
+@pytest.fixture
+def add_post(session):
+    async def add_post(user_id, **fields) -> Post:
+        """A ready post inserted directly, without going through media storage"""
+        values = {
+            "author_email": "author@example.com",
+            "url": "http://test/media/post.jpg",
+            "file_type": "image",
+            "file_name": "post.jpg",
+            "status": "ready",
+            **fields,
+        }
+        post = Post(user_id=user_id, **values)
+        session.add(post)
+        await session.commit()
+        return post
+    return add_post
+
+
+@pytest.fixture
+async def user(sign_up):
+    return await sign_up()
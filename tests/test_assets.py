@@ -0,0 +1,76 @@
+import hashlib
+import uuid
+from types import SimpleNamespace
+
+from app.assets import add_reference, release, release_posts
+from app.db import MediaAsset
+
+
+async def add_asset(session, ref_count: int) -> MediaAsset:
+    content_hash = hashlib.sha256(uuid.uuid4().bytes).hexdigest()
+    asset = MediaAsset(
+        content_hash=content_hash,
+        url=f"http://test/media/{content_hash}.jpg",
+        file_type="image",
+        storage_key=f"{content_hash}.jpg",
+        renditions=[
+            {"width": 400, "url": "http://test/media/400.jpg", "key": f"{content_hash}_400.jpg"},
+            # The original when it is no wider than the largest rendition
+            {"width": 800, "url": f"http://test/media/{content_hash}.jpg", "key": f"{content_hash}.jpg"},
+        ],
+        ref_count=ref_count,
+    )
+    session.add(asset)
+    await session.commit()
+    return asset
+
+
+async def ref_count(session, content_hash: str) -> int | None:
+    asset = await session.get(MediaAsset, content_hash, populate_existing=True)
+    return asset.ref_count if asset else None
+
+
+async def test_media_is_released_with_the_last_reference(session):
+    asset = await add_asset(session, ref_count=1)
+    assert await add_reference(session, asset.content_hash)
+    await session.commit()
+    assert await ref_count(session, asset.content_hash) == 2
+
+    assert await release(session, asset.content_hash) == []
+    await session.commit()
+    assert await ref_count(session, asset.content_hash) == 1
+
+    keys = await release(session, asset.content_hash)
+    await session.commit()
+    assert keys == [f"{asset.content_hash}.jpg", f"{asset.content_hash}_400.jpg"]
+    assert await ref_count(session, asset.content_hash) is None
+
+
+async def test_a_released_asset_takes_no_new_references(session):
+    asset = await add_asset(session, ref_count=1)
+    await release(session, asset.content_hash)
+    await session.commit()
+
+    # The upload has to store its file again
+    assert not await add_reference(session, asset.content_hash)
+    assert not await add_reference(session, hashlib.sha256(b"never uploaded").hexdigest())
+
+
+async def test_release_posts_counts_shared_posts_per_asset(session):
+    shared = await add_asset(session, ref_count=3)
+
+    def post(**fields):
+        values = {"status": "ready", "content_hash": shared.content_hash, "storage_key": None, "renditions": None}
+        return SimpleNamespace(**{**values, **fields})
+
+    own = post(status="pending", content_hash=None, storage_key="pending.jpg")
+
+    keys = await release_posts(session, [post(), post(), own])
+    await session.commit()
+    # Still used by one post, only the pending post's own media goes
+    assert keys == ["pending.jpg"]
+    assert await ref_count(session, shared.content_hash) == 1
+
+    keys = await release_posts(session, [post()])
+    await session.commit()
+    assert keys == [f"{shared.content_hash}.jpg", f"{shared.content_hash}_400.jpg"]
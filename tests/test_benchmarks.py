@@ -0,0 +1,75 @@
+"""The benchmarks have to keep running against the current app"""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from benchmarks import compare, serialization
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def run_benchmark(*args: str) -> dict:
+    env = {key: value for key, value in os.environ.items() if key != "RATE_LIMIT_BACKEND"}
+    result = subprocess.run(
+        [sys.executable, "-m", *args], cwd=ROOT, env=env, capture_output=True, text=True, timeout=300
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout)
+
+
+def test_load_benchmark_logins_are_not_rate_limited():
+    # More logins from the one benchmark address than AUTH_RATE_LIMIT_IP allows
+    report = run_benchmark(
+        "benchmarks.load", "--scenarios", "login", "--concurrency", "4",
+        "--requests", "40", "--users", "10", "--posts", "10",
+    )
+    assert [result["errors"] for result in report["results"]] == [0]
+
+
+def test_serialization_benchmark_rows_match_the_feed():
+    rows = serialization.make_rows(3)
+    viewer_id = rows[0].user_id
+    cached = [serialization.serialize_feed_row(row) for row in rows]
+    # The response model validates every field the feed returns
+    assert serialization.response_model(rows, viewer_id) == serialization.orjson_path(rows, viewer_id)
+    assert serialization.orjson_cached(cached, viewer_id) == serialization.orjson_path(rows, viewer_id)
+
+
+def test_feed_and_upload_scenarios_report_comparable_results():
+    report = run_benchmark(
+        "benchmarks.load", "--scenarios", "feed", "upload", "--concurrency", "1", "4",
+        "--requests", "8", "--users", "5", "--posts", "30", "--upload-kb", "4",
+    )
+
+    assert [(r["scenario"], r["concurrency"]) for r in report["results"]] == [
+        ("feed", 1), ("feed", 4), ("upload", 1), ("upload", 4),
+    ]
+    for result in report["results"]:
+        assert result["errors"] == 0, result
+        assert result["throughput_rps"] > 0
+        assert result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"]
+    assert report["meta"]["posts"] == 30
+
+
+def write_report(path, p95_ms: float) -> str:
+    result = {"scenario": "feed", "concurrency": 8, "throughput_rps": 100.0, "p95_ms": p95_ms}
+    path.write_text(json.dumps({"meta": {}, "results": [result]}))
+    return str(path)
+
+
+def test_compare_fails_on_a_p95_regression(tmp_path, monkeypatch, capsys):
+    before = write_report(tmp_path / "before.json", 10.0)
+    after = write_report(tmp_path / "after.json", 12.0)
+
+    monkeypatch.setattr(sys, "argv", ["compare", before, after, "--fail-over", "25"])
+    compare.main()
+    monkeypatch.setattr(sys, "argv", ["compare", before, after, "--fail-over", "10"])
+    with pytest.raises(SystemExit) as excinfo:
+        compare.main()
+
+    assert excinfo.value.code == 1
+    assert "feed c=8" in capsys.readouterr().out
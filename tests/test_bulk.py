@@ -0,0 +1,109 @@
+import os
+import uuid
+
+from sqlalchemy import select
+
+from app import processing
+from app.config import STAGING_ROOT
+from app.db import Job, Post
+
+
+def staged_files() -> set[str]:
+    return {
+        os.path.join(root, name)
+        for root, _, names in os.walk(STAGING_ROOT)
+        for name in names
+    }
+
+
+def upload_files(*contents: bytes) -> list:
+    return [("files", (f"photo{i}.jpg", content, "image/jpeg")) for i, content in enumerate(contents)]
+
+
+async def posts_of(session, user_id) -> list[Post]:
+    result = await session.execute(select(Post).where(Post.user_id == user_id).execution_options(populate_existing=True))
+    return list(result.scalars())
+
+
+async def test_batch_upload_makes_one_post_per_file_in_order(client, session, user):
+    _, headers = user
+    contents = [uuid.uuid4().bytes for _ in range(3)]
+
+    response = await client.post(
+        "/upload/batch", headers=headers,
+        files=upload_files(*contents), data={"caption": ["first", "second"]},
+    )
+
+    assert response.status_code == 202, response.text
+    posts = response.json()
+    # Missing captions are empty
+    assert [post["caption"] for post in posts] == ["first", "second", ""]
+    assert [post["file_name"] for post in posts] == ["photo0.jpg", "photo1.jpg", "photo2.jpg"]
+    assert {post["status"] for post in posts} == {"pending"}
+    jobs = await session.scalars(select(Job).where(Job.kind == "process_upload"))
+    queued = {job.payload["post_id"] for job in jobs}
+    assert {post["id"] for post in posts} <= queued
+
+
+async def test_batch_upload_with_more_captions_than_files_adds_nothing(client, session, user):
+    user_id, headers = user
+    before = staged_files()
+
+    response = await client.post(
+        "/upload/batch", headers=headers,
+        files=upload_files(uuid.uuid4().bytes), data={"caption": ["one", "two"]},
+    )
+
+    assert response.status_code == 400
+    assert await posts_of(session, user_id) == []
+    assert staged_files() == before
+
+
+async def test_batch_upload_is_one_transaction(client, session, user, monkeypatch):
+    user_id, headers = user
+    enqueue = processing.enqueue
+    calls = []
+
+    def fail_on_the_second(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 2:
+            raise RuntimeError("queue unavailable")
+        return enqueue(*args, **kwargs)
+
+    monkeypatch.setattr(processing, "enqueue", fail_on_the_second)
+    before = staged_files()
+
+    response = await client.post(
+        "/upload/batch", headers=headers,
+        files=upload_files(uuid.uuid4().bytes, uuid.uuid4().bytes, uuid.uuid4().bytes),
+    )
+
+    assert response.status_code == 500
+    # Not even the post before the failure
+    assert await posts_of(session, user_id) == []
+    assert staged_files() == before
+
+
+async def test_bulk_delete_only_deletes_the_callers_posts(client, session, user, sign_up, add_post):
+    user_id, headers = user
+    other_id, _ = await sign_up()
+    mine = await add_post(user_id)
+    already_deleted = await add_post(user_id)
+    theirs = await add_post(other_id)
+    await client.post("/posts/bulk-delete", headers=headers, json={"ids": [str(already_deleted.id)]})
+    unknown = uuid.uuid4()
+
+    ids = [mine.id, theirs.id, unknown, mine.id, already_deleted.id]
+    response = await client.post("/posts/bulk-delete", headers=headers, json={"ids": [str(i) for i in ids]})
+
+    assert response.status_code == 200, response.text
+    # One result per id, duplicates once
+    assert response.json()["results"] == [
+        {"id": str(mine.id), "status": "deleted"},
+        {"id": str(theirs.id), "status": "forbidden"},
+        {"id": str(unknown), "status": "not_found"},
+        {"id": str(already_deleted.id), "status": "not_found"},
+    ]
+    deleted = {post.id: post.deleted_at is not None for post in await posts_of(session, user_id)}
+    assert deleted == {mine.id: True, already_deleted.id: True}
+    assert all(post.deleted_at is None for post in await posts_of(session, other_id))
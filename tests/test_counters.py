@@ -0,0 +1,134 @@
+import asyncio
+import logging
+
+import pytest
+from sqlalchemy import select
+
+from app.counters import CounterBuffer, reconcile
+from app.db import Like, Post, async_session_maker, engine
+
+
+@pytest.fixture
+def buffer():
+    return CounterBuffer(async_session_maker, interval=3600)
+
+
+async def counts(post_id) -> tuple[int, int]:
+    async with async_session_maker() as session:
+        row = (await session.execute(select(Post.like_count, Post.comment_count).where(Post.id == post_id))).one()
+    return tuple(row)
+
+
+async def test_flush_writes_the_coalesced_deltas(buffer, user, add_post):
+    user_id, _ = user
+    first, second = await add_post(user_id), await add_post(user_id)
+    for _ in range(3):
+        buffer.add(first.id, "like_count")
+    buffer.add(first.id, "comment_count", 2)
+    buffer.add(first.id, "comment_count", -1)
+    buffer.add(second.id, "like_count")
+    assert buffer.pending(first.id, "like_count") == 3
+    assert await counts(first.id) == (0, 0)
+
+    await buffer.flush()
+
+    assert await counts(first.id) == (3, 1)
+    assert await counts(second.id) == (1, 0)
+    assert buffer.pending(first.id, "like_count") == 0
+
+
+async def test_failed_flush_keeps_the_deltas(buffer, user, add_post, monkeypatch):
+    user_id, _ = user
+    post = await add_post(user_id)
+    buffer.add(post.id, "like_count", 2)
+
+    def unavailable():
+        raise ConnectionError("database unavailable")
+
+    monkeypatch.setattr(buffer, "session_maker", unavailable)
+    with pytest.raises(ConnectionError):
+        await buffer.flush()
+    buffer.add(post.id, "like_count")
+    assert buffer.pending(post.id, "like_count") == 3
+
+    monkeypatch.setattr(buffer, "session_maker", async_session_maker)
+    await buffer.flush()
+    assert await counts(post.id) == (3, 0)
+
+
+async def test_stop_flushes_what_is_left(buffer, user, add_post):
+    user_id, _ = user
+    post = await add_post(user_id)
+    buffer.start()
+    buffer.add(post.id, "like_count")
+
+    await buffer.stop()
+
+    assert await counts(post.id) == (1, 0)
+
+
+class PausedSessions:
+    """A session maker whose sessions wait to be let through"""
+
+    def __init__(self):
+        self.entered = asyncio.Event()
+        self.resume = asyncio.Event()
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        self.entered.set()
+        await self.resume.wait()
+        self.session = async_session_maker()
+        return await self.session.__aenter__()
+
+    async def __aexit__(self, *exc):
+        return await self.session.__aexit__(*exc)
+
+
+async def test_deltas_being_flushed_are_still_pending(buffer, user, add_post, monkeypatch):
+    user_id, _ = user
+    post = await add_post(user_id)
+    sessions = PausedSessions()
+    monkeypatch.setattr(buffer, "session_maker", sessions)
+    buffer.add(post.id, "like_count", 2)
+
+    flush = asyncio.create_task(buffer.flush())
+    await sessions.entered.wait()
+    buffer.add(post.id, "like_count")
+    # Taken out of the tally, not in the row yet
+    assert buffer.pending(post.id, "like_count") == 3
+    assert await counts(post.id) == (0, 0)
+
+    sessions.resume.set()
+    await flush
+    assert buffer.pending(post.id, "like_count") == 1
+    assert await counts(post.id) == (2, 0)
+
+
+async def test_a_failed_final_flush_does_not_stop_the_shutdown(buffer, user, add_post, monkeypatch, caplog):
+    user_id, _ = user
+    post = await add_post(user_id)
+    buffer.start()
+    buffer.add(post.id, "like_count")
+
+    def unavailable():
+        raise ConnectionError("database unavailable")
+
+    monkeypatch.setattr(buffer, "session_maker", unavailable)
+    with caplog.at_level(logging.ERROR, logger="app.counters"):
+        await buffer.stop()
+
+    assert "flushing post counters failed" in caplog.text
+
+
+async def test_reconcile_recounts_from_the_likes(user, add_post, session):
+    user_id, _ = user
+    post = await add_post(user_id, like_count=7, comment_count=3)
+    session.add(Like(user_id=user_id, post_id=post.id))
+    await session.commit()
+
+    await reconcile(engine)
+
+    assert await counts(post.id) == (1, 0)
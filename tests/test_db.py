@@ -0,0 +1,42 @@
+import pytest
+from sqlalchemy import text
+
+from app import config
+from app.db import engine, engine_options, make_engine, normalize_database_url
+
+
+@pytest.mark.parametrize("url", ["postgres://u:p@db/app", "postgresql://u:p@db/app"])
+def test_postgres_urls_use_asyncpg(url):
+    assert normalize_database_url(url) == "postgresql+asyncpg://u:p@db/app"
+
+
+def test_other_urls_are_left_alone():
+    assert normalize_database_url("sqlite+aiosqlite:///./app.db") == "sqlite+aiosqlite:///./app.db"
+
+
+def test_pool_options_come_from_the_config(monkeypatch):
+    monkeypatch.setattr(config, "DB_POOL_SIZE", 7)
+    options = engine_options("postgresql+asyncpg://db/app")
+    assert (options["pool_size"], options["pool_pre_ping"], options["pool_recycle"]) == (7, config.DB_POOL_PRE_PING, config.DB_POOL_RECYCLE)
+
+    # Nothing to ping or recycle for a local file
+    options = engine_options("sqlite+aiosqlite:///./app.db")
+    assert (options["pool_pre_ping"], options["pool_recycle"]) == (False, -1)
+
+
+async def test_sqlite_connections_are_tuned():
+    async with engine.connect() as conn:
+        assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+        assert (await conn.execute(text("PRAGMA busy_timeout"))).scalar() == config.SQLITE_BUSY_TIMEOUT_MS
+        # NORMAL
+        assert (await conn.execute(text("PRAGMA synchronous"))).scalar() == 1
+
+
+async def test_make_engine_takes_overrides(tmp_path):
+    other = make_engine(f"sqlite+aiosqlite:///{tmp_path / 'other.db'}", pool_size=2)
+    try:
+        assert other.pool.size() == 2
+        async with other.connect() as conn:
+            assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+    finally:
+        await other.dispose()
@@ -0,0 +1,60 @@
+async def test_likes_are_counted_once_per_user(client, user, sign_up, add_post):
+    author_id, author = user
+    _, reader = await sign_up()
+    post = await add_post(author_id)
+
+    assert (await client.post(f"/posts/{post.id}/like", headers=reader)).json()["like_count"] == 1
+    assert (await client.post(f"/posts/{post.id}/like", headers=reader)).json()["like_count"] == 1
+    assert (await client.post(f"/posts/{post.id}/like", headers=author)).json()["like_count"] == 2
+    response = await client.delete(f"/posts/{post.id}/like", headers=author)
+    assert (response.json()["liked"], response.json()["like_count"]) == (False, 1)
+
+    page = (await client.get(f"/users/{author_id}/posts", headers=reader)).json()
+    assert (page["posts"][0]["like_count"], page["posts"][0]["liked"]) == (1, True)
+
+
+async def test_comments_are_counted_and_deleted_by_their_authors(client, user, sign_up, add_post):
+    author_id, author = user
+    _, reader = await sign_up()
+    _, stranger = await sign_up()
+    post = await add_post(author_id)
+
+    response = await client.post(f"/posts/{post.id}/comments", headers=reader, json={"body": "nice"})
+    assert response.status_code == 201
+    comment_id = response.json()["id"]
+    page = (await client.get(f"/users/{author_id}/posts", headers=reader)).json()
+    assert page["posts"][0]["comment_count"] == 1
+
+    assert (await client.delete(f"/comments/{comment_id}", headers=stranger)).status_code == 403
+    # The post's author may remove comments on it
+    assert (await client.delete(f"/comments/{comment_id}", headers=author)).status_code == 204
+    page = (await client.get(f"/users/{author_id}/posts", headers=reader)).json()
+    assert page["posts"][0]["comment_count"] == 0
+
+
+async def test_feed_etag_changes_with_a_like(client, user, sign_up, add_post):
+    author_id, _ = user
+    _, reader = await sign_up()
+    post = await add_post(author_id)
+    path = f"/users/{author_id}/posts"
+
+    response = await client.get(path, headers=reader)
+    etag = response.headers["ETag"]
+    assert (await client.get(path, headers={**reader, "If-None-Match": etag})).status_code == 304
+
+    await client.post(f"/posts/{post.id}/like", headers=reader)
+    response = await client.get(path, headers={**reader, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["posts"][0]["liked"] is True
+    assert response.headers["ETag"] != etag
+
+
+async def test_feed_etag_is_per_viewer(client, user, sign_up, add_post):
+    author_id, author = user
+    _, reader = await sign_up()
+    await add_post(author_id)
+    path = f"/users/{author_id}/posts"
+
+    etag = (await client.get(path, headers=reader)).headers["ETag"]
+    # is_owner differs, so the author's page is another body
+    assert (await client.get(path, headers={**author, "If-None-Match": etag})).status_code == 200
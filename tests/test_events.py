@@ -0,0 +1,84 @@
+import uuid
+
+import orjson
+import pytest
+
+from app import events
+from app.events import CLOSED, RESYNC, MemoryBroker, Subscription, event_stream, format_event, get_broker
+
+
+def parse(chunk: bytes) -> tuple[str, dict]:
+    event, data = chunk.decode().strip().split("\n")
+    return event.removeprefix("event: "), orjson.loads(data.removeprefix("data: "))
+
+
+async def test_slow_subscribers_get_a_resync_instead_of_a_backlog():
+    subscription = Subscription(size=2)
+    for i in range(3):
+        subscription.put({"type": "post_deleted", "id": i})
+
+    assert await subscription.get(0.1) is RESYNC
+    assert await subscription.get(0.01) is None
+
+
+def test_created_posts_are_formatted_per_viewer():
+    author_id = uuid.uuid4()
+    event = {"type": "post_created", "post": {"id": uuid.uuid4(), "user_id": author_id, "caption": "hi"}}
+
+    name, data = parse(format_event(event, author_id))
+    assert name == "post_created"
+    assert (data["caption"], data["liked"], data["is_owner"]) == ("hi", False, True)
+    assert parse(format_event(event, uuid.uuid4()))[1]["is_owner"] is False
+    assert parse(format_event({"type": "post_deleted", "id": "abc"}, author_id)) == ("post_deleted", {"id": "abc"})
+
+
+async def test_streams_deliver_events_with_heartbeats_until_closed(monkeypatch):
+    monkeypatch.setattr(events, "EVENTS_HEARTBEAT", 0.01)
+    broker = MemoryBroker()
+    stream = event_stream(broker, uuid.uuid4())
+
+    assert (await anext(stream)).startswith(b"retry: ")
+    assert await anext(stream) == b": ping\n\n"
+    await broker.publish({"type": "post_deleted", "id": "abc"})
+    assert parse(await anext(stream)) == ("post_deleted", {"id": "abc"})
+
+    broker.close()
+    with pytest.raises(StopAsyncIteration):
+        await anext(stream)
+    assert not broker._subscriptions
+
+
+async def test_closing_drops_what_was_queued():
+    subscription = Subscription()
+    subscription.put({"type": "post_deleted", "id": 1})
+    subscription.close()
+
+    assert await subscription.get(0.1) is CLOSED
+
+
+async def test_deleting_a_post_is_published(client, user, add_post):
+    user_id, headers = user
+    post = await add_post(user_id)
+    subscription = await get_broker().subscribe()
+    try:
+        response = await client.delete(f"/posts/{post.id}", headers=headers)
+        assert response.status_code == 200, response.text
+
+        event = await subscription.get(1)
+    finally:
+        get_broker().unsubscribe(subscription)
+    assert event == {"type": "post_deleted", "id": post.id}
+
+
+async def test_ready_posts_are_published_as_the_feed_shows_them(session, user, add_post):
+    user_id, _ = user
+    post = await add_post(user_id, author_email="author@example.com")
+    subscription = await get_broker().subscribe()
+    try:
+        await events.publish_created(session, [post.id])
+        event = await subscription.get(1)
+    finally:
+        get_broker().unsubscribe(subscription)
+
+    assert event["type"] == "post_created"
+    assert (event["post"]["id"], event["post"]["email"]) == (post.id, "author@example.com")
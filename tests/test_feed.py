@@ -0,0 +1,71 @@
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+import orjson
+from sqlalchemy import event
+
+from app.db import engine
+from app.feed import fetch_feed_page, serialize_feed_row
+from app.responses import OrjsonResponse
+from app.schemas import FeedPage, PostRead
+
+
+async def test_a_feed_page_is_one_query_without_the_user_table(session, user, add_post):
+    user_id, _ = user
+    await add_post(user_id)
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        rows, _ = await fetch_feed_page(session, None, 5)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+    assert rows
+    assert len(statements) == 1
+    assert '"user"' not in statements[0] and "SELECT posts.id" in statements[0]
+
+
+async def test_posts_show_their_authors_email(client, user, sign_up, add_post):
+    author_id, _ = user
+    _, reader = await sign_up()
+    await add_post(author_id, author_email="author@example.com")
+
+    page = (await client.get(f"/users/{author_id}/posts", headers=reader)).json()
+    assert [post["email"] for post in page["posts"]] == ["author@example.com"]
+
+
+def test_feed_rows_serialize_without_an_encoder_pass():
+    row = SimpleNamespace(
+        id=uuid.uuid4(), user_id=uuid.uuid4(), caption="hi", url="http://test/a.jpg",
+        created_at=datetime(2026, 1, 2, 3, 4, 5), file_type="image", file_name="a.jpg", thumbnail_url=None,
+        width=800, height=600, duration=None, renditions=[{"width": 400, "url": "http://test/a_400.jpg", "key": "k"}],
+        email="author@example.com", like_count=2, comment_count=1,
+    )
+    data = serialize_feed_row(row)
+
+    assert data["id"] is row.id and data["created_at"] == "2026-01-02T03:04:05"
+    assert data["srcset"] == [{"width": 400, "url": "http://test/a_400.jpg"}]
+    body = OrjsonResponse({"posts": [{**data, "liked": False, "is_owner": True}], "next_cursor": None}).body
+    assert orjson.loads(body)["posts"][0]["id"] == str(row.id)
+    FeedPage.model_validate_json(body)
+
+
+async def test_feed_and_upload_responses_match_their_models(client, user, add_post):
+    user_id, headers = user
+    await add_post(user_id)
+
+    response = await client.get("/feed", headers=headers, params={"limit": 5})
+    assert response.headers["content-type"] == "application/json"
+    assert FeedPage.model_validate_json(response.content).posts
+
+    response = await client.post(
+        "/upload", headers=headers, files={"file": ("a.jpg", uuid.uuid4().bytes, "image/jpeg")}, data={"caption": "new"}
+    )
+    assert response.status_code == 202, response.text
+    post = PostRead.model_validate_json(response.content)
+    assert (post.user_id, post.caption, post.status) == (user_id, "new", "pending")
@@ -0,0 +1,59 @@
+from app.feed_cache import FeedCache, MemoryFeedCacheBackend
+
+
+class Loader:
+    """A feed page load, counting the queries it would make"""
+
+    def __init__(self, next_cursor):
+        self.next_cursor = next_cursor
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return [{"id": self.calls}], self.next_cursor
+
+
+async def test_the_top_pages_are_cached_until_invalidated():
+    cache = FeedCache(MemoryFeedCacheBackend(), pages=2)
+    version = await cache.version()
+    first, second, third = Loader("c1"), Loader("c2"), Loader("c3")
+
+    for _ in range(2):
+        assert await cache.page(version, None, 10, first) == ([{"id": 1}], "c1")
+        await cache.page(version, "c1", 10, second)
+        await cache.page(version, "c2", 10, third)
+    # Only the first `pages` pages are kept
+    assert (first.calls, second.calls, third.calls) == (1, 1, 2)
+
+    await cache.invalidate()
+    version = await cache.version()
+    assert await cache.page(version, None, 10, first) == ([{"id": 2}], "c1")
+
+
+async def test_pages_of_unknown_cursors_are_not_cached():
+    cache = FeedCache(MemoryFeedCacheBackend())
+    version = await cache.version()
+    load = Loader(None)
+
+    await cache.page(version, "made-up", 10, load)
+    await cache.page(version, "made-up", 10, load)
+    assert load.calls == 2
+
+
+async def test_feed_pages_come_from_the_cache_until_a_write(client, user, add_post):
+    author_id, headers = user
+    path = f"/users/{author_id}/posts"
+    first = await add_post(author_id)
+    response = await client.get(path, headers=headers)
+    etag = response.headers["ETag"]
+    assert (await client.get(path, headers={**headers, "If-None-Match": etag})).status_code == 304
+
+    # Inserted behind the app's back: nothing invalidates the cached page
+    second = await add_post(author_id)
+    assert [post["id"] for post in (await client.get(path, headers=headers)).json()["posts"]] == [str(first.id)]
+
+    await client.delete(f"/posts/{first.id}", headers=headers)
+    response = await client.get(path, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert [post["id"] for post in response.json()["posts"]] == [str(second.id)]
@@ -0,0 +1,211 @@
+"""
+The Streamlit client's upload path. Needs streamlit and requests, which
+only the frontend uses; importing the module renders its page in bare mode.
+"""
+import io
+
+import pytest
+
+pytest.importorskip("streamlit")
+requests = pytest.importorskip("requests")
+
+CHUNK = 4
+
+
+class Response:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(self.status_code)
+
+
+class FakeApi:
+    """The resumable /uploads API of app.resumable, dropping the first chunk PUT it gets"""
+
+    def __init__(self, size):
+        self.status = {"id": "u1", "size": size, "chunk_size": CHUNK, "received": 0, "next_chunk": 0,
+                       "chunks": -(-size // CHUNK)}
+        self.data = b""
+        self.calls = []
+        self.dropped = False
+
+    def __call__(self, method, url, **kwargs):
+        path = url.removeprefix("http://api")
+        self.calls.append((method, path))
+        if (method, path) == ("POST", "/uploads"):
+            return Response(201, dict(self.status))
+        if method == "PUT":
+            if not self.dropped:
+                self.dropped = True
+                raise requests.ConnectionError("connection reset")
+            self.data += kwargs["data"]
+            received = len(self.data)
+            self.status.update(received=received, next_chunk=-(-received // CHUNK))
+            return Response(200, dict(self.status))
+        if (method, path) == ("GET", "/uploads/u1"):
+            return Response(200, dict(self.status))
+        if (method, path) == ("POST", "/uploads/u1/complete"):
+            return Response(202, {"status": "pending"})
+        return Response(404)
+
+
+class Progress:
+    def __init__(self):
+        self.values = []
+
+    def progress(self, value):
+        self.values.append(value)
+
+
+@pytest.fixture
+def frontend(monkeypatch):
+    import frontend
+
+    monkeypatch.setattr(frontend.time, "sleep", lambda seconds: None)
+    return frontend
+
+
+@pytest.fixture
+def client(frontend, monkeypatch):
+    client = frontend.ApiClient("http://api")
+    monkeypatch.setattr(frontend, "api", lambda: client)
+    return client
+
+
+def upload_file(data):
+    file = io.BytesIO(data)
+    file.name, file.type, file.size = "clip.mp4", "video/mp4", len(data)
+    return file
+
+
+def test_api_client_puts(client, monkeypatch):
+    calls = []
+    monkeypatch.setattr(client.session, "request", lambda method, url, **kwargs: calls.append((method, url)))
+
+    client.put("/uploads/u1/chunks/0", data=b"x")
+    assert calls == [("PUT", "http://api/uploads/u1/chunks/0")]
+
+
+def test_api_calls_share_one_pooled_session(frontend, monkeypatch):
+    client = frontend.ApiClient("http://api", pool_size=7, timeout=3)
+    adapter = client.session.get_adapter("http://api/feed")
+    assert adapter is client.session.get_adapter("https://api/feed")
+    assert adapter._pool_maxsize == 7
+    # One client for every rerun and browser session
+    assert frontend.api() is frontend.api()
+
+    timeouts = []
+    monkeypatch.setattr(client.session, "request", lambda method, url, **kwargs: timeouts.append(kwargs["timeout"]))
+    client.get("/feed")
+    client.post("/auth/jwt/login", timeout=10)
+    assert timeouts == [3, 10]
+
+
+def test_upload_resumes_after_a_dropped_chunk(frontend, client, monkeypatch):
+    data = b"0123456789"
+    server = FakeApi(len(data))
+    monkeypatch.setattr(client.session, "request", server)
+    progress = Progress()
+
+    response = frontend.upload_resumable(upload_file(data), "caption", progress)
+
+    assert response.status_code == 202
+    assert server.data == data
+    assert ("GET", "/uploads/u1") in server.calls
+    assert progress.values[-1] == 1
+
+
+def test_upload_returns_none_when_the_api_is_unreachable(frontend, client, monkeypatch):
+    def unreachable(method, url, **kwargs):
+        raise requests.ConnectionError("connection refused")
+
+    monkeypatch.setattr(client.session, "request", unreachable)
+    assert frontend.upload_resumable(upload_file(b"data"), "caption", Progress()) is None
+
+
+def test_feed_pages_are_not_shared_between_viewers(frontend, client, monkeypatch):
+    def feed(method, url, headers=None, **kwargs):
+        viewer = headers["Authorization"].removeprefix("Bearer ")
+        post = {"id": "p1", "user_id": "author", "liked": viewer == "liker"}
+        return Response(200, {"posts": [post], "next_cursor": None})
+
+    monkeypatch.setattr(client.session, "request", feed)
+    frontend.fetch_feed_page.clear()
+
+    for viewer in ("liker", "other"):
+        frontend.st.session_state.update(token=viewer, user={"id": viewer}, feed_posts=None)
+        assert frontend.load_feed_page()
+        assert frontend.st.session_state.feed_posts[0]["liked"] is (viewer == "liker")
+
+
+def test_refresh_keeps_the_loaded_feed_while_it_is_unchanged(frontend, client, monkeypatch):
+    sent = []
+
+    def feed(method, url, headers=None, **kwargs):
+        sent.append(headers.get("If-None-Match"))
+        if headers.get("If-None-Match") == '"v1"':
+            return Response(304)
+        return Response(200, {"posts": [{"id": "p1", "user_id": "viewer"}], "next_cursor": "c1"}, {"ETag": '"v1"'})
+
+    monkeypatch.setattr(client.session, "request", feed)
+    frontend.st.session_state.update(token="viewer", user={"id": "viewer"})
+    frontend.reset_feed()
+
+    assert frontend.refresh_feed()
+    loaded = frontend.st.session_state.feed_posts
+    assert frontend.refresh_feed()
+
+    assert sent == [None, '"v1"']
+    assert frontend.st.session_state.feed_posts is loaded
+    assert (frontend.st.session_state.feed_cursor, loaded[0]["is_owner"]) == ("c1", True)
+
+
+class EventStream:
+    """/events: one post, then heartbeats for as long as it is read"""
+
+    def __init__(self):
+        self.closed = False
+
+    def __enter__(self):
+        self.status_code = 200
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+
+    def iter_lines(self, decode_unicode=False):
+        yield from ("event: post_created", 'data: {"id": "p1"}', "")
+        while True:
+            yield ": ping"
+
+
+def test_feed_events_are_kept_for_the_next_rerun(frontend, client, monkeypatch):
+    stream = EventStream()
+    monkeypatch.setattr(client, "stream", lambda path, headers, timeout: stream)
+
+    events = frontend.FeedEvents({})
+    while not events.pending:
+        events.touch()
+    events.stop()
+    events.thread.join(timeout=5)
+
+    assert list(events.drain()) == [("post_created", {"id": "p1"})]
+    assert (events.alive, stream.closed) == (False, True)
+
+
+def test_feed_events_stop_when_the_session_is_gone(frontend, client, monkeypatch):
+    stream = EventStream()
+    monkeypatch.setattr(client, "stream", lambda path, headers, timeout: stream)
+
+    # Never touched by a rerun
+    events = frontend.FeedEvents({}, idle=0)
+    events.thread.join(timeout=5)
+
+    assert (events.alive, stream.closed) == (False, True)
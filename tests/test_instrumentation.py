@@ -0,0 +1,95 @@
+import logging
+import threading
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+from app import instrumentation
+from app.instrumentation import Histogram, TimingMiddleware, metrics_router, span
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_seconds", "Test", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, "/feed")
+
+    assert histogram.render() == [
+        "# HELP test_seconds Test",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{route="/feed",le="0.1"} 1',
+        'test_seconds_bucket{route="/feed",le="1.0"} 2',
+        'test_seconds_bucket{route="/feed",le="+Inf"} 3',
+        'test_seconds_sum{route="/feed"} 5.55',
+        'test_seconds_count{route="/feed"} 3',
+    ]
+
+
+def timed_app(**middleware) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(TimingMiddleware, **middleware)
+    app.include_router(metrics_router)
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        with span("test.lookup"):
+            return {"id": item_id}
+
+    @app.get("/stream")
+    async def stream():
+        async def events():
+            yield b"event: ping\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+async def get(app, path):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.get(path)
+
+
+async def test_requests_are_recorded_by_route_template():
+    app = timed_app()
+    await get(app, "/items/41")
+    await get(app, "/items/42")
+
+    metrics = (await get(app, "/metrics")).text
+    assert 'http_request_duration_seconds_count{method="GET",route="/items/{item_id}",status="200"}' in metrics
+    assert 'app_span_duration_seconds_count{span="test.lookup"}' in metrics
+
+
+async def test_slow_requests_are_logged_except_event_streams(monkeypatch, caplog):
+    monkeypatch.setattr(instrumentation, "SLOW_REQUEST_MS", 0)
+    app = timed_app()
+
+    with caplog.at_level(logging.WARNING, logger="app"):
+        await get(app, "/items/1")
+        await get(app, "/stream")
+
+    slow = [record.getMessage() for record in caplog.records if record.getMessage().startswith("slow request")]
+    assert len(slow) == 1 and "/items/{item_id}" in slow[0]
+
+
+class FakeProfiler:
+    def __init__(self):
+        self.rendered_on = None
+
+    def stop(self):
+        pass
+
+    def output_html(self):
+        self.rendered_on = threading.get_ident()
+        return "<html></html>"
+
+
+async def test_profiles_are_written_off_the_event_loop(tmp_path):
+    middleware = TimingMiddleware(None, profile_dir=str(tmp_path / "profiles"))
+    profiler = FakeProfiler()
+
+    await middleware._save_profile(profiler, "GET", "/items/{item_id}")
+
+    assert profiler.rendered_on != threading.get_ident()
+    [profile] = (tmp_path / "profiles").iterdir()
+    assert "-GET-items_item_id-" in profile.name
+    assert profile.read_text() == "<html></html>"
@@ -0,0 +1,100 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import delete, select, update
+
+from app.config import JOB_LOCK_TIMEOUT
+from app.db import Job, async_session_maker, utcnow
+from app.jobs import claim, enqueue, finish, retry_or_fail
+
+
+@pytest.fixture(autouse=True)
+async def empty_queue():
+    """Whatever other tests left queued would be claimed first"""
+    async with async_session_maker() as session:
+        await session.execute(delete(Job))
+        await session.commit()
+
+
+async def add_job(**fields) -> Job:
+    async with async_session_maker() as session:
+        job = enqueue(session, "test", {"n": 1}, **fields)
+        await session.commit()
+        return job
+
+
+async def set_job(job_id, **values) -> None:
+    async with async_session_maker() as session:
+        await session.execute(update(Job).where(Job.id == job_id).values(**values))
+        await session.commit()
+
+
+async def get_job(job_id) -> Job | None:
+    async with async_session_maker() as session:
+        return await session.scalar(select(Job).where(Job.id == job_id))
+
+
+# Each worker step in its own session, as in app.worker
+async def claim_as(worker_id: str) -> Job | None:
+    async with async_session_maker() as session:
+        return await claim(session, worker_id)
+
+
+async def test_claim_takes_the_oldest_due_job_once():
+    first = await add_job()
+    second = await add_job()
+
+    claimed = await claim_as("worker-1")
+    assert claimed.id == first.id
+    assert (claimed.status, claimed.locked_by, claimed.attempts) == ("running", "worker-1", 1)
+
+    assert (await claim_as("worker-2")).id == second.id
+    assert await claim_as("worker-3") is None
+
+
+async def test_jobs_are_not_claimed_before_run_at():
+    job = await add_job()
+    await set_job(job.id, run_at=utcnow() + timedelta(minutes=1))
+
+    assert await claim_as("worker-1") is None
+
+
+async def test_jobs_of_a_dead_worker_are_claimed_again():
+    await add_job()
+    job = await claim_as("worker-1")
+    assert await claim_as("worker-2") is None
+
+    await set_job(job.id, locked_at=utcnow() - timedelta(seconds=JOB_LOCK_TIMEOUT + 1))
+
+    reclaimed = await claim_as("worker-2")
+    assert (reclaimed.id, reclaimed.locked_by, reclaimed.attempts) == (job.id, "worker-2", 2)
+
+
+async def test_failed_attempts_are_retried_with_backoff_then_fail():
+    await add_job(max_attempts=2)
+
+    job = await claim_as("worker-1")
+    async with async_session_maker() as session:
+        assert await retry_or_fail(session, job, "boom") is False
+    requeued = await get_job(job.id)
+    assert (requeued.status, requeued.locked_by, requeued.last_error) == ("queued", None, "boom")
+    assert requeued.run_at > utcnow()
+    assert await claim_as("worker-1") is None
+
+    await set_job(job.id, run_at=utcnow())
+    job = await claim_as("worker-1")
+    assert job.attempts == 2
+    async with async_session_maker() as session:
+        assert await retry_or_fail(session, job, "boom again") is True
+    failed = await get_job(job.id)
+    assert (failed.status, failed.last_error) == ("failed", "boom again")
+    assert await claim_as("worker-1") is None
+
+
+async def test_finished_jobs_are_deleted():
+    await add_job()
+    job = await claim_as("worker-1")
+    async with async_session_maker() as session:
+        await finish(session, job)
+
+    assert await get_job(job.id) is None
@@ -0,0 +1,134 @@
+import io
+import shutil
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from alembic import command
+from fastapi_users_db_sqlalchemy import SQLAlchemyBaseUserTableUUID
+from sqlalchemy import Column, DateTime, ForeignKey, String, Text, create_engine, inspect, text
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import DeclarativeBase
+
+from app.db import utcnow
+from app.migrate import alembic_config, head_revision
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+class Baseline(DeclarativeBase):
+    pass
+
+
+class BaselineUser(SQLAlchemyBaseUserTableUUID, Baseline):
+    pass
+
+
+class BaselinePost(Baseline):
+    """posts as app.db declared it before there were migrations"""
+    __tablename__ = "posts"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("user.id"), nullable=False)
+    caption = Column(Text)
+    url = Column(String, nullable=False)
+    file_type = Column(String, nullable=False)
+    file_name = Column(String, nullable=False)
+    created_at = Column(DateTime, default=utcnow)
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = tmp_path / "baseline.db"
+
+    def migrate(*commands):
+        config = alembic_config()
+        config.set_main_option("sqlalchemy.url", f"sqlite+aiosqlite:///{path}")
+        config.attributes["configure_logger"] = False
+        for name, revision in commands:
+            getattr(command, name)(config, revision)
+
+    return path, create_engine(f"sqlite:///{path}"), migrate
+
+
+def test_a_baseline_database_is_stamped_and_upgraded(database):
+    path, engine, migrate = database
+    Baseline.metadata.create_all(engine)
+    user_id, post_id = uuid.uuid4(), uuid.uuid4()
+    with engine.begin() as conn:
+        conn.execute(BaselineUser.__table__.insert().values(
+            id=user_id, email="old@example.com", hashed_password="x",
+            is_active=True, is_superuser=False, is_verified=False,
+        ))
+        conn.execute(BaselinePost.__table__.insert().values(
+            id=post_id, user_id=user_id, caption="from before", url="http://test/old.jpg",
+            file_type="image", file_name="old.jpg", created_at=datetime(2025, 1, 1),
+        ))
+
+    migrate(("stamp", "0001"), ("upgrade", "head"))
+
+    with engine.connect() as conn:
+        assert conn.scalar(text("SELECT version_num FROM alembic_version")) == head_revision()
+        row = conn.execute(text("SELECT user_id, author_email, status FROM posts")).one()
+    # Converted to user.id's form, so the author is found
+    assert tuple(row) == (str(user_id), "old@example.com", "ready")
+    assert "ix_posts_created_at_id" in {index["name"] for index in inspect(engine).get_indexes("posts")}
+
+
+def test_posts_without_an_author_row_are_kept(database):
+    path, engine, migrate = database
+    Baseline.metadata.create_all(engine)
+    with engine.begin() as conn:
+        # SQLite does not enforce the foreign key, the baseline feed showed these as "Unknown"
+        conn.execute(BaselinePost.__table__.insert().values(
+            id=uuid.uuid4(), user_id=uuid.uuid4(), caption="orphan", url="http://test/orphan.jpg",
+            file_type="image", file_name="orphan.jpg", created_at=datetime(2025, 1, 1),
+        ))
+
+    migrate(("stamp", "0001"), ("upgrade", "head"))
+
+    with engine.connect() as conn:
+        assert conn.scalar(text("SELECT author_email FROM posts")) == "Unknown"
+
+
+def test_the_shipped_database_is_stamped_and_upgraded(database):
+    path, engine, migrate = database
+    shutil.copy(ROOT / "test.db", path)
+    # What starting the baseline app did to it
+    Baseline.metadata.create_all(engine)
+
+    migrate(("stamp", "0001"), ("upgrade", "head"))
+
+    with engine.connect() as conn:
+        assert conn.scalar(text("SELECT version_num FROM alembic_version")) == head_revision()
+    assert "user_id" in {column["name"] for column in inspect(engine).get_columns("posts")}
+
+
+def test_every_revision_downgrades(database):
+    _, engine, migrate = database
+
+    migrate(("upgrade", "head"), ("downgrade", "base"), ("upgrade", "head"))
+
+    with engine.connect() as conn:
+        assert conn.scalar(text("SELECT version_num FROM alembic_version")) == head_revision()
+
+
+def test_postgres_indexes_existing_tables_concurrently():
+    """Rendered offline, no Postgres needed"""
+    output = io.StringIO()
+    config = alembic_config()
+    config.set_main_option("sqlalchemy.url", "postgresql+asyncpg://localhost/app")
+    config.attributes["configure_logger"] = False
+    config.output_buffer = output
+
+    command.upgrade(config, "0004:0008", sql=True)
+
+    sql = output.getvalue()
+    # Tables made in the same revision are empty, their indexes can be plain
+    statements = [line for line in sql.splitlines() if "INDEX" in line and "ON posts" in line]
+    assert len(statements) == 5 and all("CONCURRENTLY" in statement for statement in statements)
+    # The partial feed index is in place before the full one goes
+    created = sql.index("CREATE INDEX CONCURRENTLY ix_posts_created_at_id_new")
+    assert created < sql.index("DROP INDEX CONCURRENTLY ix_posts_created_at_id;")
+    assert "ALTER INDEX ix_posts_created_at_id_new RENAME TO ix_posts_created_at_id" in sql
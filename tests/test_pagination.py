@@ -0,0 +1,69 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.db import utcnow
+from app.pagination import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    created_at, post_id = datetime(2026, 1, 2, 3, 4, 5, 678901), uuid.uuid4()
+    assert decode_cursor(encode_cursor(created_at, post_id)) == (created_at, post_id)
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", "bm90fGE", encode_cursor(datetime(2026, 1, 1), uuid.uuid4())[:-4]])
+def test_invalid_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as excinfo:
+        decode_cursor(cursor)
+    assert excinfo.value.status_code == 400
+
+
+async def walk(client, headers, path, limit):
+    posts, cursor = [], None
+    while True:
+        params = {"limit": limit, **({"before": cursor} if cursor else {})}
+        response = await client.get(path, params=params, headers=headers)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        assert len(page["posts"]) <= limit
+        posts += page["posts"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return posts
+
+
+async def test_pages_cover_every_post_once_in_order(client, user, add_post):
+    user_id, headers = user
+    now = utcnow()
+    # Several posts share a created_at, the id breaks the tie
+    created = [now - timedelta(seconds=i // 3) for i in range(7)]
+    ids = [(await add_post(user_id, created_at=created_at)).id for created_at in created]
+
+    posts = await walk(client, headers, f"/users/{user_id}/posts", limit=2)
+
+    expected = [str(post_id) for _, post_id in sorted(zip(created, ids), reverse=True)]
+    assert [post["id"] for post in posts] == expected
+
+
+async def test_posts_added_while_paging_do_not_shift_pages(client, user, add_post):
+    user_id, headers = user
+    now = utcnow()
+    for i in range(4):
+        await add_post(user_id, created_at=now - timedelta(minutes=i))
+
+    first = (await client.get(f"/users/{user_id}/posts", params={"limit": 2}, headers=headers)).json()
+    await add_post(user_id, created_at=now + timedelta(minutes=1))
+    second = (await client.get(
+        f"/users/{user_id}/posts", params={"limit": 2, "before": first["next_cursor"]}, headers=headers
+    )).json()
+
+    seen = [post["id"] for post in first["posts"] + second["posts"]]
+    assert len(set(seen)) == 4
+
+
+async def test_feed_rejects_a_bad_cursor(client, user):
+    _, headers = user
+    response = await client.get("/feed", params={"before": "garbage"}, headers=headers)
+    assert response.status_code == 400
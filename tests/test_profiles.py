@@ -0,0 +1,64 @@
+import uuid
+
+from sqlalchemy import select
+
+from app.db import Comment, Post, engine
+from app.feed import feed_query
+
+
+async def profile(client, headers, path) -> list[dict]:
+    response = await client.get(path, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["posts"]
+
+
+async def test_profiles_show_only_the_authors_posts(client, sign_up, add_post):
+    author_id, author = await sign_up()
+    other_id, reader = await sign_up()
+    own = [await add_post(author_id) for _ in range(2)]
+    await add_post(other_id)
+
+    posts = await profile(client, reader, f"/users/{author_id}/posts")
+    assert {post["id"] for post in posts} == {str(post.id) for post in own}
+    assert not any(post["is_owner"] for post in posts)
+
+    posts = await profile(client, author, "/me/posts")
+    assert {post["id"] for post in posts} == {str(post.id) for post in own}
+    assert all(post["is_owner"] for post in posts)
+
+
+async def test_unknown_users_are_a_404(client, user):
+    _, headers = user
+    response = await client.get(f"/users/{uuid.uuid4()}/posts", headers=headers)
+    assert response.status_code == 404
+
+    # Known but without posts is an empty page
+    user_id, _ = user
+    assert await profile(client, headers, f"/users/{user_id}/posts") == []
+
+
+async def test_profile_pages_walk_the_author_index():
+    statement = feed_query(None, 20, uuid.uuid4()).compile(engine.sync_engine)
+    params = tuple(uuid.uuid4().hex if isinstance(value, uuid.UUID) else value for value in statement.params.values())
+
+    async with engine.connect() as conn:
+        plan = (await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", params)).all()
+
+    details = " ".join(row[-1] for row in plan)
+    assert "ix_posts_user_id_created_at_id" in details
+    assert "TEMP B-TREE" not in details
+
+
+async def test_email_changes_reach_the_authors_posts(client, session, sign_up, add_post):
+    author_id, author = await sign_up()
+    post = await add_post(author_id)
+    session.add(Comment(user_id=author_id, post_id=post.id, author_email="old@example.com", body="hi"))
+    await session.commit()
+
+    email = f"{uuid.uuid4().hex}@example.com"
+    response = await client.patch("/auth/me", headers=author, json={"email": email})
+    assert response.status_code == 200, response.text
+
+    assert [p["email"] for p in await profile(client, author, "/me/posts")] == [email]
+    assert await session.scalar(select(Post.author_email).where(Post.id == post.id)) == email
+    assert await session.scalar(select(Comment.author_email).where(Comment.post_id == post.id)) == email
@@ -0,0 +1,85 @@
+import uuid
+from datetime import timedelta
+
+from sqlalchemy import select, text
+
+from app.db import Comment, Job, Like, MediaAsset, Post, TimelineEntry, utcnow
+from app.purge import purge_batch, purge_deleted
+from app.timeline import fan_out
+from tests.test_assets import add_asset
+from tests.test_timeline import run_timeline_jobs
+
+
+async def page_ids(client, headers, path, **params) -> list[str]:
+    response = await client.get(path, headers=headers, params=params)
+    assert response.status_code == 200, response.text
+    return [post["id"] for post in response.json()["posts"]]
+
+
+async def test_deleted_posts_leave_every_feed(client, session, sign_up, add_post):
+    author_id, author = await sign_up()
+    _, reader = await sign_up()
+    await client.post(f"/users/{author_id}/follow", headers=reader)
+    word = uuid.uuid4().hex
+    post = await add_post(author_id, caption=f"soon gone {word}")
+    fan_out(session, post)
+    await session.commit()
+    await run_timeline_jobs()
+    post_id = str(post.id)
+    views = [
+        (reader, "/feed", {}),
+        (reader, f"/users/{author_id}/posts", {}),
+        (author, "/me/posts", {}),
+        (reader, "/home", {}),
+        (reader, "/search", {"q": word}),
+    ]
+    for headers, path, params in views:
+        assert post_id in await page_ids(client, headers, path, **params), path
+
+    response = await client.delete(f"/posts/{post_id}", headers=author)
+    assert response.status_code == 200, response.text
+
+    for headers, path, params in views:
+        assert post_id not in await page_ids(client, headers, path, **params), path
+    response = await client.get("/posts", headers=reader, params={"ids": [post_id]})
+    assert response.json()["missing"] == [post_id]
+    # Gone for the owner too, a second delete finds nothing
+    assert (await client.delete(f"/posts/{post_id}", headers=author)).status_code == 404
+
+
+async def test_feed_indexes_leave_deleted_posts_out(session):
+    result = await session.execute(text("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'posts'"))
+    indexes = dict(result.all())
+
+    assert indexes["ix_posts_created_at_id"].endswith("WHERE deleted_at IS NULL")
+    assert indexes["ix_posts_user_id_created_at_id"].endswith("WHERE deleted_at IS NULL")
+    assert indexes["ix_posts_deleted_at"].endswith("WHERE deleted_at IS NOT NULL")
+
+
+async def test_purge_removes_posts_in_batches_and_releases_their_media(session, user, add_post):
+    user_id, _ = user
+    asset = await add_asset(session, ref_count=2)
+    long_ago = utcnow() - timedelta(hours=1)
+    shared = {"content_hash": asset.content_hash, "storage_key": asset.storage_key, "renditions": asset.renditions}
+    due = [await add_post(user_id, deleted_at=long_ago, **shared) for _ in range(2)]
+    recent = await add_post(user_id, deleted_at=utcnow(), storage_key="recent.jpg")
+    session.add_all([
+        Like(user_id=user_id, post_id=due[0].id),
+        Comment(user_id=user_id, post_id=due[0].id, author_email="author@example.com", body="nice"),
+        TimelineEntry(user_id=user_id, created_at=due[0].created_at, post_id=due[0].id, author_id=user_id),
+    ])
+    await session.commit()
+
+    assert await purge_batch(session, limit=1) == 1
+    assert await purge_deleted(limit=1) >= 1
+
+    remaining = set(await session.scalars(select(Post.id).where(Post.user_id == user_id)))
+    # Still within POST_PURGE_DELAY
+    assert remaining == {recent.id}
+    for model in (Like, Comment, TimelineEntry):
+        assert await session.scalar(select(model.post_id).where(model.post_id == due[0].id)) is None
+    # The last reference went with the second post: the asset's files go to storage deletion
+    assert await session.get(MediaAsset, asset.content_hash, populate_existing=True) is None
+    jobs = await session.scalars(select(Job).where(Job.kind == "delete_media"))
+    deleted_keys = [key for job in jobs for key in job.payload["keys"]]
+    assert asset.storage_key in deleted_keys
@@ -0,0 +1,84 @@
+import pytest
+from fastapi import HTTPException
+
+from app import ratelimit
+from app.ratelimit import ACCOUNT_RATE, MemoryRateLimitStore, Rate, RateLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def store(clock):
+    return MemoryRateLimitStore(timer=clock)
+
+
+def test_parse():
+    assert Rate.parse("30/60") == Rate(30, 60.0)
+    assert Rate.parse("10/300").per_second == pytest.approx(1 / 30)
+
+
+async def test_bucket_allows_a_burst_then_refills(store, clock):
+    rate = Rate(3, 60)
+    assert [await store.take("k", rate) for _ in range(3)] == [0, 0, 0]
+    assert await store.take("k", rate) == pytest.approx(20)
+
+    clock.now += 20
+    assert await store.take("k", rate) == 0
+    assert await store.take("k", rate) > 0
+
+
+async def test_refill_is_capped_at_capacity(store, clock):
+    rate = Rate(2, 10)
+    await store.take("k", rate)
+    clock.now += 3600
+
+    assert [await store.take("k", rate) for _ in range(3)][-1] > 0
+
+
+async def test_buckets_are_per_key(store):
+    rate = Rate(1, 60)
+    assert await store.take("a", rate) == 0
+    assert await store.take("a", rate) > 0
+    assert await store.take("b", rate) == 0
+
+
+async def test_limiter_answers_429_with_retry_after(store):
+    limiter = RateLimiter(store)
+    rate = Rate(1, 90)
+    await limiter.check("k", rate)
+
+    with pytest.raises(HTTPException) as excinfo:
+        await limiter.check("k", rate)
+    assert excinfo.value.status_code == 429
+    assert excinfo.value.headers == {"Retry-After": "90"}
+
+
+async def test_no_backend_never_limits():
+    limiter = RateLimiter(None)
+    for _ in range(100):
+        await limiter.check("k", Rate(1, 60))
+
+
+async def test_login_is_limited_per_account(client, monkeypatch, store):
+    monkeypatch.setattr(ratelimit, "get_rate_limiter", lambda: RateLimiter(store))
+    form = {"username": "Someone@Example.com", "password": "wrong"}
+
+    for _ in range(ACCOUNT_RATE.capacity):
+        assert (await client.post("/auth/jwt/login", data=form)).status_code == 400
+
+    # The same account however it is spelled
+    response = await client.post("/auth/jwt/login", data={**form, "username": " someone@example.com"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
+    assert (await client.post("/auth/jwt/login", data={**form, "username": "other@example.com"})).status_code == 400
@@ -0,0 +1,86 @@
+import io
+import uuid
+
+import pytest
+from sqlalchemy import select
+
+from app.db import Job, Post
+from app.jobs import HANDLERS
+from app.renditions import describe, rendition_key, target_widths
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def image_bytes(width: int, height: int, orientation: int | None = None, color=(200, 30, 30)) -> bytes:
+    image = Image.new("RGB", (width, height), color)
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    out = io.BytesIO()
+    image.save(out, "JPEG", exif=exif)
+    return out.getvalue()
+
+
+def test_widths_never_upscale():
+    assert target_widths(2000, [400, 800, 1600]) == [400, 800, 1600]
+    assert target_widths(1000, [400, 800, 1600]) == [400, 800, 1000]
+    assert target_widths(300, [400, 800, 1600]) == [300]
+
+
+def test_images_get_a_jpeg_per_width(tmp_path):
+    path = tmp_path / "wide.jpg"
+    path.write_bytes(image_bytes(1000, 500))
+
+    metadata, renditions = describe(str(path), "image", [400, 800, 1600], 80)
+
+    assert metadata == {"width": 1000, "height": 500}
+    assert [width for width, _ in renditions] == [400, 800, 1000]
+    with Image.open(io.BytesIO(renditions[0][1])) as smallest:
+        assert (smallest.format, smallest.size) == ("JPEG", (400, 200))
+
+
+def test_rotated_images_are_measured_upright(tmp_path):
+    path = tmp_path / "rotated.jpg"
+    # Stored landscape, displayed portrait
+    path.write_bytes(image_bytes(600, 300, orientation=6))
+
+    metadata, renditions = describe(str(path), "image", [200, 800], 80)
+
+    assert metadata == {"width": 300, "height": 600}
+    with Image.open(io.BytesIO(renditions[0][1])) as smallest:
+        assert smallest.size == (200, 400)
+
+
+def test_unreadable_files_are_published_without_renditions(tmp_path):
+    path = tmp_path / "broken.jpg"
+    path.write_bytes(b"not an image")
+
+    assert describe(str(path), "image", [400], 80) == ({}, [])
+
+
+def test_rendition_keys_name_their_content():
+    assert rendition_key(b"same") == rendition_key(b"same") != rendition_key(b"other")
+    assert rendition_key(b"same").startswith("renditions/")
+
+
+async def test_the_upload_job_publishes_renditions_in_the_srcset(client, session, user):
+    user_id, headers = user
+    color = tuple(uuid.uuid4().bytes[:3])
+    response = await client.post(
+        "/upload", headers=headers, files={"file": ("wide.jpg", image_bytes(1000, 500, color=color), "image/jpeg")},
+    )
+    assert response.status_code == 202, response.text
+    post_id = response.json()["id"]
+
+    job = await session.scalar(select(Job).where(Job.kind == "process_upload", Job.payload["post_id"].as_string() == post_id))
+    await HANDLERS["process_upload"].run(job.payload)
+
+    post = await session.get(Post, uuid.UUID(post_id), populate_existing=True)
+    assert (post.status, post.width, post.height) == ("ready", 1000, 500)
+    assert [r["width"] for r in post.renditions] == [400, 800, 1000]
+    assert all(r["key"].startswith("renditions/") for r in post.renditions)
+    assert post.thumbnail_url == post.renditions[0]["url"]
+
+    response = await client.get("/posts", headers=headers, params={"ids": [post_id]})
+    [published] = response.json()["posts"]
+    assert [r["width"] for r in published["srcset"]] == [400, 800, 1000]
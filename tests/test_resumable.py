@@ -0,0 +1,100 @@
+import os
+import uuid
+from pathlib import Path
+
+import pytest
+from sqlalchemy import select
+
+from app.config import UPLOAD_CHUNK_BYTES
+from app.db import UploadSession
+
+SIZE = 2 * UPLOAD_CHUNK_BYTES + 452
+
+
+@pytest.fixture
+def data():
+    return os.urandom(SIZE)
+
+
+@pytest.fixture
+async def upload(client, user):
+    _, headers = user
+    response = await client.post("/uploads", headers=headers, json={
+        "filename": "clip.mp4", "content_type": "video/mp4", "size": SIZE, "caption": "resumed",
+    })
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def chunk(data, index):
+    return data[index * UPLOAD_CHUNK_BYTES:(index + 1) * UPLOAD_CHUNK_BYTES]
+
+
+async def put(client, headers, upload, index, body):
+    return await client.put(
+        f"/uploads/{upload['id']}/chunks/{index}", content=body,
+        headers={**headers, "Content-Type": "application/octet-stream"},
+    )
+
+
+async def staged_path(session, upload) -> Path:
+    return Path(await session.scalar(select(UploadSession.path).where(UploadSession.id == uuid.UUID(upload["id"]))))
+
+
+async def test_chunks_are_acknowledged_in_order(client, user, upload, data, session):
+    _, headers = user
+    assert (upload["received"], upload["next_chunk"], upload["chunks"]) == (0, 0, 3)
+
+    assert (await put(client, headers, upload, 1, chunk(data, 1))).status_code == 409
+    status = (await put(client, headers, upload, 0, chunk(data, 0))).json()
+    assert (status["received"], status["next_chunk"]) == (UPLOAD_CHUNK_BYTES, 1)
+
+    # A client that lost the connection asks where to carry on
+    status = (await client.get(f"/uploads/{upload['id']}", headers=headers)).json()
+    assert status["next_chunk"] == 1
+    for index in (1, 2):
+        status = (await put(client, headers, upload, index, chunk(data, index))).json()
+    assert (status["received"], status["next_chunk"]) == (SIZE, 3)
+
+    assert (await staged_path(session, upload)).read_bytes() == data
+    response = await client.post(f"/uploads/{upload['id']}/complete", headers=headers)
+    assert response.status_code == 202, response.text
+    assert (response.json()["caption"], response.json()["status"]) == ("resumed", "pending")
+    # Completes once
+    assert (await client.post(f"/uploads/{upload['id']}/complete", headers=headers)).status_code == 404
+
+
+async def test_resent_chunk_is_acknowledged_without_rewriting(client, user, upload, data, session):
+    _, headers = user
+    await put(client, headers, upload, 0, chunk(data, 0))
+
+    response = await put(client, headers, upload, 0, os.urandom(UPLOAD_CHUNK_BYTES))
+    assert response.status_code == 200
+    assert response.json()["received"] == UPLOAD_CHUNK_BYTES
+    assert (await staged_path(session, upload)).read_bytes()[:UPLOAD_CHUNK_BYTES] == chunk(data, 0)
+
+
+async def test_bad_chunks_are_refused(client, user, upload, data):
+    _, headers = user
+    assert (await put(client, headers, upload, 0, chunk(data, 0)[:-1])).status_code == 400
+    assert (await put(client, headers, upload, 3, b"x")).status_code == 400
+    assert (await client.get(f"/uploads/{upload['id']}", headers=headers)).json()["received"] == 0
+
+    response = await client.post(f"/uploads/{upload['id']}/complete", headers=headers)
+    assert response.status_code == 409
+
+
+async def test_uploads_belong_to_their_user(client, upload, sign_up, data):
+    _, other = await sign_up()
+    assert (await client.get(f"/uploads/{upload['id']}", headers=other)).status_code == 404
+    assert (await put(client, other, upload, 0, chunk(data, 0))).status_code == 404
+
+
+async def test_abort_removes_the_staged_file(client, user, upload, data, session):
+    _, headers = user
+    await put(client, headers, upload, 0, chunk(data, 0))
+    path = await staged_path(session, upload)
+
+    assert (await client.delete(f"/uploads/{upload['id']}", headers=headers)).status_code == 204
+    assert not path.exists()
+    assert (await client.get(f"/uploads/{upload['id']}", headers=headers)).status_code == 404
@@ -0,0 +1,48 @@
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from app.search import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    score, post_id = -1.2345678901234567, uuid.uuid4()
+    assert decode_cursor(encode_cursor(score, post_id)) == (score, post_id)
+
+
+def test_invalid_cursor_is_a_400():
+    with pytest.raises(HTTPException) as excinfo:
+        decode_cursor("garbage")
+    assert excinfo.value.status_code == 400
+
+
+async def test_pages_cover_every_match_once_best_first(client, user, add_post):
+    user_id, headers = user
+    word = f"w{uuid.uuid4().hex[:12]}"
+    # Equal captions score the same, the id breaks the tie
+    tied = [(await add_post(user_id, caption=f"{word} at the beach")).id for _ in range(4)]
+    best = (await add_post(user_id, caption=f"{word} {word} {word}")).id
+    await add_post(user_id, caption="nothing to see here")
+
+    posts, cursor = [], None
+    while True:
+        params = {"q": word, "limit": 2, **({"before": cursor} if cursor else {})}
+        response = await client.get("/search", params=params, headers=headers)
+        assert response.status_code == 200, response.text
+        posts += response.json()["posts"]
+        cursor = response.json()["next_cursor"]
+        if cursor is None:
+            break
+
+    assert [post["id"] for post in posts] == [str(best)] + sorted(str(post_id) for post_id in tied)
+
+
+async def test_deleted_posts_do_not_match(client, user, add_post):
+    user_id, headers = user
+    word = f"w{uuid.uuid4().hex[:12]}"
+    post = await add_post(user_id, caption=word)
+    assert (await client.delete(f"/posts/{post.id}", headers=headers)).status_code == 200
+
+    response = await client.get("/search", params={"q": word}, headers=headers)
+    assert response.json()["posts"] == []
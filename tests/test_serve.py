@@ -0,0 +1,92 @@
+import argparse
+
+import pytest
+import uvicorn
+
+from app import serve
+from app.events import CLOSED, get_broker
+
+
+def test_several_workers_refuse_a_per_process_feed_cache(monkeypatch):
+    monkeypatch.setattr(serve, "FEED_CACHE_BACKEND", "memory")
+    monkeypatch.setattr(serve, "run", lambda config: pytest.fail("server started"))
+
+    with pytest.raises(SystemExit) as excinfo:
+        serve.main(["--workers", "2"])
+    assert excinfo.value.code == 2
+
+
+@pytest.mark.parametrize("backend, workers", [("memory", 1), ("redis", 4), ("none", 4)])
+def test_workers_start_with_a_usable_feed_cache(monkeypatch, backend, workers):
+    monkeypatch.setattr(serve, "FEED_CACHE_BACKEND", backend)
+    started = []
+    monkeypatch.setattr(serve, "run", started.append)
+
+    serve.main(["--workers", str(workers)])
+    assert [config.workers for config in started] == [workers]
+
+
+def test_server_config_picks_the_fast_implementations_when_installed(monkeypatch):
+    monkeypatch.setattr(serve, "installed", lambda module: module == "uvloop")
+
+    config = serve.server_config(argparse.Namespace(
+        host="127.0.0.1", port=0, workers=1, loop="auto", http="auto",
+        graceful_timeout=5, keepalive=5, log_level="info",
+    ))
+
+    assert (config.loop, config.http) == ("uvloop", "h11")
+    assert config.server_header is False
+    assert config.timeout_graceful_shutdown == 5
+
+
+async def test_draining_ends_open_event_streams_first(monkeypatch):
+    subscription = await get_broker().subscribe()
+    drained = []
+
+    async def shutdown(self, sockets=None):
+        # The streams are already told to end when uvicorn starts waiting on them
+        drained.append(subscription.queue.get_nowait())
+
+    monkeypatch.setattr(uvicorn.Server, "shutdown", shutdown)
+    try:
+        await serve.DrainingServer(uvicorn.Config("app.app:app")).shutdown()
+    finally:
+        get_broker().unsubscribe(subscription)
+    assert drained == [CLOSED]
+
+
+def supervise(monkeypatch, stop_after: int) -> tuple[serve.Supervisor, list]:
+    """A Supervisor whose workers cannot import their app and so exit at once"""
+    monkeypatch.setattr(serve.signal, "signal", lambda *args: None)
+    supervisor = serve.Supervisor(uvicorn.Config("app.no_such_module:app", port=0, workers=1, log_level="critical"))
+    started = []
+    start_worker = supervisor.start_worker
+
+    def record(sockets):
+        started.append(start_worker(sockets))
+        if len(started) == stop_after:
+            supervisor.stopping.set()
+        return started[-1]
+
+    supervisor.start_worker = record
+    return supervisor, started
+
+
+def test_workers_failing_right_after_starting_stop_the_supervisor(monkeypatch):
+    supervisor, started = supervise(monkeypatch, stop_after=0)
+
+    with pytest.raises(SystemExit) as excinfo:
+        supervisor.run()
+
+    assert excinfo.value.code == 1
+    assert len(started) == 1
+
+
+def test_workers_dying_later_are_replaced(monkeypatch):
+    monkeypatch.setattr(serve, "MIN_UPTIME", 0)
+    supervisor, started = supervise(monkeypatch, stop_after=2)
+
+    supervisor.run()
+
+    assert not supervisor.failed
+    assert len(started) == 2
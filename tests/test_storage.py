@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app import storage
+from app.storage import LocalStorage, file_type_for, get_storage
+from app.uploads import ChunkPipe
+
+
+@pytest.fixture
+def local(tmp_path):
+    return LocalStorage(root=str(tmp_path), base_url="http://test/media/")
+
+
+async def test_save_drains_the_stream_into_a_new_key(local, tmp_path):
+    pipe = ChunkPipe(asyncio.get_running_loop())
+    saving = asyncio.create_task(local.save(pipe, "Photo.JPG", "image/jpeg"))
+    for chunk in (b"abc", b"def"):
+        await pipe.feed(chunk)
+    await pipe.finish()
+
+    stored = await saving
+
+    assert stored.key.startswith("uploads/") and stored.key.endswith(".jpg")
+    assert (stored.url, stored.file_type, stored.file_name) == (f"http://test/media/{stored.key}", "image", "Photo.JPG")
+    assert (tmp_path / stored.key).read_bytes() == b"abcdef"
+
+
+async def test_put_is_idempotent_and_delete_many_removes(local, tmp_path):
+    first = await local.put("renditions/abc_400.jpg", b"first", "image/jpeg")
+    # Keys name their content: the second write is a no-op
+    await local.put("renditions/abc_400.jpg", b"second", "image/jpeg")
+    assert (tmp_path / first.key).read_bytes() == b"first"
+
+    await local.delete_many([first.key, "never/stored.jpg"])
+    assert not (tmp_path / first.key).exists()
+
+
+def test_keys_cannot_leave_the_media_root(local):
+    with pytest.raises(HTTPException) as excinfo:
+        local.path_for("../outside.txt")
+    assert excinfo.value.status_code == 404
+
+
+def test_file_types():
+    assert [file_type_for(t) for t in ("image/png", "video/mp4", "application/pdf")] == ["image", "video", "raw"]
+
+
+async def test_local_media_is_served_with_range_support(client):
+    stored = await get_storage().put("test/served.txt", b"0123456789", "text/plain")
+    path = "/media/" + stored.key
+
+    response = await client.get(path)
+    assert (response.status_code, response.content) == (200, b"0123456789")
+    assert "immutable" in response.headers["Cache-Control"]
+
+    response = await client.get(path, headers={"Range": "bytes=2-4"})
+    assert (response.status_code, response.content) == (206, b"234")
+    assert (await client.get("/media/test/missing.txt")).status_code == 404
+
+
+def test_unknown_backends_are_refused(monkeypatch):
+    monkeypatch.setattr(storage, "MEDIA_BACKEND", "ftp")
+    get_storage.cache_clear()
+    try:
+        with pytest.raises(RuntimeError, match="Unknown MEDIA_BACKEND"):
+            get_storage()
+    finally:
+        get_storage.cache_clear()
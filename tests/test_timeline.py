@@ -0,0 +1,106 @@
+from sqlalchemy import delete, select
+
+from app import timeline
+from app.db import Job, TimelineEntry, async_session_maker
+from app.jobs import HANDLERS
+from app.timeline import fan_out
+
+TIMELINE_JOBS = ("fanout_post", "backfill_timeline", "backfill_followers")
+
+
+async def run_timeline_jobs() -> None:
+    """Run what a job worker would, in queue order"""
+    async with async_session_maker() as session:
+        jobs = (await session.scalars(
+            select(Job).where(Job.kind.in_(TIMELINE_JOBS), Job.status == "queued").order_by(Job.run_at)
+        )).all()
+        await session.execute(delete(Job).where(Job.id.in_([job.id for job in jobs])))
+        await session.commit()
+    for job in jobs:
+        await HANDLERS[job.kind].run(job.payload)
+
+
+async def publish(session, add_post, user_id, **fields):
+    """A ready post and its fan-out, as processing publishes them"""
+    post = await add_post(user_id, **fields)
+    fan_out(session, post)
+    await session.commit()
+    await run_timeline_jobs()
+    return post
+
+
+async def home(client, headers) -> list[str]:
+    response = await client.get("/home", headers=headers)
+    assert response.status_code == 200, response.text
+    return [post["id"] for post in response.json()["posts"]]
+
+
+async def test_posts_are_fanned_out_to_followers(client, session, sign_up, add_post):
+    author_id, author = await sign_up()
+    _, reader = await sign_up()
+    await client.post(f"/users/{author_id}/follow", headers=reader)
+    await run_timeline_jobs()
+
+    post = await publish(session, add_post, author_id)
+
+    assert await home(client, reader) == [str(post.id)]
+    assert await home(client, author) == [str(post.id)]
+
+
+async def test_following_backfills_recent_posts(client, session, sign_up, add_post, monkeypatch):
+    monkeypatch.setattr(timeline, "TIMELINE_BACKFILL", 2)
+    author_id, _ = await sign_up()
+    _, reader = await sign_up()
+    posts = [await publish(session, add_post, author_id) for _ in range(3)]
+
+    await client.post(f"/users/{author_id}/follow", headers=reader)
+    await run_timeline_jobs()
+
+    assert await home(client, reader) == [str(post.id) for post in reversed(posts[1:])]
+
+
+async def test_unfollowing_drops_the_authors_posts(client, session, sign_up, add_post):
+    author_id, _ = await sign_up()
+    _, reader = await sign_up()
+    await client.post(f"/users/{author_id}/follow", headers=reader)
+    await publish(session, add_post, author_id)
+
+    response = await client.delete(f"/users/{author_id}/follow", headers=reader)
+
+    assert response.json()["follower_count"] == 0
+    assert await home(client, reader) == []
+
+
+async def test_posts_of_authors_above_the_threshold_are_pulled(client, session, sign_up, add_post, monkeypatch):
+    monkeypatch.setattr(timeline, "FANOUT_MAX_FOLLOWERS", 1)
+    author_id, _ = await sign_up()
+    reader_id, reader = await sign_up()
+    await client.post(f"/users/{author_id}/follow", headers=reader)
+    await run_timeline_jobs()
+
+    post = await publish(session, add_post, author_id)
+
+    # Not copied into the reader's timeline, merged in at read time
+    async with async_session_maker() as other:
+        assert await other.scalar(
+            select(TimelineEntry.post_id).where(TimelineEntry.user_id == reader_id)
+        ) is None
+    assert await home(client, reader) == [str(post.id)]
+
+
+async def test_posts_from_above_the_threshold_stay_after_dropping_below(client, session, sign_up, add_post, monkeypatch):
+    monkeypatch.setattr(timeline, "FANOUT_MAX_FOLLOWERS", 2)
+    author_id, _ = await sign_up()
+    _, reader = await sign_up()
+    _, leaver = await sign_up()
+    for headers in (reader, leaver):
+        await client.post(f"/users/{author_id}/follow", headers=headers)
+    await run_timeline_jobs()
+    pulled = await publish(session, add_post, author_id)
+    assert await home(client, reader) == [str(pulled.id)]
+
+    await client.delete(f"/users/{author_id}/follow", headers=leaver)
+    await run_timeline_jobs()
+
+    pushed = await publish(session, add_post, author_id)
+    assert await home(client, reader) == [str(pushed.id), str(pulled.id)]
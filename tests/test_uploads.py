@@ -0,0 +1,88 @@
+import threading
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+
+from app.uploads import run_in_upload_pool, stream_multipart_upload
+
+
+class Sink:
+    """Reads each file on the upload pool, as the storage backends do"""
+
+    def __init__(self):
+        self.threads = set()
+        self.discarded = []
+
+    async def __call__(self, reader, filename, content_type):
+        return await run_in_upload_pool(self.read, reader, filename)
+
+    def read(self, reader, filename):
+        self.threads.add(threading.get_ident())
+        data = b""
+        while chunk := reader.read(64):
+            data += chunk
+        return filename, data
+
+    def discard(self, *results):
+        self.discarded += results
+
+
+@pytest.fixture
+def sink():
+    return Sink()
+
+
+@pytest.fixture
+def upload(sink):
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        fields, files = await stream_multipart_upload(request, sink, max_bytes=1000, max_files=2, discard=sink.discard)
+        return {
+            "captions": fields.getlist("caption"),
+            "files": [{"name": f.result[0], "data": f.result[1].decode(), "size": f.size} for f in files],
+        }
+
+    async def post(**kwargs):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.post("/upload", **kwargs)
+    return post
+
+
+async def test_files_stream_to_the_sink_off_the_event_loop(upload, sink):
+    response = await upload(
+        files=[("file", ("a.jpg", b"a" * 300, "image/jpeg")), ("file", ("b.jpg", b"b" * 10, "image/jpeg"))],
+        data={"caption": ["first", "second"]},
+    )
+
+    assert response.status_code == 200, response.text
+    assert response.json() == {
+        "captions": ["first", "second"],
+        "files": [{"name": "a.jpg", "data": "a" * 300, "size": 300}, {"name": "b.jpg", "data": "b" * 10, "size": 10}],
+    }
+    assert threading.get_ident() not in sink.threads
+
+
+async def test_the_size_limit_is_enforced_while_streaming(upload, sink):
+    response = await upload(
+        files=[("file", ("small.jpg", b"s" * 10, "image/jpeg")), ("file", ("big.jpg", b"b" * 1001, "image/jpeg"))],
+    )
+
+    assert response.status_code == 413
+    # What the sink had already finished is handed back for cleanup
+    assert sink.discarded == [("small.jpg", b"s" * 10)]
+
+
+async def test_too_many_files_are_refused(upload):
+    response = await upload(files=[("file", (f"{i}.jpg", b"x", "image/jpeg")) for i in range(3)])
+
+    assert response.status_code == 400
+    assert "Too many files" in response.json()["detail"]
+
+
+async def test_only_multipart_bodies_are_accepted(upload):
+    response = await upload(json={"file": "not a file"})
+
+    assert response.status_code == 400
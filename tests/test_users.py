@@ -0,0 +1,85 @@
+import uuid
+
+import pytest
+
+from app import users
+from app.app import app
+from app.passwords import PooledPasswordHelper
+from app.users import MissingSecret, UserManager, user_cache
+
+PASSWORD = "old-password"
+
+
+async def test_password_reset_verifies_on_the_pool(client, monkeypatch):
+    def on_the_event_loop(self, *args):
+        raise AssertionError("password verified on the event loop")
+
+    monkeypatch.setattr(PooledPasswordHelper, "verify_and_update", on_the_event_loop)
+    tokens = []
+
+    async def on_after_forgot_password(self, user, token, request=None):
+        tokens.append(token)
+
+    monkeypatch.setattr(UserManager, "on_after_forgot_password", on_after_forgot_password)
+    email = f"{uuid.uuid4().hex}@example.com"
+    await client.post("/auth/register", json={"email": email, "password": PASSWORD})
+    await client.post("/auth/forgot-password", json={"email": email})
+
+    response = await client.post("/auth/reset-password", json={"token": tokens[0], "password": "new-password"})
+    assert response.status_code == 200, response.text
+    # The fingerprint no longer matches the new hash
+    response = await client.post("/auth/reset-password", json={"token": tokens[0], "password": "other-password"})
+    assert response.json()["detail"] == "RESET_PASSWORD_BAD_TOKEN"
+
+    login = {"username": email, "password": "new-password"}
+    assert (await client.post("/auth/jwt/login", data=login)).status_code == 200
+    assert (await client.post("/auth/jwt/login", data={**login, "password": PASSWORD})).status_code == 400
+
+
+async def test_the_app_does_not_start_without_a_jwt_secret(monkeypatch):
+    monkeypatch.setattr(users, "SECRET", None)
+
+    with pytest.raises(MissingSecret):
+        async with app.router.lifespan_context(app):
+            pass
+
+
+def no_user_lookups(monkeypatch):
+    async def get(self, user_id):
+        raise AssertionError("user loaded from the database")
+
+    monkeypatch.setattr(UserManager, "get", get)
+
+
+async def test_authenticated_users_come_from_the_cache(client, sign_up, monkeypatch):
+    user_id, headers = await sign_up()
+    assert (await client.get("/auth/me", headers=headers)).status_code == 200
+    assert user_id in user_cache
+
+    no_user_lookups(monkeypatch)
+    response = await client.get("/auth/me", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["id"] == str(user_id)
+
+
+async def test_updates_invalidate_the_cached_user(client, sign_up):
+    user_id, headers = await sign_up()
+    await client.get("/auth/me", headers=headers)
+
+    email = f"{uuid.uuid4().hex}@example.com"
+    response = await client.patch("/auth/me", headers=headers, json={"email": email})
+    assert response.status_code == 200, response.text
+
+    assert user_id not in user_cache
+    assert (await client.get("/auth/me", headers=headers)).json()["email"] == email
+
+
+async def test_trusted_token_claims_skip_the_lookup(client, sign_up, monkeypatch):
+    monkeypatch.setattr(users, "AUTH_TRUST_TOKEN_CLAIMS", True)
+    user_id, headers = await sign_up()
+    user_cache.pop(user_id)
+
+    no_user_lookups(monkeypatch)
+    response = await client.get("/auth/me", headers=headers)
+    assert response.status_code == 200, response.text
+    assert user_id not in user_cache